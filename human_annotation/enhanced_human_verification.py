@@ -7,12 +7,20 @@ import io
 from collections import defaultdict
 import re
 import unicodedata
+import os
+import sys
+
+from highlights import find_snippet_on_doc, precompute_highlights
+
+# repo root, so the snow_miner package (full-text search) is importable when run from this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
 class SnippetAnnotator:
     def __init__(self, master, issue, csv_path, pdf_path, out_path,
                  text_col="text", date_col="date",
-                 location_col="location", comment_col="annotator_comment"):
+                 location_col="location", comment_col="annotator_comment", search_db=None,
+                 sidecar=None):
 
         """
         Absolute behemoth of a class to annotate text snippets extracted from PDFs. Part coded by Copilot hence verbose
@@ -30,8 +38,11 @@ class SnippetAnnotator:
         self.date_col = date_col
         self.location_col = location_col
         self.comment_col = comment_col  # annotator comment
+        self.search_db = search_db  # optional snow_miner.search index for "Other mentions"
+        self.sidecar = sidecar      # optional pre_annotate.py output: suggestions + highlight positions
 
         self.df = pd.read_csv(csv_path)
+        self.row_ids = list(range(len(self.df)))  # original CSV row of each displayed row (what sidecars refer to)
 
         for col in [self.date_col, self.location_col, self.comment_col]:
             if col not in self.df.columns:
@@ -69,6 +80,9 @@ class SnippetAnnotator:
             .pack(side="right", padx=6)
         tk.Button(info_row, text="Enhanced jump", command=self.enhanced_jump_to_highlight)\
             .pack(side="right", padx=6)
+        if self.search_db:
+            tk.Button(info_row, text="Other mentions", command=self.show_other_mentions)\
+                .pack(side="right", padx=6)
 
         # --- Edit text hallucination (above Date row) ---
         edit_frame = tk.Frame(master)
@@ -119,7 +133,11 @@ class SnippetAnnotator:
         # Precompute all highlights once
         self.page_highlights = defaultdict(list)  # page_num -> list[fitz.Rect]
         self.snippet_target_page = {}             # row_idx  -> page_num (or None)
-        self._precompute_all_highlights()
+        self.suggestions = {}                     # original CSV row -> sidecar row (see self.row_ids)
+        if self.sidecar:
+            self._load_sidecar()
+        else:
+            self._precompute_all_highlights()
 
         # Render once with ALL highlights baked on the previews
         self.show_pdf_pages(highlights=self.page_highlights)
@@ -222,6 +240,7 @@ class SnippetAnnotator:
 
         # Drop current row and reset index
         self.df = self.df.drop(self.df.index[self.current_idx]).reset_index(drop=True)
+        del self.row_ids[self.current_idx]
 
         # Fix snippet_target_page mapping (optional cleanup)
         if hasattr(self, "snippet_target_page") and isinstance(self.snippet_target_page, dict):
@@ -245,27 +264,16 @@ class SnippetAnnotator:
         self.show_snippet()
 
     def _precompute_all_highlights(self):
-        for idx, row in self.df.iterrows():
-            snippet = str(row[self.text_col]) if pd.notna(row[self.text_col]) else ""
-            snippet = snippet.strip()
-            if not snippet:
-                self.snippet_target_page[idx] = None
-                continue
-
-            found_page = None
-            rects_for_page = None
-            for page_num, page in enumerate(self.doc):
-                rects = page.search_for(snippet)
-                if not rects and len(snippet) > 120:
-                    rects = page.search_for(snippet[:120])
-                if rects:
-                    found_page = page_num
-                    rects_for_page = rects
-                    break
-
-            self.snippet_target_page[idx] = found_page
-            if found_page is not None and rects_for_page:
-                self.page_highlights[found_page].extend(rects_for_page)
+        snippets = [(idx, str(v) if pd.notna(v) else "") for idx, v in self.df[self.text_col].items()]
+        self.page_highlights, self.snippet_target_page = precompute_highlights(self.doc, snippets)
+
+    def _load_sidecar(self):
+        """Take highlight positions and suggestions from the pre-annotation sidecar instead of searching the PDF."""
+        for r in self.sidecar["rows"]:
+            self.suggestions[r["row"]] = r
+            self.snippet_target_page[r["row"]] = r["page"]
+            if r["page"] is not None:
+                self.page_highlights[r["page"]].extend(fitz.Rect(*rect) for rect in r["rects"])
 
     # ---------- rendering ----------
     def render_page_image(self, page_num, highlight_rects=None, zoom=None):
@@ -328,6 +336,12 @@ class SnippetAnnotator:
             status = f"✅ Found on page {target_page+1}"
         else:
             status = "❌ Not found"
+        suggestion = self.suggestions.get(self.row_ids[self.current_idx])
+        if suggestion and suggestion.get("duplicate_of") is not None:
+            dup = suggestion["duplicate_of"]
+            # numbered as displayed, so rejected rows before it don't shift the label
+            label = f"snippet {self.row_ids.index(dup) + 1}" if dup in self.row_ids else "a rejected snippet"
+            status += f"   ⚠ Possible duplicate of {label}"
 
         # keep the edit box EMPTY (do not prefill)
         self.entry_edit_text.delete("1.0", tk.END)
@@ -336,16 +350,50 @@ class SnippetAnnotator:
             text=f"[{self.current_idx+1}/{len(self.df)}] Snippet:\n{(snippet[:500] + '...') if len(snippet)>500 else snippet}\n\n{status}"
         )
 
-        # Fill input widgets
+        # Fill input widgets (pre-annotation suggestions replace values still as they came from GPT)
+        date_val = str(row[self.date_col]) if row[self.date_col] else ""
+        loc_val = str(row[self.location_col]) if row[self.location_col] else ""
+        if suggestion:
+            if date_val in ("", "nan", suggestion["raw_date"]) and suggestion["date_suggestion"]:
+                date_val = suggestion["date_suggestion"]
+            if loc_val in ("", "nan", suggestion["raw_location"]) and suggestion["location_suggestion"]:
+                loc_val = suggestion["location_suggestion"]
         self.entry_date.delete(0, tk.END)
-        self.entry_date.insert(0, str(row[self.date_col]) if row[self.date_col] else "")
+        self.entry_date.insert(0, date_val)
 
         self.entry_location.delete(0, tk.END)
-        self.entry_location.insert(0, str(row[self.location_col]) if row[self.location_col] else "")
+        self.entry_location.insert(0, loc_val)
 
         self.text_comment.delete("1.0", tk.END)
         self.text_comment.insert("1.0", str(row[self.comment_col]) if row[self.comment_col] else "")
 
+    def show_other_mentions(self):
+        """Search every issue for the Location entry (or, if empty, the start of the snippet) and list the hits."""
+        from snow_miner.search import open_index, phrase, search
+
+        query_text = self.entry_location.get().strip()
+        if not query_text or query_text == "nan":
+            snippet = str(self.df.iloc[self.current_idx][self.text_col]) if len(self.df) else ""
+            query_text = " ".join(self._tok(snippet)[:6])
+        if not query_text:
+            return
+
+        conn = open_index(self.search_db)
+        try:
+            hits = search(conn, phrase(query_text), limit=50)
+        finally:
+            conn.close()
+
+        win = tk.Toplevel(self.master)
+        win.title(f"Other mentions of {query_text}")
+        box = tk.Text(win, width=110, height=30, wrap="word")
+        box.pack(fill="both", expand=True)
+        if not hits:
+            box.insert("end", "No matches in the search index.")
+        for h in hits:
+            box.insert("end", f"{h.issue}  p{h.page}  @{h.offset}\n{h.snippet}\n\n")
+        box.configure(state="disabled")
+
     def apply_text_edit(self):
         """Apply human-edited snippet text to the current row and re-locate its highlight/page."""
         if self.current_idx >= len(self.df):
@@ -357,16 +405,7 @@ class SnippetAnnotator:
 
         self.df.at[self.current_idx, self.text_col] = new_text
 
-        found_page = None
-        rects_for_page = None
-        for page_num, page in enumerate(self.doc):
-            rects = page.search_for(new_text)
-            if not rects and len(new_text) > 120:
-                rects = page.search_for(new_text[:120])
-            if rects:
-                found_page = page_num
-                rects_for_page = rects
-                break
+        found_page, rects_for_page = find_snippet_on_doc(self.doc, new_text)
 
         self.snippet_target_page[self.current_idx] = found_page
         if found_page is not None and rects_for_page:
@@ -536,6 +575,10 @@ if __name__ == "__main__":
     parser.add_argument("--uncleaned_dir", type=str, required=False, help="Path to root of uncleaned CSV files")
     parser.add_argument("--pdf_dir", type=str, required=False, help="Path to root of PDF files")
     parser.add_argument("--out", type=str, required=False, default='hand_curated', help="Output file")
+    parser.add_argument("--search_index", type=str, required=False, default=None,
+                        help="Full-text index from `python -m snow_miner.search build` (enables 'Other mentions')")
+    parser.add_argument("--sidecar_dir", type=str, required=False, default=None,
+                        help="Sidecars from pre_annotate.py- prefilled suggestions and no highlight search at startup")
 
     args = parser.parse_args()
 
@@ -549,8 +592,13 @@ if __name__ == "__main__":
     pdf_file = rf"{pdf_dir}/issue_{issue}.pdf"
 
 
+    sidecar = None
+    if args.sidecar_dir:
+        from pre_annotate import load_sidecar
+        sidecar = load_sidecar(args.sidecar_dir, issue, csv_file)
+
     root = tk.Tk()
     root.title("Snippet Annotator")
-    app = SnippetAnnotator(root, issue, csv_file, pdf_file, out)
+    app = SnippetAnnotator(root, issue, csv_file, pdf_file, out, search_db=args.search_index, sidecar=sidecar)
     root.mainloop()
 
@@ -0,0 +1,39 @@
+from collections import defaultdict
+
+
+def find_snippet_on_doc(doc, snippet: str):
+    """
+    First page holding the snippet (exact search, then a 120-char prefix for long snippets).
+    Returns (page_num, list[fitz.Rect]) or (None, None).
+    """
+    for page_num, page in enumerate(doc):
+        rects = page.search_for(snippet)
+        if not rects and len(snippet) > 120:
+            rects = page.search_for(snippet[:120])
+        if rects:
+            return page_num, rects
+    return None, None
+
+
+def precompute_highlights(doc, snippets):
+    """
+    Locate every snippet once, up front. Kept free of tkinter so it can run headless (benchmarks, pre-annotation).
+
+    doc: open fitz.Document
+    snippets: iterable of (row_idx, snippet text)
+
+    returns: (page_highlights: page_num -> list[fitz.Rect], snippet_target_page: row_idx -> page_num or None)
+    """
+    page_highlights = defaultdict(list)
+    snippet_target_page = {}
+    for idx, snippet in snippets:
+        snippet = (snippet or "").strip()
+        if not snippet:
+            snippet_target_page[idx] = None
+            continue
+
+        found_page, rects_for_page = find_snippet_on_doc(doc, snippet)
+        snippet_target_page[idx] = found_page
+        if found_page is not None and rects_for_page:
+            page_highlights[found_page].extend(rects_for_page)
+    return page_highlights, snippet_target_page
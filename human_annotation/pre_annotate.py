@@ -0,0 +1,175 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import fitz  # PyMuPDF
+import pandas as pd
+
+from highlights import find_snippet_on_doc
+
+# repo root, so snow_miner (date normaliser, gazetteer) is importable when run from this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from snow_miner.dates import parse_date, publication_year  # noqa: E402
+from snow_miner.gazetteer import DEFAULT_POINTS, build_gazetteer, fold_text, gazetteer_regex, resolve_location  # noqa: E402
+
+SIDECAR_VERSION = 1
+SEASON_NAMES = {"winter": "Winter", "spring": "Spring", "summer": "Summer", "autumn": "Autumn"}
+
+
+def sidecar_path(sidecar_dir, issue):
+    return os.path.join(sidecar_dir, f"issue_{issue}.sidecar.json")
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def format_date_suggestion(parts, fallback_year):
+    """
+    DateParts -> the annotator guideline formats: DD/MM/YYYY, -/MM/YYYY, Season YYYY, YYYY (front page year if nothing
+    better)
+    """
+    year = parts.year or fallback_year
+    if year is None:
+        return ""
+    if parts.month and parts.day:
+        return f"{parts.day:02d}/{parts.month:02d}/{year}"
+    if parts.month:
+        return f"-/{parts.month:02d}/{year}"
+    if parts.season:
+        return f"{SEASON_NAMES.get(parts.season.lower(), parts.season.title())} {year}"
+    return str(year)
+
+
+def duplicate_flags(texts):
+    """
+    row -> earlier row it repeats (same text once folded, or contained in / containing it). Both are CSV row indices,
+    the annotator maps them to its current numbering
+    """
+    folded = [fold_text(t) for t in texts]
+    out = {}
+    for i, t in enumerate(folded):
+        if not t:
+            continue
+        for j in range(i):
+            other = folded[j]
+            if other and (t == other or (len(t) >= 40 and t in other) or (len(other) >= 40 and other in t)):
+                out[i] = j
+                break
+    return out
+
+
+def pre_annotate_issue(issue, csv_path, pdf_path, gazetteer, gaz_re, text_col="text", date_col="date",
+                       location_col="location"):
+    """
+    Everything the annotator would otherwise work out interactively for one issue, as a JSON-able dict
+    """
+    df = pd.read_csv(csv_path)
+    texts = [str(v).strip() if pd.notna(v) else "" for v in df[text_col]]
+    doc = fitz.open(pdf_path)
+    try:
+        fallback_year = publication_year(doc[0].get_text()) if len(doc) else None
+        dups = duplicate_flags(texts)
+        rows = []
+        for idx, text in enumerate(texts):
+            raw_date = df[date_col].iloc[idx] if date_col in df.columns else None
+            raw_date = "" if pd.isna(raw_date) else str(raw_date)
+            raw_loc = df[location_col].iloc[idx] if location_col in df.columns else None
+            location, general = resolve_location(raw_loc, text, gazetteer, gaz_re)
+
+            page, rects = find_snippet_on_doc(doc, text) if text else (None, None)
+            rows.append({
+                "row": idx,
+                "text": text,
+                "raw_date": raw_date,
+                "date_suggestion": format_date_suggestion(parse_date(raw_date, fallback_year), fallback_year),
+                "raw_location": "" if raw_loc is None or pd.isna(raw_loc) else str(raw_loc),
+                "location_suggestion": location,
+                "general_location": general,
+                "page": page,
+                "rects": [[r.x0, r.y0, r.x1, r.y1] for r in rects or []],
+                "duplicate_of": dups.get(idx),
+            })
+    finally:
+        doc.close()
+
+    return {
+        "version": SIDECAR_VERSION,
+        "issue": issue,
+        "csv_sha256": file_sha256(csv_path),
+        "pdf": os.path.basename(pdf_path),
+        "publication_year": fallback_year,
+        "rows": rows,
+    }
+
+
+def load_sidecar(sidecar_dir, issue, csv_path):
+    """
+    The issue's sidecar, or None if there isn't one or it was built from a different CSV
+    """
+    path = sidecar_path(sidecar_dir, issue)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != SIDECAR_VERSION or data.get("csv_sha256") != file_sha256(csv_path):
+        print(f"[sidecar] {path} is stale (CSV changed since pre-annotation); ignoring it")
+        return None
+    return data
+
+
+def parse_issue_range(spec):
+    """'1-5,9,12' -> ['001', ..., '005', '009', '012']"""
+    out = []
+    for part in spec.split(","):
+        part = part.strip()
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            out += [str(i).zfill(3) for i in range(int(lo), int(hi) + 1)]
+        elif part:
+            out.append(part.zfill(3))
+    return out
+
+
+if __name__ == "__main__":
+
+    # same path conventions as enhanced_human_verification.py
+
+    parser = argparse.ArgumentParser(description="Headless pre-annotation: suggested dates/locations, highlight "
+                                                 "positions and duplicate flags per issue, for the Snippet Annotator")
+    parser.add_argument("--issues", type=str, required=True, help="Issue range, e.g. '1-20' or '3,7,9'")
+    parser.add_argument("--uncleaned_dir", type=str, required=True, help="Path to root of uncleaned CSV files")
+    parser.add_argument("--pdf_dir", type=str, required=True, help="Path to root of PDF files")
+    parser.add_argument("--sidecar_dir", type=str, default="sidecars", help="Where to write issue_XXX.sidecar.json")
+    parser.add_argument("--points", type=str, default=DEFAULT_POINTS, help="Curated points.csv for the gazetteer")
+    parser.add_argument("--overwrite", action="store_true", help="Rebuild sidecars that are already up to date")
+
+    args = parser.parse_args()
+
+    gazetteer = build_gazetteer(args.points) if os.path.exists(args.points) else {}
+    gaz_re = gazetteer_regex(gazetteer)
+    os.makedirs(args.sidecar_dir, exist_ok=True)
+
+    for issue in parse_issue_range(args.issues):
+        csv_file = rf"{args.uncleaned_dir}/issue_{issue}.csv"
+        pdf_file = rf"{args.pdf_dir}/issue_{issue}.pdf"
+        if not (os.path.exists(csv_file) and os.path.exists(pdf_file)):
+            print(f"[skip] issue {issue}: missing CSV or PDF")
+            continue
+        if not args.overwrite and load_sidecar(args.sidecar_dir, issue, csv_file) is not None:
+            print(f"[skip] issue {issue}: sidecar up to date")
+            continue
+
+        data = pre_annotate_issue(issue, csv_file, pdf_file, gazetteer, gaz_re)
+        with open(sidecar_path(args.sidecar_dir, issue), "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        found = sum(r["page"] is not None for r in data["rows"])
+        dups = sum(r["duplicate_of"] is not None for r in data["rows"])
+        print(f"issue {issue}: {len(data['rows'])} snippets, {found} located, {dups} duplicates")
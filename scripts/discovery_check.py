@@ -0,0 +1,102 @@
+import argparse
+import functools
+import os
+import tempfile
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from snow_miner.pipeline import update_issues
+from snow_miner.scraper import LAST_KNOWN_ISSUE, discover_issues, load_manifest, mark_processed, update_manifest
+
+# issues the local server publishes past LAST_KNOWN_ISSUE- 119 is missing, so a gap of 1 must stop at 118
+PUBLISHED = [117, 118, 120]
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_issues(root: str):
+    """
+    Serve root over http on a free local port (a fake club site); returns (server, url_template)
+    """
+    for issue in PUBLISHED:
+        with open(os.path.join(root, f"issue_{issue:03d}.pdf"), "wb") as f:
+            f.write(b"%PDF-1.4\n" + b"0" * 1000 * issue)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=root))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/issue_{{issue:03d}}.pdf"
+
+
+def check() -> int:
+    failures = 0
+
+    def expect(ok: bool, msg: str):
+        nonlocal failures
+        print(f"{'ok  ' if ok else 'FAIL'}  {msg}")
+        failures += not ok
+
+    with tempfile.TemporaryDirectory(prefix="snow_discover_") as tmp:
+        site, pdf_dir, out_dir = (os.path.join(tmp, d) for d in ("site", "pdfs", "out"))
+        os.makedirs(site)
+        os.makedirs(out_dir)
+        server, template = serve_issues(site)
+        try:
+            found = discover_issues(LAST_KNOWN_ISSUE + 1, template, gap=3, workers=4, timeout=5)
+            expect(sorted(found) == PUBLISHED, f"discover_issues(gap=3) -> {sorted(found)}")
+            expect(found.get(118, {}).get("content_length") == 9 + 118000, "content_length comes from the HEAD")
+            found = discover_issues(LAST_KNOWN_ISSUE + 1, template, gap=1, workers=4, timeout=5)
+            expect(sorted(found) == [117, 118], f"discover_issues(gap=1) stops at the first hole -> {sorted(found)}")
+
+            manifest, found = update_manifest(pdf_dir, template, gap=3, workers=4)
+            expect(found == PUBLISHED, f"update_manifest -> found {found}")
+            expect(sorted(map(int, manifest["issues"])) == list(range(1, LAST_KNOWN_ISSUE + 1)) + PUBLISHED,
+                   f"new manifest holds 1..{LAST_KNOWN_ISSUE} plus the found issues")
+            expect(load_manifest(pdf_dir) == manifest, "manifest saved to pdf_dir")
+            manifest, found = update_manifest(pdf_dir, template, gap=3, workers=4)
+            expect(found == [] and manifest["last_probe"]["from"] == 121,
+                   f"second probe starts at 121 and finds nothing -> {found}")
+
+            # --discover then --update: the second probe finds nothing, the discovered issues are still to do
+            urls = update_issues(pdf_dir, out_dir, url_template=template, gap=3, workers=4)
+            expect(urls == [template.format(issue=i) for i in PUBLISHED],
+                   f"update_issues after a discover -> the discovered issues ({len(urls)} urls)")
+
+            # an interrupted update: only 117 was processed (118 failed to download, the run died before 120)
+            open(os.path.join(out_dir, "issue_117.csv"), "w").close()
+            mark_processed([os.path.join(out_dir, "issue_117.csv")], pdf_dir)
+            urls = update_issues(pdf_dir, out_dir, url_template=template, gap=3, workers=4)
+            expect(urls == [template.format(issue=i) for i in (118, 120)],
+                   f"update_issues after an interrupted update -> the unprocessed issues ({len(urls)} urls)")
+            # a CSV left by a run that died before mark_processed is picked up again (and skipped by process_pdf)
+            open(os.path.join(out_dir, "issue_118.csv"), "w").close()
+            urls = update_issues(pdf_dir, out_dir, url_template=template, gap=3, workers=4)
+            expect(len(urls) == 2, f"unrecorded CSV is still pending ({len(urls)} urls)")
+            urls = update_issues(pdf_dir, out_dir, url_template=template, gap=3, workers=4, backlog=True)
+            expect(len(urls) == LAST_KNOWN_ISSUE + 2, f"update_issues(backlog=True) -> {len(urls)} urls")
+
+            mark_processed([os.path.join(out_dir, f"issue_{i}.csv") for i in (118, 120)], pdf_dir)
+            open(os.path.join(out_dir, "issue_120.csv"), "w").close()
+            urls = update_issues(pdf_dir, out_dir, url_template=template, gap=3, workers=4)
+            expect(urls == [], f"update_issues once everything is processed -> {len(urls)} urls")
+        finally:
+            server.shutdown()
+    return failures
+
+
+def main():
+    """
+    Issue discovery checks against a local http.server standing in for the club site (issues 117, 118 and 120, no
+    network)- exits non-zero on a failure
+
+    python scripts/discovery_check.py
+    """
+    argparse.ArgumentParser(description="Issue discovery / manifest checks against a local server").parse_args()
+    failures = check()
+    print(f"{failures} failures")
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
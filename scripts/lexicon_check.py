@@ -0,0 +1,55 @@
+import argparse
+
+from snow_miner.lexicon import tag
+from snow_miner.regex_extract import _tag_batch, analyze_with_regex
+
+# tier 0 in config.SCORE_PATTERNS: each of these has to score 0, not the tier-3 "snow"/"ice" inside it
+TIER0_TERMS = ["melt", "melted", "melting", "none", "bare", "gone", "disappeared", "clear of snow", "snowless"]
+
+# (sentence, highest score the regex extractor may give it; None: no row at all)
+NEGATIVE_SENTENCES = [
+    ("The corrie was snowless and clear of snow.", None),
+    ("By June the snow had melted and the plateau was bare.", 6),  # "snow" is still mentioned- highest tier wins
+]
+
+
+def check() -> int:
+    failures = 0
+
+    def expect(ok: bool, msg: str):
+        nonlocal failures
+        print(f"{'ok  ' if ok else 'FAIL'}  {msg}")
+        failures += not ok
+
+    for term in TIER0_TERMS:
+        hits = tag(term)
+        expect(len(hits) == 1 and hits[0].score == 0, f"tag({term!r}) -> tier {[h.score for h in hits]}")
+    hits = tag("icefall")
+    expect(all(h.score is None for h in hits), f"tag('icefall') -> tier {[h.score for h in hits]} (not listed)")
+    expect([h.text for h in tag("rime and rim")] == ["rime", "rim"], "rim(e) matches rim and rime")
+
+    for sentence, max_score in NEGATIVE_SENTENCES:
+        scores = [r["score"] for r in analyze_with_regex(sentence)]
+        ok = not scores if max_score is None else all(s <= max_score for s in scores)
+        expect(ok, f"analyze_with_regex({sentence!r}) -> scores {scores}")
+
+    sentences = ["The hut was good", "cover was poor"]
+    hits = _tag_batch(sentences)
+    expect(all(h.end <= len(s) for s, sent in zip(sentences, hits) for h in sent), "no hit runs across two sentences")
+    return failures
+
+
+def main():
+    """
+    Regression checks for the lexicon tiers and the offline regex extractor- exits non-zero on a failure
+
+    python scripts/lexicon_check.py
+    """
+    argparse.ArgumentParser(description="Lexicon / regex extractor regression checks").parse_args()
+    failures = check()
+    print(f"{failures} failures")
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
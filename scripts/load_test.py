@@ -0,0 +1,58 @@
+import argparse
+import os
+import tempfile
+import time
+
+from snow_miner import process_all
+from snow_miner.fake_openai import StandInConfig, load_recordings, serve_in_thread
+from snow_miner.gpt_analyse import configure_client
+from snow_miner.instrumentation import format_summary, start_run
+from snow_miner.synthetic import generate_corpus
+
+
+def main():
+    """
+    End-to-end load test of the GPT pipeline with no network: synthetic journals (or a real PDF dir) processed against
+    the local OpenAI stand-in with configurable latency, 500s and 429s. Nothing is billed.
+
+    python scripts/load_test.py --issues 115 --pages 60 --latency-ms 600 --rate-limit-rate 0.02 --report-dir out/reports
+    python scripts/load_test.py --pdf-dir data/pdfs --recordings data/recordings.jsonl
+    """
+    ap = argparse.ArgumentParser(description="Offline end-to-end load test against the OpenAI stand-in")
+    ap.add_argument("--pdf-dir", type=str, default=None, help="Use these PDFs instead of a synthetic corpus")
+    ap.add_argument("--issues", type=int, default=10, help="Synthetic issues to generate")
+    ap.add_argument("--pages", type=int, default=40, help="Pages per synthetic issue")
+    ap.add_argument("--recordings", type=str, default=None, help="Recorded chunk->response JSONL to replay")
+    ap.add_argument("--latency-ms", type=float, default=200.0)
+    ap.add_argument("--jitter-ms", type=float, default=50.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--report-dir", type=str, default=None)
+    args = ap.parse_args()
+
+    config = StandInConfig(load_recordings(args.recordings), args.latency_ms, args.jitter_ms, args.error_rate,
+                           args.rate_limit_rate, retry_after_s=0.1, seed=args.seed)
+    server = serve_in_thread(config)
+    configure_client(base_url=server.base_url, api_key="stand-in")
+
+    with tempfile.TemporaryDirectory(prefix="snow_load_") as tmp:
+        pdf_dir = args.pdf_dir
+        if pdf_dir is None:
+            pdf_dir = os.path.join(tmp, "pdfs")
+            generate_corpus(pdf_dir, n_issues=args.issues, n_pages=args.pages)
+
+        metrics = start_run()
+        t0 = time.perf_counter()
+        outs = process_all(pdf_dir=pdf_dir, out_dir=os.path.join(tmp, "out"), extractor="gpt")
+        elapsed = time.perf_counter() - t0
+        server.shutdown()
+
+        print(f"{len(outs)} issues in {elapsed:.1f}s, stand-in stats: {config.stats}")
+        print(format_summary(metrics.to_dict()))
+        if args.report_dir:
+            print(metrics.write_reports(args.report_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,26 @@
-
 import argparse
+import json
+import os
 
 from dotenv import load_dotenv
 
 from snow_miner import scrape_and_download, process_all
+from snow_miner.instrumentation import format_summary, get_metrics
 
 load_dotenv()
 
+
+def write_run_report(report_dir):
+    """
+    Print the run summary and, if asked, write the JSON + Prometheus reports
+    """
+    metrics = get_metrics()
+    print(format_summary(metrics.to_dict()))
+    if report_dir:
+        paths = metrics.write_reports(report_dir)
+        print(f"Run report: {paths['json']} (Prometheus: {paths['prometheus']})")
+
+
 def main():
 
     """
@@ -15,6 +29,29 @@ def main():
     --all - both scrape and mine pdfs (new users)
     --scrape-only - only download pdfs
     --process-only - only create GPT API calls for extracting snow data
+    --extractor regex - swap GPT for the offline regex baseline (no API key, no calls, same CSV columns)
+    --ranker models/ranker.npz - only send the best-ranked sentence windows to GPT (train with python -m snow_miner.ranker)
+    --openai-base-url http://127.0.0.1:8765/v1 - use the local record/replay stand-in (python -m snow_miner.fake_openai)
+    --report-dir out/reports - write per-issue/per-stage timings, tokens and cost as JSON + Prometheus text files
+    --dry-run - list the PDFs a process run would work on / skip, without reading them
+    --report out/reports/run_X.json - print the summary of an earlier run report
+    --stream - with --all/--process-only, run download -> extract -> select -> LLM -> write as overlapping stages with
+               bounded queues (--download-workers, --extract-workers, --llm-workers, --queue-size)
+    --cascade - screen chunks with the snow lexicon (and the --ranker, if given) before GPT; --cascade-check adds a
+               cheap yes/no call for chunks the local screen can't settle. Only positives get the extraction prompt
+    --plan - print the per-issue chunks/tokens/cost a --process-only run would use (offline, no API calls)
+    --budget-usd 0.50 / --budget-tokens 2000000 - run the best issues (expected snippets per token) that fit the
+               budget, and skip any issue that would take the actual spend over it. The text read for the plan is
+               reused by the run; --corpus-dir data/corpus takes it from a built corpus instead of the PDFs
+    --discover - probe for journal issues published after the last known one (concurrent HEAD requests, stops after
+               --probe-gap missing numbers in a row) and record them in the download manifest (<pdf-dir>/manifest.json)
+    --update - --discover, then download and process every discovered issue not processed yet (found now, by an earlier
+               --discover, or left by an interrupted update; works with --stream); --backlog also takes every older
+               manifest issue that has no CSV yet
+    --ocr - OCR scanned pages that have no text layer (needs pytesseract + tesseract; cached in --ocr-cache-dir)
+
+    Heavy libraries (openai, pdfminer, numpy, pandas) are only imported by the stage that needs them, so --help,
+    --dry-run, --report and --scrape-only start quickly.
 
     By design, any GPT calls require a .env file containing your API key from GPT (obviously not provided in this codebase :) )
 
@@ -28,14 +65,194 @@ def main():
     ap.add_argument("--pdf-dir", type=str, default="C:\Projects\cairngorm-snow-miner\scripts\data\pdfs", help="Directory to store PDFs")
     ap.add_argument("--out-dir", type=str, default="out", help="Directory for CSV outputs")
     ap.add_argument("--no-date-column", action="store_true", help="Omit the 'date' column in CSVs")
+    ap.add_argument("--extractor", choices=["gpt", "regex"], default="gpt",
+                    help="Snippet extractor: GPT (default) or the offline regex baseline")
+    ap.add_argument("--ranker", type=str, default=None, help="Trained sentence ranker (.npz) to pre-select GPT windows")
+    ap.add_argument("--date-parts", action="store_true", help="Also write parsed year/season/month/day columns")
+    ap.add_argument("--page-col", action="store_true", help="Also write the PDF page each snippet was found on")
+    ap.add_argument("--no-normalise", action="store_true",
+                    help="Send raw pdfminer text (keep running heads, page numbers and hyphenated line breaks)")
+    ap.add_argument("--top-k", type=int, default=None, help="Max ranked sentences sent to GPT per issue")
+    ap.add_argument("--openai-base-url", type=str, default=None,
+                    help="Send API calls here instead of OpenAI, e.g. the local stand-in http://127.0.0.1:8765/v1")
+    ap.add_argument("--report-dir", type=str, default=None, help="Write run reports (JSON + Prometheus) here")
+    ap.add_argument("--dry-run", action="store_true", help="List PDFs that would be processed or skipped")
+    ap.add_argument("--report", type=str, default=None, help="Print the summary of a saved run report JSON")
+    ap.add_argument("--stream", action="store_true",
+                    help="With --all/--process-only: overlap download, extraction, API calls and writing per issue")
+    ap.add_argument("--download-workers", type=int, default=2, help="--stream: parallel downloads")
+    ap.add_argument("--extract-workers", type=int, default=None, help="--stream: PDF extraction processes (default: CPUs)")
+    ap.add_argument("--llm-workers", type=int, default=4, help="--stream: issues in the API stage at once")
+    ap.add_argument("--queue-size", type=int, default=4, help="--stream: bounded queue size between stages")
+    ap.add_argument("--cascade", action="store_true", help="Screen chunks locally before the GPT extraction")
+    ap.add_argument("--cascade-check", action="store_true",
+                    help="--cascade: ask a short yes/no question about chunks the local screen can't settle")
+    ap.add_argument("--cascade-min-hits", type=int, default=1, help="--cascade: drop chunks with fewer snow words")
+    ap.add_argument("--cascade-rich-hits", type=int, default=4,
+                    help="--cascade: chunks with this many snow words skip the check")
+    ap.add_argument("--cascade-check-model", type=str, default=None, help="--cascade-check: model for the yes/no call")
+    ap.add_argument("--plan", action="store_true", help="Print the token/cost plan for the PDFs in --pdf-dir and exit")
+    ap.add_argument("--budget-usd", type=float, default=None, help="GPT runs: spend at most this much")
+    ap.add_argument("--budget-tokens", type=int, default=None, help="GPT runs: send at most this many (estimated) tokens")
+    ap.add_argument("--corpus-dir", type=str, default=None,
+                    help="--plan/budgeted runs: take issue text from this built corpus (python -m snow_miner.corpus)")
+    ap.add_argument("--discover", action="store_true", help="Probe for new issues and add them to the manifest")
+    ap.add_argument("--update", action="store_true", help="Discover new issues, then download and process only those")
+    ap.add_argument("--url-template", type=str, default=None,
+                    help="--discover/--update: issue URL with an {issue} placeholder (default: the club's PDF naming)")
+    ap.add_argument("--probe-gap", type=int, default=3, help="--discover/--update: missing issues in a row before stopping")
+    ap.add_argument("--probe-workers", type=int, default=8, help="--discover/--update: concurrent HEAD requests")
+    ap.add_argument("--backlog", action="store_true",
+                    help="--update: also process older manifest issues that have no CSV yet")
+    ap.add_argument("--ocr", action="store_true", help="OCR pages with no or almost no extractable text")
+    ap.add_argument("--ocr-cache-dir", type=str, default=None, help="--ocr: page OCR cache (default: data/ocr_cache)")
+    ap.add_argument("--ocr-workers", type=int, default=None, help="--ocr: OCR processes per PDF (default: CPUs)")
 
     args = ap.parse_args()
 
+    if args.report:
+        with open(args.report, encoding="utf-8") as f:
+            print(format_summary(json.load(f)))
+        return
+
+    if args.dry_run:
+        from snow_miner.pipeline import detect_issue_from_filename
+
+        names = sorted(n for n in os.listdir(args.pdf_dir) if n.lower().endswith(".pdf"))
+        todo = 0
+        for name in names:
+            issue = detect_issue_from_filename(name) or os.path.splitext(name)[0]
+            done = os.path.exists(os.path.join(args.out_dir, f"{issue}.csv"))
+            todo += 0 if done else 1
+            print(f"{'skip' if done else 'todo'}  {issue}  {name}")
+        print(f"{todo} of {len(names)} PDFs would be processed ({args.extractor})")
+        return
+
+    ranker = None
+    if args.ranker:
+        from snow_miner.ranker import SentenceRanker
+
+        ranker = SentenceRanker.load(args.ranker)
+    if args.openai_base_url:
+        from snow_miner.gpt_analyse import configure_client
+
+        configure_client(base_url=args.openai_base_url)
+
+    if args.ocr:
+        # set in the environment rather than passed down, so extraction in worker processes picks it up too
+        from snow_miner.pdf_text import OCR_CACHE_ENV, OCR_ENV, OCR_WORKERS_ENV
+
+        os.environ[OCR_ENV] = "1"
+        if args.ocr_cache_dir:
+            os.environ[OCR_CACHE_ENV] = args.ocr_cache_dir
+        if args.ocr_workers:
+            os.environ[OCR_WORKERS_ENV] = str(args.ocr_workers)
+
+    cascade = None
+    if args.cascade or args.cascade_check:
+        from snow_miner.cascade import Cascade
+
+        cascade = Cascade(min_hits=args.cascade_min_hits, rich_hits=args.cascade_rich_hits, ranker=ranker,
+                          check=args.cascade_check, check_model=args.cascade_check_model)
+
+    if args.date_parts and args.no_date_column:
+        ap.error("--date-parts needs the date column; drop --no-date-column")
+
+    budgeted = args.budget_usd is not None or args.budget_tokens is not None
+    if budgeted and args.stream:
+        ap.error("--budget-usd/--budget-tokens work with the sequential run, not --stream")
+
+    def run_process(pdf_paths=None):
+        if not (budgeted and args.extractor == "gpt"):
+            return process_all(pdf_dir=args.pdf_dir, out_dir=args.out_dir, include_date_col=not args.no_date_column,
+                               extractor=args.extractor, ranker=ranker, top_k=args.top_k,
+                               include_date_parts=args.date_parts, normalise=not args.no_normalise,
+                               pdf_paths=pdf_paths, cascade=cascade, include_page=args.page_col)
+        from snow_miner.planner import apply_budget, format_plan, plan_run
+
+        issue_texts = {}
+        plans = plan_run(args.pdf_dir, args.out_dir, ranker=ranker, top_k=args.top_k,
+                         normalise=not args.no_normalise, corpus_dir=args.corpus_dir, cascade=cascade,
+                         pdf_paths=pdf_paths, issue_texts=issue_texts)
+        selected, skipped = apply_budget(plans, args.budget_usd, args.budget_tokens)
+        print(format_plan(selected, skipped))
+        return process_all(pdf_dir=args.pdf_dir, out_dir=args.out_dir, include_date_col=not args.no_date_column,
+                           extractor=args.extractor, ranker=ranker, top_k=args.top_k,
+                           include_date_parts=args.date_parts, normalise=not args.no_normalise,
+                           pdf_paths=[p.pdf_path for p in selected], budget_usd=args.budget_usd,
+                           cost_estimates={p.issue: p.cost_usd for p in selected}, cascade=cascade,
+                           include_page=args.page_col, budget_tokens=args.budget_tokens,
+                           token_estimates={p.issue: p.tokens for p in selected}, issue_texts=issue_texts)
+
+    if args.plan:
+        from snow_miner.planner import apply_budget, format_plan, plan_run
+
+        plans = plan_run(args.pdf_dir, args.out_dir, ranker=ranker, top_k=args.top_k, normalise=not args.no_normalise,
+                         corpus_dir=args.corpus_dir, cascade=cascade)
+        print(format_plan(*apply_budget(plans, args.budget_usd, args.budget_tokens)) if budgeted else format_plan(plans))
+        return
+
+    if args.discover:
+        from snow_miner.scraper import URL_TEMPLATE, update_manifest
+
+        manifest, found = update_manifest(args.pdf_dir, args.url_template or URL_TEMPLATE, gap=args.probe_gap,
+                                          workers=args.probe_workers)
+        for number in found:
+            print(f"new  {number:03d}  {manifest['issues'][str(number)]['url']}")
+        print(f"{len(found)} new issues; {len(manifest['issues'])} in {os.path.join(args.pdf_dir, 'manifest.json')}")
+        return
+
+    if args.update:
+        from snow_miner.pipeline import update_issues
+        from snow_miner.scraper import download_pdfs, mark_processed
+
+        urls = update_issues(args.pdf_dir, args.out_dir, url_template=args.url_template, gap=args.probe_gap,
+                             workers=args.probe_workers, backlog=args.backlog)
+        if not urls:
+            print("Nothing to do: every " + ("manifest" if args.backlog else "discovered") + " issue has been processed")
+            return
+        print(f"[update] {len(urls)} issues to download and process")
+        if args.stream:
+            from snow_miner.streaming import stream_all
+
+            workers = {"download": args.download_workers, "llm": args.llm_workers}
+            if args.extract_workers:
+                workers["extract"] = args.extract_workers
+            outs = stream_all(pdf_dir=args.pdf_dir, out_dir=args.out_dir, urls=urls, workers=workers,
+                              queue_size=args.queue_size, include_date_col=not args.no_date_column,
+                              extractor=args.extractor, ranker=ranker, top_k=args.top_k,
+                              include_date_parts=args.date_parts, normalise=not args.no_normalise, cascade=cascade,
+                              include_page=args.page_col)
+        else:
+            outs = run_process(pdf_paths=download_pdfs(urls, dest_dir=args.pdf_dir))
+        # issues that failed to download or process stay pending for the next --update
+        mark_processed(outs, args.pdf_dir)
+        print(f"Wrote {len(outs)} CSVs to {args.out_dir}")
+        write_run_report(args.report_dir)
+        return
+
+    if args.stream and (args.all or args.process_only):
+        from snow_miner.scraper import known_pdf_links
+        from snow_miner.streaming import stream_all
+
+        workers = {"download": args.download_workers, "llm": args.llm_workers}
+        if args.extract_workers:
+            workers["extract"] = args.extract_workers
+        outs = stream_all(pdf_dir=args.pdf_dir, out_dir=args.out_dir, urls=known_pdf_links(args.pdf_dir) if args.all else None,
+                          workers=workers, queue_size=args.queue_size, include_date_col=not args.no_date_column,
+                          extractor=args.extractor, ranker=ranker, top_k=args.top_k,
+                          include_date_parts=args.date_parts, normalise=not args.no_normalise, cascade=cascade,
+                          include_page=args.page_col)
+        print(f"Wrote {len(outs)} CSVs to {args.out_dir}")
+        write_run_report(args.report_dir)
+        return
+
     if args.all:
         saved = scrape_and_download(base_url=args.base_url, pdf_dir=args.pdf_dir)
         print(f"Downloaded/kept {len(saved)} PDFs in {args.pdf_dir}")
-        outs = process_all(pdf_dir=args.pdf_dir, out_dir=args.out_dir, include_date_col=not args.no_date_column)
+        outs = run_process()
         print(f"Wrote {len(outs)} CSVs to {args.out_dir}")
+        write_run_report(args.report_dir)
         return
 
     if args.scrape_only:
@@ -44,8 +261,9 @@ def main():
         return
 
     if args.process_only:
-        outs = process_all(pdf_dir=args.pdf_dir, out_dir=args.out_dir, include_date_col=not args.no_date_column)
+        outs = run_process()
         print(f"Wrote {len(outs)} CSVs to {args.out_dir}")
+        write_run_report(args.report_dir)
         return
 
     ap.print_help()
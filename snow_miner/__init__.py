@@ -0,0 +1,22 @@
+"""
+Cairngorm Club Journal snow miner. Importing the package is cheap- the pipeline and its heavy dependencies (openai,
+pdfminer, numpy, pandas, requests) only load when one of the names below is first used.
+"""
+import importlib
+
+_LAZY = {
+    "process_all": "snow_miner.pipeline",
+    "process_pdf": "snow_miner.pipeline",
+    "scrape_and_download": "snow_miner.pipeline",
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module 'snow_miner' has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "benchmarks", "baseline.json")
+
+# name -> setup(workdir) returning the zero-arg callable to time
+BENCHMARKS: Dict[str, Callable[[str], Callable[[], object]]] = {}
+
+
+def benchmark(name: str):
+    def register(setup: Callable[[str], Callable[[], object]]):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def _corpus_pdf(workdir: str, n_pages: int = 40) -> Tuple[str, List[str]]:
+    """
+    One synthetic issue shared by the PDF benchmarks (generated once per run, fixed seed)
+    """
+    from snow_miner.synthetic import generate_journal_pdf
+
+    path = os.path.join(workdir, f"issue_bench_{n_pages}.pdf")
+    phrases_path = path + ".json"
+    if not os.path.exists(path):
+        planted = generate_journal_pdf(path, n_pages=n_pages, snow_density=0.15, date_density=0.08, seed=1)
+        with open(phrases_path, "w", encoding="utf-8") as f:
+            json.dump(planted, f)
+    with open(phrases_path, encoding="utf-8") as f:
+        return path, json.load(f)
+
+
+def _corpus_text(n_pages: int = 120) -> str:
+    from snow_miner.synthetic import generate_pages
+
+    return "\n\n".join(generate_pages(n_pages=n_pages, snow_density=0.15, date_density=0.08, seed=2))
+
+
+@benchmark("extract_text_pages")
+def _bench_extract(workdir: str):
+    from snow_miner.pdf_text import extract_text_pages
+
+    path, _ = _corpus_pdf(workdir)
+    return lambda: extract_text_pages(path)
+
+
+@benchmark("chunk_spans")
+def _bench_chunk(workdir: str):
+    from snow_miner.gpt_analyse import chunk_spans
+
+    text = _corpus_text()
+    return lambda: chunk_spans(text, max_chars=8000, overlap=1000)
+
+
+@benchmark("dates_global_nearest")
+def _bench_dates(workdir: str):
+    from snow_miner.gpt_analyse import find_all_dates_global, nearest_global_date
+
+    text = _corpus_text()
+    anchors = list(range(0, len(text), max(1, len(text) // 500)))
+
+    def run():
+        dates = find_all_dates_global(text)
+        return [nearest_global_date(dates, a, max_dist=6000) for a in anchors]
+    return run
+
+
+@benchmark("is_snowy")
+def _bench_is_snowy(workdir: str):
+    from snow_miner.regex_extract import sentence_spans
+    from snow_miner.regex_guardrails import is_snowy
+
+    sentences = [s for _, _, s in sentence_spans(_corpus_text())]
+    return lambda: [is_snowy(s) for s in sentences]
+
+
+def _load_annotation_module(name: str):
+    """
+    human_annotation/ is a script folder, not a package- load its tk-free helpers straight from the file
+    """
+    path = os.path.join(REPO_ROOT, "human_annotation", f"{name}.py")
+    spec = importlib.util.spec_from_file_location(f"human_annotation_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@benchmark("annotator_highlights")
+def _bench_highlights(workdir: str):
+    import fitz  # PyMuPDF
+
+    highlights = _load_annotation_module("highlights")
+    path, planted = _corpus_pdf(workdir, n_pages=20)
+    # a typical issue CSV has 30-80 rows
+    snippets = list(enumerate(planted[:60]))
+
+    def run():
+        doc = fitz.open(path)
+        try:
+            return highlights.precompute_highlights(doc, snippets)
+        finally:
+            doc.close()
+    return run
+
+
+@benchmark("load_points")
+def _bench_load_points(workdir: str):
+    import pandas as pd
+
+    from snow_miner.dataset import load_points
+
+    # the curated table at 20x its current size, through the parse cache (as every consumer after the first sees it)
+    path = os.path.join(workdir, "points_x20.csv")
+    if not os.path.exists(path):
+        raw = pd.read_csv(os.path.join(REPO_ROOT, "docs", "data", "points.csv"))
+        pd.concat([raw] * 20, ignore_index=True).to_csv(path, index=False)
+    cache_dir = os.path.join(workdir, "cache")
+    load_points(path, cache_dir=cache_dir)
+    return lambda: load_points(path, cache_dir=cache_dir)
+
+
+def _subprocess_timer(args: List[str]):
+    import subprocess
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return lambda: subprocess.run([sys.executable, *args], cwd=REPO_ROOT, env=env, check=True,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+@benchmark("import_snow_miner")
+def _bench_import(workdir: str):
+    # fresh interpreter each time- this is what every CLI command pays before doing any work. Also fails the run if a
+    # heavy dependency sneaks back into the import path
+    return _subprocess_timer(["-c", "import sys, snow_miner, snow_miner.pipeline; "
+                                    "assert not {'openai', 'pdfminer', 'numpy', 'pandas', 'requests'} & set(sys.modules)"])
+
+
+@benchmark("cli_help")
+def _bench_cli_help(workdir: str):
+    return _subprocess_timer([os.path.join("scripts", "run_pipeline.py"), "--help"])
+
+
+def time_callable(fn: Callable[[], object], repeats: int = 5, warmup: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return {"min": min(samples), "median": statistics.median(samples), "repeats": repeats}
+
+
+def run_benchmarks(names: Optional[List[str]] = None, repeats: int = 5,
+                   workdir: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Run the registered benchmarks (all by default) and return {name: {"min": s, "median": s, "repeats": n}}
+    """
+    names = names or list(BENCHMARKS)
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory(prefix="snow_bench_") as tmp:
+        wd = workdir or tmp
+        os.makedirs(wd, exist_ok=True)
+        for name in names:
+            fn = BENCHMARKS[name](wd)
+            results[name] = time_callable(fn, repeats=repeats)
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float = 0.25) -> List[str]:
+    """
+    Names whose min time is more than `tolerance` (fraction) slower than the stored baseline
+    """
+    regressions = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if base and res["min"] > base["min"] * (1.0 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    """
+    python -m snow_miner.bench --record          # store baselines for this machine
+    python -m snow_miner.bench --tolerance 0.3   # fail (exit 1) if anything is >30% slower than its baseline
+
+    Everything runs offline on a synthetic corpus; baselines are per machine so record them where you compare them.
+    """
+    ap = argparse.ArgumentParser(description="Snow miner hot-path benchmarks")
+    ap.add_argument("--only", nargs="*", default=None, choices=sorted(BENCHMARKS), help="Subset of benchmarks")
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--baseline", type=str, default=DEFAULT_BASELINE, help="Baseline JSON file")
+    ap.add_argument("--record", action="store_true", help="Write these results as the new baseline")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    ap.add_argument("--workdir", type=str, default=None, help="Keep the synthetic corpus here instead of a temp dir")
+    args = ap.parse_args()
+
+    results = run_benchmarks(args.only, repeats=args.repeats, workdir=args.workdir)
+
+    baseline: Dict[str, Dict[str, float]] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+
+    for name, res in results.items():
+        base = baseline.get(name)
+        delta = f"{(res['min'] / base['min'] - 1.0) * 100:+.1f}%" if base else "no baseline"
+        print(f"{name:<24} min {res['min'] * 1000:9.2f} ms   median {res['median'] * 1000:9.2f} ms   {delta}")
+
+    if args.record:
+        baseline.update(results)
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"machine": platform.platform(), "python": platform.python_version(), "results": baseline},
+                      f, indent=2)
+        print(f"Recorded baseline to {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, tolerance=args.tolerance)
+    if regressions:
+        print(f"Regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING, List, NamedTuple, Optional, Tuple
+
+from snow_miner.instrumentation import get_metrics
+from snow_miner.lexicon import CAT_SNOW, tag
+
+if TYPE_CHECKING:
+    import threading
+
+    from snow_miner.ranker import SentenceRanker
+
+Span = Tuple[int, int, str]
+
+# tier 0 verdicts
+DROP, CHECK, EXTRACT = "drop", "check", "extract"
+
+CHECK_PROMPT = """You screen passages from mountaineering journals for a snow survey.
+Answer whether the TEXT describes snow, ice or other cryosphere conditions (snowfields, cornices, frozen lochs,
+avalanches, thaw, a lack of snow...). A passing figurative use ("snow-white") does not count.
+Output ONLY JSON: {"snow": true} or {"snow": false}."""
+
+# the check sends "TEXT:" rather than "CHUNK:", so recordings and replays of it never collide with extraction calls
+CHECK_MARKER = "TEXT:\n"
+
+
+class Cascade(NamedTuple):
+    """
+    Which chunks earn the full extraction prompt. Tier 0 is local (lexicon, optionally the sentence ranker), tier 1 an
+    optional short yes/no call for what tier 0 can't settle, tier 2 the full extraction for the rest.
+    """
+    min_hits: int = 1  # tier 0: fewer snow-word hits than this -> dropped. At 1 nothing is lost: extracted rows must
+    # contain a snow word anyway (regex_guardrails.is_snowy)
+    rich_hits: int = 4  # tier 0: this many or more -> straight to extraction
+    ranker: Optional["SentenceRanker"] = None  # tier 0: best sentence score decides instead of rich_hits
+    ranker_low: Optional[float] = None  # best sentence below this -> dropped (None: never drop on the ranker)
+    ranker_high: Optional[float] = None  # best sentence at/above this -> extraction (None: the ranker's threshold)
+    check: bool = False  # tier 1 on: ambiguous chunks get the yes/no call, otherwise they go straight to extraction
+    check_model: Optional[str] = None  # defaults to gpt_analyse.MODEL
+    check_chars: int = 2000  # tier 1 only sees the sentences around snow words, at most this many characters
+
+
+def screen(text: str, cascade: Cascade) -> str:
+    """
+    Tier 0 verdict for one chunk: DROP, CHECK (ambiguous) or EXTRACT
+    """
+    hits = sum(CAT_SNOW in h.categories for h in tag(text))
+    if hits < cascade.min_hits:
+        return DROP
+    if cascade.ranker is not None:
+        from snow_miner.regex_extract import sentence_spans
+
+        sentences = [s for _, _, s in sentence_spans(text)]
+        best = float(cascade.ranker.score(sentences).max()) if sentences else 0.0
+        high = cascade.ranker.threshold if cascade.ranker_high is None else cascade.ranker_high
+        if best >= high:
+            return EXTRACT
+        if cascade.ranker_low is not None and best < cascade.ranker_low:
+            return DROP
+        return CHECK
+    return EXTRACT if hits >= cascade.rich_hits else CHECK
+
+
+def check_excerpt(text: str, max_chars: int = 2000) -> str:
+    """
+    The sentences with snow words in them, plus a neighbour either side, for the tier 1 check
+    """
+    from snow_miner.regex_extract import sentence_spans
+
+    sents = sentence_spans(text)
+    keep = set()
+    for i, (_, _, s) in enumerate(sents):
+        if any(CAT_SNOW in h.categories for h in tag(s)):
+            keep.update((i - 1, i, i + 1))
+    parts, size = [], 0
+    for i in sorted(k for k in keep if 0 <= k < len(sents)):
+        s = sents[i][2].strip()
+        if size + len(s) > max_chars and parts:
+            break
+        parts.append(s)
+        size += len(s) + 1
+    return " ".join(parts) if parts else text[:max_chars]
+
+
+def _parse_check(content: str) -> Optional[bool]:
+    """
+    {"snow": true/false} (or a bare/quoted yes/no/true/false) -> the answer, None if it isn't one
+    """
+    try:
+        answer = json.loads(content)
+    except ValueError:
+        answer = content
+    if isinstance(answer, dict):
+        answer = answer.get("snow")
+    if isinstance(answer, bool):
+        return answer
+    if isinstance(answer, str):
+        return {"true": True, "yes": True, "false": False, "no": False}.get(answer.strip().strip('".').lower())
+    return None
+
+
+def check_chunk(text: str, cascade: Cascade) -> bool:
+    """
+    Tier 1: one short call answering whether the chunk has cryosphere content. Unparseable answers and calls still
+    failing after the retries count as yes, so a bad answer costs an extraction call rather than losing snippets.
+    """
+    from snow_miner.gpt_analyse import _chat_completion, _retryable_errors
+
+    excerpt = check_excerpt(text, cascade.check_chars)
+    messages = [{"role": "system", "content": CHECK_PROMPT},
+                {"role": "user", "content": f"{CHECK_MARKER}{excerpt}\n"}]
+    try:
+        content = _chat_completion(messages, f"{CHECK_MARKER}{excerpt}\n", model=cascade.check_model, max_tokens=10,
+                                   stage="llm_check")
+    except _retryable_errors():
+        get_metrics().incr("cascade_t1_errors")
+        return True
+    answer = _parse_check(content or "")
+    if answer is None:
+        get_metrics().incr("cascade_t1_unparseable")
+        return True
+    return answer
+
+
+def run_cascade(spans: List[Span], cascade: Cascade, pack_chars: Optional[int] = 8000,
+                cancel: Optional["threading.Event"] = None) -> List[Span]:
+    """
+    Send the chunks through tiers 0 and 1 and keep the ones bound for extraction, with per-tier counters and the
+    estimated extraction tokens/calls the dropped chunks would have cost
+
+    cancel: checked before every tier 1 call (gpt_analyse.Cancelled once set)
+
+    returns: surviving spans, in order
+    """
+    from snow_miner.gpt_analyse import check_cancel, estimate_request_tokens, estimate_tokens, pack_windows
+
+    metrics = get_metrics()
+    kept: List[Span] = []
+    for span in spans:
+        verdict = screen(span[2], cascade)
+        if verdict == DROP:
+            metrics.incr("cascade_t0_dropped")
+            continue
+        if verdict == EXTRACT or not cascade.check:
+            metrics.incr("cascade_t0_passed")
+            kept.append(span)
+            continue
+        check_cancel(cancel)
+        metrics.incr("cascade_t1_checked")
+        metrics.incr("cascade_t1_tokens_est", estimate_tokens(CHECK_PROMPT)
+                     + estimate_tokens(check_excerpt(span[2], cascade.check_chars)))
+        if check_chunk(span[2], cascade):
+            metrics.incr("cascade_t1_passed")
+            kept.append(span)
+        else:
+            metrics.incr("cascade_t1_dropped")
+
+    if len(kept) < len(spans):
+        metrics.incr("cascade_calls_avoided", len(pack_windows(spans, pack_chars)) - len(pack_windows(kept, pack_chars)))
+        metrics.incr("cascade_tokens_avoided_est",
+                     estimate_request_tokens(spans, pack_chars) - (estimate_request_tokens(kept, pack_chars) if kept else 0))
+    return kept
@@ -44,11 +44,17 @@ ENTITY_PATTERNS = [
 
 ENTITY_REGEX = re.compile("|".join(ENTITY_PATTERNS), flags=re.IGNORECASE)
 
-# Sentence-ish splitter
-SENT_SPLIT = re.compile(r"(?<=\.|\?|!|\n)\s+")
+# Sentence-ish splitter. pdfminer breaks every printed line with \n, so single newlines are not boundaries- blank lines are
+SENT_SPLIT = re.compile(r"(?<=\.|\?|!)\s+|\n\s*\n")
 
 # Date window (number of characters to search around an entity mention)
 DATE_WINDOW_CHARS = 240
 
 # Year pattern for file name/year detection
 YEAR_REGEX = re.compile(r"\b(18|19|20)\d{2}\b")
+
+# USD per 1M tokens, for run reports and planning. Update when OpenAI changes pricing.
+MODEL_PRICES_PER_1M = {
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+}
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import argparse
+import json
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from snow_miner.pipeline import detect_issue_from_filename
+
+CORPUS_TEXT = "corpus.txt"
+CORPUS_INDEX = "corpus_index.npz"
+PAGE_SEP = "\n\n"  # same join as pipeline.process_pdf, so an issue's pages read back as one slice
+
+
+class CorpusHit(NamedTuple):
+    issue: str
+    page: int
+    offset: int  # character offset within the page text
+    text: str
+
+
+def issue_pages(pdf_path: str, normalise: bool = True) -> Tuple[str, List[Tuple[int, str]]]:
+    """
+    (issue, [(page_number, text)]) for one PDF, normalised per text_clean with the page boundaries carried over
+    """
+    from snow_miner.pdf_text import extract_text_pages
+    from snow_miner.text_clean import normalise_pages, page_starts
+
+    issue = detect_issue_from_filename(pdf_path) or os.path.splitext(os.path.basename(pdf_path))[0]
+    pages = extract_text_pages(pdf_path)
+    if not normalise or not pages:
+        return issue, pages
+
+    clean = normalise_pages(pages)
+    starts = page_starts(pages, clean)
+    ends = starts[1:] + [len(clean.text)]
+    out = []
+    for (page_no, _), start, end in zip(pages, starts, ends):
+        text = clean.text[start:end]
+        out.append((page_no, text[:-len(PAGE_SEP)] if text.endswith(PAGE_SEP) else text))
+    return issue, out
+
+
+def build_corpus(pdf_dir: str, out_dir: str, normalise: bool = True, workers: Optional[int] = None) -> str:
+    """
+    Concatenate the (normalised) page text of every PDF in pdf_dir into out_dir/corpus.txt (UTF-8) plus an index of
+    byte offsets per page in out_dir/corpus_index.npz
+
+    workers: processes for PDF extraction (None = one per CPU)
+
+    returns: out_dir
+    """
+    paths = [os.path.join(pdf_dir, n) for n in sorted(os.listdir(pdf_dir)) if n.lower().endswith(".pdf")]
+    os.makedirs(out_dir, exist_ok=True)
+
+    issues: List[str] = []
+    page_issue: List[int] = []
+    page_no: List[int] = []
+    starts: List[int] = []
+    ends: List[int] = []
+    pos = 0
+    sep = PAGE_SEP.encode("utf-8")
+    tmp = os.path.join(out_dir, CORPUS_TEXT + ".tmp")
+    with open(tmp, "wb") as f, ProcessPoolExecutor(max_workers=workers) as pool:
+        for issue, pages in pool.map(issue_pages, paths, [normalise] * len(paths)):
+            issues.append(issue)
+            for n, text in pages:
+                data = text.encode("utf-8")
+                page_issue.append(len(issues) - 1)
+                page_no.append(n)
+                starts.append(pos)
+                ends.append(pos + len(data))
+                f.write(data + sep)
+                pos += len(data) + len(sep)
+    os.replace(tmp, os.path.join(out_dir, CORPUS_TEXT))
+    np.savez(os.path.join(out_dir, CORPUS_INDEX),
+             issues=np.array(issues, dtype=str),
+             page_issue=np.array(page_issue, dtype=np.int32),
+             page_no=np.array(page_no, dtype=np.int32),
+             start=np.array(starts, dtype=np.int64),
+             end=np.array(ends, dtype=np.int64),
+             normalised=np.array(normalise))
+    return out_dir
+
+
+class Corpus:
+    """
+    Read-only view of a built corpus. The text is memory-mapped, so opening is instant and only the pages touched
+    are read; regex scans run over the whole file in one pass.
+
+        with Corpus("data/corpus") as corpus:
+            corpus.page_text("issue_042", 7)
+            for hit in corpus.scan(r"corrie of \\w+"):
+                ...
+    """
+
+    def __init__(self, corpus_dir: str):
+        self.corpus_dir = corpus_dir
+        index = np.load(os.path.join(corpus_dir, CORPUS_INDEX))
+        self.issues: List[str] = [str(i) for i in index["issues"]]
+        self.page_issue = index["page_issue"]
+        self.page_no = index["page_no"]
+        self.start = index["start"]
+        self.end = index["end"]
+        self.normalised = bool(index["normalised"])
+        self._issue_pos = {issue: i for i, issue in enumerate(self.issues)}
+        # page rows of issue i are first_page[i]:first_page[i + 1] (pages are written issue by issue)
+        counts = np.bincount(self.page_issue, minlength=len(self.issues))
+        self.first_page = np.concatenate([[0], np.cumsum(counts)])
+
+        self._file = open(os.path.join(corpus_dir, CORPUS_TEXT), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def close(self) -> None:
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self) -> "Corpus":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def _row(self, issue: str, page: int) -> int:
+        i = self._issue_pos[issue]
+        lo, hi = self.first_page[i], self.first_page[i + 1]
+        j = lo + int(np.searchsorted(self.page_no[lo:hi], page))
+        if j >= hi or self.page_no[j] != page:
+            raise KeyError(f"issue {issue} has no page {page}")
+        return j
+
+    def _decode(self, start: int, end: int) -> str:
+        return self._mm[start:end].decode("utf-8", errors="replace")
+
+    def pages(self, issue: str) -> List[Tuple[int, str]]:
+        """
+        [(page_number, text)] of one issue, the same shape as pdf_text.extract_text_pages
+        """
+        i = self._issue_pos[issue]
+        return [(int(self.page_no[j]), self._decode(self.start[j], self.end[j]))
+                for j in range(self.first_page[i], self.first_page[i + 1])]
+
+    def page_text(self, issue: str, page: int) -> str:
+        j = self._row(issue, page)
+        return self._decode(self.start[j], self.end[j])
+
+    def issue_text(self, issue: str) -> str:
+        """
+        Whole issue as pipeline.process_pdf sees it (pages joined with blank lines)
+        """
+        i = self._issue_pos[issue]
+        lo, hi = self.first_page[i], self.first_page[i + 1]
+        return self._decode(self.start[lo], self.end[hi - 1]) if hi > lo else ""
+
+    def passage(self, issue: str, page: int, offset: int, length: int = 300) -> str:
+        return self.page_text(issue, page)[max(0, offset):offset + length]
+
+    def _locate(self, byte_pos: int) -> Tuple[int, int]:
+        """
+        Page row and character offset within that page of a byte position in corpus.txt
+        """
+        j = int(np.searchsorted(self.start, byte_pos, side="right")) - 1
+        return j, len(self._mm[self.start[j]:byte_pos].decode("utf-8", errors="replace"))
+
+    def scan(self, pattern: str, flags: int = re.IGNORECASE) -> Iterator[CorpusHit]:
+        """
+        Every match of a regex across the whole corpus, in corpus order. Patterns are matched on the UTF-8 bytes, so
+        \\w etc. are ASCII-only- fine for the journal text.
+        """
+        rx = re.compile(pattern.encode("utf-8"), flags)
+        for m in rx.finditer(self._mm):
+            j, offset = self._locate(m.start())
+            if m.start() >= self.end[j]:  # match begins in a page separator
+                continue
+            yield CorpusHit(self.issues[self.page_issue[j]], int(self.page_no[j]), offset,
+                            m.group().decode("utf-8", errors="replace"))
+
+    def count(self, pattern: str, flags: int = re.IGNORECASE) -> Dict[str, int]:
+        """
+        Matches per issue (issues without a match get 0)
+        """
+        rx = re.compile(pattern.encode("utf-8"), flags)
+        positions = np.fromiter((m.start() for m in rx.finditer(self._mm)), dtype=np.int64)
+        rows = np.searchsorted(self.start, positions, side="right") - 1
+        rows = rows[positions < self.end[rows]]  # as scan(): drop matches that begin in a page separator
+        per_issue = np.bincount(self.page_issue[rows], minlength=len(self.issues)) if len(rows) else \
+            np.zeros(len(self.issues), dtype=np.int64)
+        return {issue: int(n) for issue, n in zip(self.issues, per_issue)}
+
+    def stats(self) -> List[Dict]:
+        """
+        Pages and UTF-8 bytes per issue
+        """
+        nbytes = np.bincount(self.page_issue, weights=self.end - self.start, minlength=len(self.issues))
+        pages = np.diff(self.first_page)
+        return [{"issue": issue, "pages": int(p), "bytes": int(b)} for issue, p, b in zip(self.issues, pages, nbytes)]
+
+
+def main():
+    """
+    python -m snow_miner.corpus build --pdf-dir data/pdfs --corpus-dir data/corpus
+    python -m snow_miner.corpus scan "corrie of \\w+" --corpus-dir data/corpus
+    python -m snow_miner.corpus count "cornice" --corpus-dir data/corpus
+    python -m snow_miner.corpus page issue_042 7 --corpus-dir data/corpus
+    python -m snow_miner.corpus stats --corpus-dir data/corpus
+    """
+    ap = argparse.ArgumentParser(description="Memory-mapped whole-corpus text store")
+    ap.add_argument("command", choices=["build", "scan", "count", "page", "stats"])
+    ap.add_argument("args", nargs="*", help="scan/count: PATTERN; page: ISSUE PAGE")
+    ap.add_argument("--pdf-dir", type=str, default="data/pdfs")
+    ap.add_argument("--corpus-dir", type=str, default="data/corpus")
+    ap.add_argument("--no-normalise", action="store_true", help="Store raw pdfminer text")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--limit", type=int, default=50, help="Max scan hits to print")
+    args = ap.parse_args()
+
+    if args.command == "build":
+        build_corpus(args.pdf_dir, args.corpus_dir, normalise=not args.no_normalise, workers=args.workers)
+        with Corpus(args.corpus_dir) as corpus:
+            print(f"{len(corpus.issues)} issues, {len(corpus)} pages in {args.corpus_dir}")
+        return
+
+    with Corpus(args.corpus_dir) as corpus:
+        if args.command == "scan":
+            for n, hit in enumerate(corpus.scan(args.args[0])):
+                if n >= args.limit:
+                    break
+                print(f"{hit.issue} p{hit.page} @{hit.offset}: {hit.text}")
+        elif args.command == "count":
+            print(json.dumps({k: v for k, v in corpus.count(args.args[0]).items() if v}, indent=2))
+        elif args.command == "page":
+            print(corpus.page_text(args.args[0], int(args.args[1])))
+        else:
+            for row in corpus.stats():
+                print(f"{row['issue']:>6}  {row['pages']:4d} pages  {row['bytes']:9d} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+from __future__ import annotations
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from snow_miner.gazetteer import DEFAULT_POINTS
+
+CUBE_FILE = "cube.npz"
+MANIFEST_FILE = "manifest.json"
+
+DIMS = ("year", "season", "month", "general_location")
+N_SCORES = 11  # scores are integers 0-10, so a per-cell histogram gives exact counts, sums, means and quantiles
+HIST_COLS = [f"h{i}" for i in range(N_SCORES)]
+UNKNOWN = ""  # missing season/location
+SEASONS = ("Winter", "Spring", "Summer", "Autumn")
+# meteorological seasons, for rows with a month but no season of their own
+MONTH_SEASON = {12: "Winter", 1: "Winter", 2: "Winter", 3: "Spring", 4: "Spring", 5: "Spring",
+                6: "Summer", 7: "Summer", 8: "Summer", 9: "Autumn", 10: "Autumn", 11: "Autumn"}
+QUANTILES = (0.25, 0.5, 0.75, 0.9)
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cube_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Points-table rows -> the cube dimensions plus an integer score. Year 0 / month 0 mean unknown; season falls back to
+    the month's meteorological season.
+    """
+    score = pd.to_numeric(df["score"], errors="coerce")
+    df = df[score.notna()]
+    score = score[score.notna()].round().clip(0, N_SCORES - 1).astype(np.int64)
+    month = pd.to_numeric(df["month"], errors="coerce").fillna(0).astype(np.int64)
+    season = df["season"].astype("string").str.strip().str.title()
+    season = season.where(season.isin(SEASONS), month.map(MONTH_SEASON)).fillna(UNKNOWN)
+    return pd.DataFrame({
+        "year": pd.to_numeric(df["year"], errors="coerce").fillna(0).astype(np.int64).to_numpy(),
+        "season": season.astype(str).to_numpy(),
+        "month": month.to_numpy(),
+        "general_location": df["general_location"].astype("string").fillna(UNKNOWN).str.strip().to_numpy(dtype=object),
+        "score": score.to_numpy(),
+    })
+
+
+def _histogram_cells(rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per populated cell: the dims plus h0..h10 counts
+    """
+    if rows.empty:
+        return pd.DataFrame(columns=list(DIMS) + HIST_COLS)
+    hist = rows.groupby(list(DIMS) + ["score"], sort=False).size().unstack("score", fill_value=0)
+    hist = hist.reindex(columns=range(N_SCORES), fill_value=0)
+    hist.columns = HIST_COLS
+    return hist.reset_index()
+
+
+def hist_stats(hist: np.ndarray, quantiles: Sequence[float] = QUANTILES) -> Dict[str, np.ndarray]:
+    """
+    count / sum / mean / quantiles per row of an (n, 11) score histogram, all vectorised. Quantiles are the lower
+    quantile (first score whose cumulative share reaches q), exact for integer scores.
+    """
+    hist = np.asarray(hist, dtype=np.int64)
+    scores = np.arange(N_SCORES)
+    count = hist.sum(axis=1)
+    total = hist @ scores
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+    out = {"n": count, "sum": total, "mean": mean}
+    cum = np.cumsum(hist, axis=1)
+    for q in quantiles:
+        need = np.ceil(q * count)[:, None]
+        idx = np.argmax(cum >= np.maximum(need, 1), axis=1).astype(float)
+        out[f"q{int(round(q * 100))}"] = np.where(count > 0, idx, np.nan)
+    return out
+
+
+class ScoreCube:
+    """
+    Score histograms per (year, season, month, general_location) cell. Built once from the points table, grown
+    incrementally from curated issue CSVs, and queried by summing the histograms of the selected cells, so a slice
+    costs O(cells) rather than a pass over every row.
+    """
+
+    def __init__(self, cells: Optional[pd.DataFrame] = None, sources: Optional[Dict[str, str]] = None):
+        self.cells = cells if cells is not None else _histogram_cells(pd.DataFrame())
+        self.sources: Dict[str, str] = dict(sources or {})  # ingested file name -> sha256
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    @classmethod
+    def from_rows(cls, df: pd.DataFrame, source: Optional[str] = None, sha: Optional[str] = None) -> "ScoreCube":
+        cube = cls(_histogram_cells(cube_rows(df)))
+        if source:
+            cube.sources[source] = sha or ""
+        return cube
+
+    def add(self, other: "ScoreCube") -> "ScoreCube":
+        merged = pd.concat([self.cells, other.cells], ignore_index=True)
+        merged[HIST_COLS] = merged[HIST_COLS].astype(np.int64)
+        self.cells = merged.groupby(list(DIMS), as_index=False, sort=True)[HIST_COLS].sum()
+        self.sources.update(other.sources)
+        return self
+
+    # ---------- persistence ----------
+    def save(self, cube_dir: str) -> str:
+        """
+        cube.npz (dims as codes + int32 histograms, no pickled objects) and manifest.json (ingested sources)
+        """
+        os.makedirs(cube_dir, exist_ok=True)
+        seasons, season_codes = np.unique(self.cells["season"].astype(str).to_numpy(), return_inverse=True)
+        locations, location_codes = np.unique(self.cells["general_location"].astype(str).to_numpy(), return_inverse=True)
+        np.savez_compressed(
+            os.path.join(cube_dir, CUBE_FILE),
+            year=self.cells["year"].to_numpy(dtype=np.int16),
+            month=self.cells["month"].to_numpy(dtype=np.int8),
+            season_code=season_codes.astype(np.int16), seasons=seasons.astype(str),
+            location_code=location_codes.astype(np.int16), locations=locations.astype(str),
+            hist=self.cells[HIST_COLS].to_numpy(dtype=np.int32),
+        )
+        with open(os.path.join(cube_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump({"sources": self.sources, "cells": len(self.cells), "rows": int(self.cells[HIST_COLS].sum().sum())},
+                      f, indent=2)
+        return cube_dir
+
+    @classmethod
+    def load(cls, cube_dir: str) -> "ScoreCube":
+        data = np.load(os.path.join(cube_dir, CUBE_FILE))
+        cells = pd.DataFrame({
+            "year": data["year"].astype(np.int64),
+            "season": data["seasons"][data["season_code"]],
+            "month": data["month"].astype(np.int64),
+            "general_location": data["locations"][data["location_code"]],
+        })
+        cells[HIST_COLS] = data["hist"].astype(np.int64)
+        with open(os.path.join(cube_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            sources = json.load(f).get("sources", {})
+        return cls(cells, sources)
+
+    # ---------- queries ----------
+    def query(self, by: Sequence[str] = ("general_location",), years: Optional[Tuple[int, int]] = None,
+              season: Optional[str] = None, month: Optional[int] = None, location: Optional[str] = None,
+              include_unknown: bool = False) -> pd.DataFrame:
+        """
+        Summary stats of a slice, grouped by any of year, decade, season, month, general_location
+
+            cube.query(by=["decade"], location="Lochnagar")               # a region over decades
+            cube.query(by=["general_location"], season="Spring")          # a season across all regions
+            cube.query(by=["year"], years=(1950, 1979), month=6)
+
+        include_unknown: keep cells with an unknown value in a `by` dimension (year 0, month 0, blank season/location)
+
+        returns: DataFrame with the `by` columns and n, sum, mean, q25, q50, q75, q90
+        """
+        c = self.cells
+        mask = np.ones(len(c), dtype=bool)
+        if years is not None:
+            mask &= (c["year"].to_numpy() >= years[0]) & (c["year"].to_numpy() <= years[1])
+        if season is not None:
+            mask &= c["season"].to_numpy() == season.title()
+        if month is not None:
+            mask &= c["month"].to_numpy() == month
+        if location is not None:
+            mask &= c["general_location"].to_numpy() == location
+        c = c[mask]
+        if "decade" in by:
+            c = c.assign(decade=(c["year"] // 10) * 10)
+        if not include_unknown:
+            for dim in by:
+                col = "year" if dim == "decade" else dim
+                c = c[c[col] != (0 if col in ("year", "month") else UNKNOWN)]
+
+        if by:
+            grouped = c.groupby(list(by), sort=True)[HIST_COLS].sum()
+            keys = grouped.index.to_frame(index=False)
+        else:
+            grouped = c[HIST_COLS].sum().to_frame().T
+            keys = pd.DataFrame(index=range(1))
+        stats = hist_stats(grouped.to_numpy())
+        return pd.concat([keys.reset_index(drop=True), pd.DataFrame(stats)], axis=1)
+
+    def to_json(self, path: str) -> str:
+        """
+        Compact per-cell summary for the web map (docs/): one record per cell with n, mean and median
+        """
+        stats = hist_stats(self.cells[HIST_COLS].to_numpy())
+        records = [
+            {"year": int(y) or None, "season": s or None, "month": int(m) or None, "general_location": g or None,
+             "n": int(n), "mean": round(float(mean), 3), "median": int(q50)}
+            for y, s, m, g, n, mean, q50 in zip(self.cells["year"], self.cells["season"], self.cells["month"],
+                                                self.cells["general_location"], stats["n"], stats["mean"], stats["q50"])
+        ]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"dims": list(DIMS), "cells": records}, f, separators=(",", ":"))
+        return path
+
+
+def text_key(text) -> str:
+    """
+    Snippet text folded for matching curated rows against points.csv (case, whitespace, leading/trailing ... and
+    punctuation ignored)
+    """
+    return " ".join(str(text).lower().strip(" .…\"'").split()) if isinstance(text, str) else ""
+
+
+def issue_publication_year(issue: str, pdf_dir: Optional[str]) -> Optional[int]:
+    """
+    Front-page publication year of an issue ("042") from its PDF in pdf_dir- issue_042.pdf or the club's file name
+    """
+    if not pdf_dir or not os.path.isdir(pdf_dir):
+        return None
+    from snow_miner.dates import publication_year
+    from snow_miner.pipeline import detect_issue_from_filename
+
+    for name in sorted(os.listdir(pdf_dir)):
+        if name.lower().endswith(".pdf") and detect_issue_from_filename(name) == f"issue_{issue}":
+            import fitz  # PyMuPDF
+
+            with fitz.open(os.path.join(pdf_dir, name)) as doc:
+                return publication_year(doc[0].get_text()) if len(doc) else None
+    return None
+
+
+def _curated_rows(path: str, gazetteer, gaz_re, fallback_year: Optional[int] = None,
+                  known_texts: Optional[set] = None) -> pd.DataFrame:
+    """
+    A hand_curated issue CSV (text, entity, score, location, date, ...) in points-table shape: dates parsed (yearless
+    ones get the issue's fallback_year), locations resolved to a general_location with the gazetteer
+
+    known_texts: text_key of rows already in the cube (points.csv)- these rows are left out so they aren't counted twice
+    """
+    from snow_miner.dates import normalise_dates
+    from snow_miner.gazetteer import resolve_location
+
+    df = pd.read_csv(path)
+    if known_texts and "text" in df.columns:
+        dup = df["text"].map(text_key).isin(known_texts)
+        if dup.any():
+            print(f"[cube] {os.path.basename(path)}: {int(dup.sum())} of {len(df)} rows already in points.csv")
+        df = df[~dup].reset_index(drop=True)
+    parts = normalise_dates(df["date"] if "date" in df.columns else [None] * len(df), fallback_year)
+    general = [resolve_location(loc, text, gazetteer, gaz_re)[1]
+               for loc, text in zip(df.get("location", [None] * len(df)), df.get("text", [""] * len(df)))]
+    return pd.DataFrame({"score": df["score"], "year": parts["year"], "season": parts["season"],
+                         "month": parts["month"], "general_location": general})
+
+
+def build_cube(points_csv: str = DEFAULT_POINTS) -> ScoreCube:
+    from snow_miner.dataset import load_points
+
+    df = load_points(points_csv)
+    return ScoreCube.from_rows(df, source=os.path.basename(points_csv), sha=_file_sha256(points_csv))
+
+
+def update_cube(cube: ScoreCube, curated_dir: str, points_csv: str = DEFAULT_POINTS,
+                pdf_dir: Optional[str] = None) -> Tuple[ScoreCube, List[str]]:
+    """
+    Fold in curated issue CSVs not seen before- only the new files are read. points.csv is compiled from curated
+    issues, so rows whose text is already in it are skipped. Histogram counts can't be subtracted back out by row, so
+    if an already ingested file changed (or points.csv did) the cube is rebuilt from scratch.
+
+    pdf_dir: issue PDFs, for the publication year that yearless dates fall back to (as in the annotator)
+
+    returns: (cube, files added)
+    """
+    from snow_miner.gazetteer import build_gazetteer, gazetteer_regex
+
+    paths = sorted(glob.glob(os.path.join(curated_dir, "issue_*_curated.csv")))
+    shas = {os.path.basename(p): _file_sha256(p) for p in paths}
+    points_name = os.path.basename(points_csv)
+    changed = [name for name, sha in shas.items() if cube.sources.get(name, sha) != sha]
+    if points_name in cube.sources and cube.sources[points_name] != _file_sha256(points_csv):
+        changed.append(points_name)
+    if changed:
+        print(f"[cube] {', '.join(changed)} changed since ingest; rebuilding")
+        cube = build_cube(points_csv)
+
+    added: List[str] = []
+    gazetteer = gaz_re = known = None
+    for path in paths:
+        name = os.path.basename(path)
+        if name in cube.sources:
+            continue
+        if gazetteer is None:
+            from snow_miner.dataset import load_points
+
+            gazetteer = build_gazetteer(points_csv)
+            gaz_re = gazetteer_regex(gazetteer)
+            known = set(load_points(points_csv)["text"].map(text_key)) if points_name in cube.sources else set()
+        issue = name[len("issue_"):-len("_curated.csv")]
+        rows = _curated_rows(path, gazetteer, gaz_re, issue_publication_year(issue, pdf_dir), known)
+        cube.add(ScoreCube.from_rows(rows, source=name, sha=shas[name]))
+        added.append(name)
+    return cube, added
+
+
+def main():
+    """
+    python -m snow_miner.cube build --points docs/data/points.csv --cube-dir data/cube --json docs/data/cube.json
+    python -m snow_miner.cube update --curated-dir hand_curated --cube-dir data/cube --pdf-dir data/pdfs
+    python -m snow_miner.cube query --by decade --location Lochnagar
+    python -m snow_miner.cube query --by general_location --season spring
+    """
+    ap = argparse.ArgumentParser(description="Year x season x month x region snow score cube")
+    ap.add_argument("command", choices=["build", "update", "query"])
+    ap.add_argument("--points", type=str, default=DEFAULT_POINTS)
+    ap.add_argument("--curated-dir", type=str, default="hand_curated")
+    ap.add_argument("--pdf-dir", type=str, default=None, help="update: issue PDFs, for publication-year fallbacks")
+    ap.add_argument("--cube-dir", type=str, default="data/cube")
+    ap.add_argument("--json", type=str, default=None, help="Also write the per-cell JSON summary for the web map")
+    ap.add_argument("--by", nargs="*", default=["general_location"],
+                    choices=["year", "decade", "season", "month", "general_location"])
+    ap.add_argument("--years", type=int, nargs=2, default=None)
+    ap.add_argument("--season", type=str, default=None)
+    ap.add_argument("--month", type=int, default=None)
+    ap.add_argument("--location", type=str, default=None)
+    args = ap.parse_args()
+
+    if args.command == "build":
+        cube = build_cube(args.points)
+        cube.save(args.cube_dir)
+        print(f"{len(cube)} cells from {args.points} -> {args.cube_dir}")
+    elif args.command == "update":
+        cube = ScoreCube.load(args.cube_dir)
+        cube, added = update_cube(cube, args.curated_dir, args.points, pdf_dir=args.pdf_dir)
+        cube.save(args.cube_dir)
+        print(f"Added {len(added)} curated issues; {len(cube)} cells")
+    else:
+        cube = ScoreCube.load(args.cube_dir)
+        years = tuple(args.years) if args.years else None
+        out = cube.query(by=args.by, years=years, season=args.season, month=args.month, location=args.location)
+        with pd.option_context("display.max_rows", 500, "display.width", 160):
+            print(out.to_string(index=False))
+        return
+    if args.json:
+        print(cube.to_json(args.json))
+
+
+if __name__ == "__main__":
+    main()
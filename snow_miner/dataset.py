@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import pickle
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from snow_miner.gazetteer import DEFAULT_POINTS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_DIR = os.path.join(REPO_ROOT, "data", "cache")
+CACHE_VERSION = 1  # bump when the parsed layout below changes
+
+SEASONS = ["Winter", "Spring", "Summer", "Autumn"]
+
+# column -> dtype after parsing. Free text stays a string column; anything with few distinct values is a categorical
+POINTS_SCHEMA: Dict[str, str] = {
+    "text": "string",
+    "entity": "category",
+    "score": "Int8",
+    "date": "string",
+    "annotator_comment": "string",
+    "general_location": "category",
+    "specific_location": "category",
+    "year": "Int16",
+    "season": "category",
+    "month": "Int8",
+    "day": "Int8",
+    "lat": "float32",
+    "lon": "float32",
+}
+RAW_COLUMNS = [c for c in POINTS_SCHEMA if c not in ("lat", "lon")] + ["Coordinates"]
+
+# "(57.09969, -3.6656)"
+COORD_PATTERN = r"^\s*\(?\s*(?P<lat>[-+]?\d+(?:\.\d*)?)\s*,\s*(?P<lon>[-+]?\d+(?:\.\d*)?)\s*\)?\s*$"
+
+# valid ranges for the numeric columns (inclusive)
+RANGES: Dict[str, Tuple[float, float]] = {"score": (0, 10), "year": (1000, 2100), "month": (1, 12), "day": (1, 31),
+                                          "lat": (-90, 90), "lon": (-180, 180)}
+
+
+def parse_coordinates(coords: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    "(lat, lon)" strings -> float32 lat and lon arrays in one vectorised pass (NaN where missing)
+    """
+    parts = coords.astype("string").str.extract(COORD_PATTERN)
+    return (pd.to_numeric(parts["lat"]).to_numpy(dtype=np.float32, na_value=np.nan),
+            pd.to_numeric(parts["lon"]).to_numpy(dtype=np.float32, na_value=np.nan))
+
+
+def _small_int(values: pd.Series, dtype: str, strict: bool, problems: List[str]) -> pd.Series:
+    num = pd.to_numeric(values, errors="coerce")
+    bad = num.notna() & (num != num.round())
+    if bad.any():
+        raise ValueError(f"{values.name}: non-integer values at rows {list(num.index[bad][:10])}")
+    lo, hi = RANGES[values.name]
+    out = num.notna() & ((num < lo) | (num > hi))
+    if out.any():
+        msg = f"{values.name}: {int(out.sum())} values outside {lo}..{hi} (rows {list(num.index[out][:10])})"
+        if strict:
+            raise ValueError(msg)
+        problems.append(msg)
+        num = num.mask(out)
+    return num.astype(dtype)
+
+
+def validate_points(df: pd.DataFrame) -> List[str]:
+    """
+    Problems with a parsed points table: wrong dtypes, values out of range, coordinates that didn't parse, unknown
+    seasons. Empty list means it is fine.
+    """
+    problems = []
+    for col, dtype in POINTS_SCHEMA.items():
+        if col not in df.columns:
+            problems.append(f"missing column {col}")
+        elif str(df[col].dtype) != dtype:
+            problems.append(f"{col}: dtype {df[col].dtype}, expected {dtype}")
+    for col, (lo, hi) in RANGES.items():
+        if col in df.columns:
+            vals = df[col]
+            bad = vals.notna() & ((vals < lo) | (vals > hi))
+            if bad.any():
+                problems.append(f"{col}: {int(bad.sum())} values outside {lo}..{hi} (rows {list(df.index[bad][:10])})")
+    if "season" in df.columns:
+        unknown = set(df["season"].cat.categories) - set(SEASONS)
+        if unknown:
+            problems.append(f"season: unknown values {sorted(unknown)}")
+    return problems
+
+
+def parse_points(raw: pd.DataFrame, strict: bool = False) -> pd.DataFrame:
+    """
+    Raw points.csv frame (all strings/floats) -> the typed layout in POINTS_SCHEMA
+
+    strict: raise on out-of-range date parts/scores too. By default they become <NA> and are reported (the curated
+        table has a couple of typos such as day 238)
+
+    raises: ValueError if columns are missing or values can't be parsed as their type
+    """
+    missing = [c for c in RAW_COLUMNS if c not in raw.columns]
+    if missing:
+        raise ValueError(f"points table is missing columns {missing}")
+
+    dropped: List[str] = []
+    out = pd.DataFrame(index=raw.index)
+    for col, dtype in POINTS_SCHEMA.items():
+        if col in ("lat", "lon"):
+            continue
+        if dtype.startswith("Int"):
+            out[col] = _small_int(raw[col], dtype, strict, dropped)
+        elif col == "season":
+            season = raw[col].astype("string").str.strip().str.title()
+            unknown = season.dropna()[~season.dropna().isin(SEASONS)]
+            if len(unknown):
+                raise ValueError(f"season: unknown values {sorted(set(unknown))}")
+            out[col] = pd.Categorical(season, categories=SEASONS)
+        else:
+            out[col] = raw[col].astype(dtype)
+
+    out["lat"], out["lon"] = parse_coordinates(raw["Coordinates"])
+    unparsed = raw["Coordinates"].notna() & out["lat"].isna()
+    if unparsed.any():
+        raise ValueError(f"Coordinates: {int(unparsed.sum())} values did not parse, e.g. "
+                         f"{raw['Coordinates'][unparsed].iloc[0]!r}")
+
+    problems = validate_points(out)
+    if problems:
+        raise ValueError("points table failed validation: " + "; ".join(problems))
+    for msg in dropped:
+        print(f"[points] set to missing- {msg}")
+    return out
+
+
+def _cache_file(path: str, cache_dir: str) -> Tuple[str, Tuple]:
+    """
+    Cache file for a source CSV, and the key that says whether it is still valid (source mtime + size + layout)
+    """
+    src = os.path.abspath(path)
+    st = os.stat(src)
+    name = hashlib.sha1(src.encode("utf-8")).hexdigest()[:12]
+    base = os.path.splitext(os.path.basename(src))[0]
+    return os.path.join(cache_dir, f"{base}.{name}.pkl"), (CACHE_VERSION, st.st_mtime_ns, st.st_size)
+
+
+def load_points(path: str = DEFAULT_POINTS, cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                refresh: bool = False, strict: bool = False) -> pd.DataFrame:
+    """
+    The curated points table, typed: float32 lat/lon parsed from "Coordinates", nullable Int8/Int16 date parts and
+    score, categoricals for entity/locations/season, strings for free text. The parsed frame is pickled into
+    cache_dir, keyed by the CSV's mtime and size, so repeat loads skip CSV parsing altogether.
+
+    cache_dir: None to always parse
+    refresh: ignore (and rewrite) an existing cache
+    strict: see parse_points (a strict load never reads or writes the cache)
+
+    raises: ValueError on a malformed table
+    """
+    cache_path = key = None
+    if cache_dir and not strict:
+        cache_path, key = _cache_file(path, cache_dir)
+        if not refresh and os.path.exists(cache_path):
+            try:
+                with open(cache_path, "rb") as f:
+                    cached_key, df = pickle.load(f)
+                if cached_key == key:
+                    return df
+            except (pickle.UnpicklingError, EOFError, ValueError, AttributeError, ImportError):
+                pass  # unreadable cache (partial write, pandas upgrade)- just rebuild it
+
+    df = parse_points(pd.read_csv(path, usecols=RAW_COLUMNS), strict=strict)
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump((key, df), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_path)
+    return df
+
+
+def memory_report(df: pd.DataFrame) -> str:
+    return f"{len(df)} rows, {df.memory_usage(deep=True).sum() / 1e6:.2f} MB"
+
+
+def main():
+    """
+    python -m snow_miner.dataset                      # parse + cache docs/data/points.csv, compare with plain read_csv
+    python -m snow_miner.dataset --points other.csv --refresh
+    """
+    ap = argparse.ArgumentParser(description="Typed, cached loader for the curated points table")
+    ap.add_argument("--points", type=str, default=DEFAULT_POINTS)
+    ap.add_argument("--cache-dir", type=str, default=DEFAULT_CACHE_DIR)
+    ap.add_argument("--refresh", action="store_true", help="Rebuild the cache")
+    ap.add_argument("--strict", action="store_true", help="Fail on out-of-range values instead of dropping them")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    raw = pd.read_csv(args.points)
+    t_raw = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    df = load_points(args.points, cache_dir=args.cache_dir, refresh=args.refresh, strict=args.strict)
+    t_first = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    load_points(args.points, cache_dir=args.cache_dir)
+    t_cached = time.perf_counter() - t0
+
+    print(df.dtypes.to_string())
+    print(f"read_csv:            {memory_report(raw)} in {t_raw * 1000:.1f} ms")
+    print(f"load_points:         {memory_report(df)} in {t_first * 1000:.1f} ms")
+    print(f"load_points (cache): {t_cached * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
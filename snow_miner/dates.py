@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import argparse
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, NamedTuple, Optional, Sequence, Union
+
+import regex as re
+
+from snow_miner.config import YEAR_REGEX
+
+MONTH_NUMBERS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+SEASON_NAMES = {"winter": "Winter", "spring": "Spring", "summer": "Summer", "autumn": "Autumn", "fall": "Autumn"}
+
+_MONTH = r"(?P<month>jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sept?(?:ember)?|" \
+         r"oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?"
+_DAY = r"(?P<day>\d{1,2})(?:st|nd|rd|th)?"
+_YEAR = r"(?P<year>\d{4})"
+_QUALIFIER = r"(?:(?:the\s+)?(?:early|mid|late|end\s+of|beginning\s+of|start\s+of)[\s-]+)?"  # early April, mid-winter
+
+# Annotator formats first (see human_annotation/human_verfication.md), then the usual prose forms. Whole-string matches.
+_FAST_PATTERNS = [re.compile(p, flags=re.IGNORECASE) for p in [
+    r"(?P<day>\d{1,2}|-)\s*/\s*(?P<mnum>\d{1,2})\s*/\s*(?P<year>\d{2}|\d{4})",  # 13/04/1893, -/04/1893, 13/4/93
+    r"(?P<day>\d{1,2})-(?P<mnum>\d{1,2})-(?P<year>\d{2}|\d{4})",  # 13-02-88
+    r"-\s*(?P<mnum>\d{1,2})\s*/\s*(?P<year>\d{4})",  # -06/1895
+    rf"{_QUALIFIER}(?P<season>winter|spring|summer|autumn|fall)(?:\s+(?:of\s+)?{_YEAR})?",  # Winter 1986, late summer
+    rf"{_DAY}\s+(?:of\s+)?{_MONTH},?(?:\s+{_YEAR})?",  # 12th July 2019, 17th April
+    rf"{_MONTH}\s+{_DAY}(?:,\s*{_YEAR})?",  # July 12, 2019
+    rf"{_QUALIFIER}{_MONTH}(?:,?\s+{_YEAR})?",  # July 2019, March, early April 1902, end of May 1930
+    rf"{_YEAR}\s+{_MONTH}",  # 2019 July
+    _YEAR,  # 1986
+]]
+
+
+class DateParts(NamedTuple):
+    year: Optional[int]
+    month: Optional[int]
+    day: Optional[int]
+    season: Optional[str]
+
+
+EMPTY = DateParts(None, None, None, None)
+
+
+def _valid(year: Optional[int], month: Optional[int], day: Optional[int]) -> DateParts:
+    if month is not None and not 1 <= month <= 12:
+        month, day = None, None
+    if day is not None and (month is None or not 1 <= day <= 31):
+        day = None
+    return DateParts(year, month, day, None)
+
+
+def _full_year(two_or_four: str, fallback_year: Optional[int]) -> int:
+    y = int(two_or_four)
+    if len(two_or_four) == 4:
+        return y
+    century = (fallback_year // 100) * 100 if fallback_year else 1900
+    return century + y
+
+
+def _fast_parse(raw: str, fallback_year: Optional[int]) -> Optional[DateParts]:
+    for rx in _FAST_PATTERNS:
+        m = rx.fullmatch(raw)
+        if not m:
+            continue
+        g = m.groupdict()
+        year = _full_year(g["year"], fallback_year) if g.get("year") else fallback_year
+        if g.get("season"):
+            return DateParts(year, None, None, SEASON_NAMES[g["season"].lower()])
+        month = None
+        if g.get("mnum"):
+            month = int(g["mnum"])
+        elif g.get("month"):
+            month = MONTH_NUMBERS[g["month"][:3].lower()]
+        day = int(g["day"]) if g.get("day") and g["day"] != "-" else None
+        return _valid(year, month, day)
+    return None
+
+
+@lru_cache(maxsize=256)
+def _date_parser(fallback_year: Optional[int]):
+    from dateparser.date import DateDataParser
+
+    settings = {"DATE_ORDER": "DMY", "PREFER_DATES_FROM": "past"}
+    if fallback_year:
+        settings["RELATIVE_BASE"] = datetime(fallback_year, 1, 1)
+    return DateDataParser(languages=["en"], settings=settings)
+
+
+def _dateparser_parse(raw: str, fallback_year: Optional[int]) -> DateParts:
+    """
+    Slow path for anything the fast patterns don't know. dateparser reports which parts it actually saw via the period.
+    """
+    data = _date_parser(fallback_year).get_date_data(raw)
+    if data is None or data.date_obj is None:
+        m = YEAR_REGEX.search(raw)
+        return DateParts(int(m.group(0)) if m else fallback_year, None, None, None)
+    d, period = data.date_obj, data.period
+    # dateparser fills a missing year from its base date (the wall clock without a fallback)- only trust a stated one
+    year = d.year if YEAR_REGEX.search(raw) else fallback_year
+    if period == "year":
+        return DateParts(year, None, None, None)
+    if period == "month":
+        return DateParts(year, d.month, None, None)
+    return DateParts(year, d.month, d.day, None)
+
+
+@lru_cache(maxsize=16384)
+def parse_date(raw: Optional[str], fallback_year: Optional[int] = None) -> DateParts:
+    """
+    Normalise one raw date mention ("Winter 1986", "-/04/1893", "17th April", "1896") into year/month/day/season.
+    Date strings repeat heavily across a journal, so this is memoised on (raw, fallback_year).
+
+    raw: the raw date string (GPT nearest-date match or annotator entry)
+    fallback_year: publication year of the issue, used when the mention has no year of its own
+
+    returns: DateParts with None for anything not stated
+    """
+    if raw is None:
+        return DateParts(fallback_year, None, None, None) if fallback_year else EMPTY
+    s = " ".join(str(raw).split()).strip(" .,;")
+    if not s or s in {"-", "nan", "None"}:
+        return DateParts(fallback_year, None, None, None) if fallback_year else EMPTY
+    parts = _fast_parse(s, fallback_year)
+    if parts is None:
+        parts = _dateparser_parse(s, fallback_year)
+    return parts
+
+
+def normalise_dates(values: Iterable[Optional[str]],
+                    fallback_years: Union[None, int, Sequence[Optional[int]]] = None):
+    """
+    Batched version of parse_date for a whole column: only the distinct (raw, fallback) pairs get parsed.
+
+    values: raw date strings (list or pandas Series)
+    fallback_years: one publication year for everything, or one per value
+
+    returns: pandas DataFrame with nullable year/month/day and a season column, aligned with values
+    """
+    import pandas as pd
+
+    raw = pd.Series(values, dtype="object")
+    if fallback_years is None or isinstance(fallback_years, int):
+        fallbacks = pd.Series([fallback_years] * len(raw), index=raw.index, dtype="object")
+    else:
+        fallbacks = pd.Series(list(fallback_years), index=raw.index, dtype="object")
+    raw = raw.where(raw.notna(), None)
+    fallbacks = fallbacks.map(lambda y: None if y is None or pd.isna(y) else int(y))
+
+    keys = list(zip(raw, fallbacks))
+    table = {k: parse_date(*k) for k in set(keys)}
+    parsed = [table[k] for k in keys]
+
+    out = pd.DataFrame(parsed, columns=list(DateParts._fields), index=raw.index)
+    for col, dtype in (("year", "Int16"), ("month", "Int8"), ("day", "Int8")):
+        out[col] = out[col].astype(dtype)
+    out["season"] = out["season"].astype("string")
+    return out
+
+
+def add_date_columns(df, date_col: str = "date", fallback_year: Union[None, int, str] = None):
+    """
+    Add year/season/month/day columns (as in docs/data/points.csv) derived from df[date_col]
+
+    fallback_year: a publication year, or the name of a column holding one per row
+    """
+    fallbacks = df[fallback_year] if isinstance(fallback_year, str) else fallback_year
+    parts = normalise_dates(df[date_col], fallbacks)
+    df = df.copy()
+    for col in ("year", "season", "month", "day"):
+        df[col] = parts[col]
+    return df
+
+
+def publication_year(first_page_text: str, lo: int = 1880, hi: Optional[int] = None) -> Optional[int]:
+    """
+    Guess the issue's publication year from its front page- the most frequent plausible year in the first few thousand
+    characters (the same value annotators are told to fall back to)
+    """
+    hi = hi or datetime.now().year
+    years = [int(m.group(0)) for m in YEAR_REGEX.finditer((first_page_text or "")[:4000])]
+    years = [y for y in years if lo <= y <= hi]
+    if not years:
+        return None
+    return Counter(years).most_common(1)[0][0]
+
+
+def main():
+    """
+    python -m snow_miner.dates out/issue_010.csv out/issue_010_dated.csv --fallback-year 1910
+    """
+    import pandas as pd
+
+    ap = argparse.ArgumentParser(description="Add year/season/month/day columns to an issue CSV")
+    ap.add_argument("in_csv", type=str)
+    ap.add_argument("out_csv", type=str)
+    ap.add_argument("--date-col", type=str, default="date")
+    ap.add_argument("--fallback-year", type=int, default=None, help="Publication year for partial dates")
+    args = ap.parse_args()
+
+    df = add_date_columns(pd.read_csv(args.in_csv), date_col=args.date_col, fallback_year=args.fallback_year)
+    df.to_csv(args.out_csv, index=False)
+    print(f"Wrote {args.out_csv} ({parse_date.cache_info().currsize} distinct dates parsed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+CHUNK_MARKER = "CHUNK:\n"
+
+# OpenAI only caches prompt prefixes of at least this many tokens, in steps of 128
+CACHE_MIN_TOKENS = 1024
+CACHE_STEP_TOKENS = 128
+
+
+def chunk_key(chunk: str) -> str:
+    """
+    Recording key for a chunk- shared with gpt_analyse so recordings and replays agree
+    """
+    return hashlib.sha256((chunk or "").strip().encode("utf-8")).hexdigest()
+
+
+def extract_chunk(messages: List[Dict]) -> str:
+    """
+    The chunk text of a chat request: whatever follows "CHUNK:" in the last user message (or the whole message)
+    """
+    user = [m for m in messages if m.get("role") == "user"]
+    content = user[-1].get("content", "") if user else ""
+    if isinstance(content, list):  # content parts
+        content = "".join(p.get("text", "") for p in content if isinstance(p, dict))
+    pos = content.rfind(CHUNK_MARKER)
+    return content[pos + len(CHUNK_MARKER):] if pos != -1 else content
+
+
+def load_recordings(path: Optional[str]) -> Dict[str, str]:
+    """
+    JSONL of {"key": chunk_key, "content": raw model output} as written by gpt_analyse when SNOW_MINER_RECORD is set
+    """
+    out: Dict[str, str] = {}
+    if not path or not os.path.exists(path):
+        return out
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                rec = json.loads(line)
+                out[rec["key"]] = rec["content"]
+    return out
+
+
+def append_recording(path: str, chunk: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"key": chunk_key(chunk), "chunk_preview": chunk[:80], "content": content}) + "\n")
+
+
+def synthetic_content(chunk: str) -> str:
+    """
+    Fallback answer for chunks without a recording: the offline regex extractor's rows, in the GPT output format.
+    Packed chunks ([[W1]] ... [[/W1]]) get a "window" tag on each row, as the system prompt asks for. The cascade's
+    screening call gets {"snow": ...}- true if the regex extractor finds anything.
+    """
+    from snow_miner.cascade import CHECK_MARKER
+    from snow_miner.gpt_analyse import split_windows
+    from snow_miner.regex_extract import analyze_with_regex
+
+    if chunk.startswith(CHECK_MARKER):
+        # the cascade's yes/no screening call
+        return json.dumps({"snow": bool(analyze_with_regex(chunk[len(CHECK_MARKER):]))})
+    windows = split_windows(chunk)
+    rows = []
+    for wid, text in windows:
+        for r in analyze_with_regex(text):
+            row = {k: r[k] for k in ("text", "entity", "location", "score")}
+            if len(windows) > 1:
+                row["window"] = wid
+            rows.append(row)
+    return json.dumps({"rows": rows})
+
+
+MALFORMED_KINDS = ("fenced", "truncated", "prose", "bad_rows")
+
+
+def malform(content: str, kind: str) -> str:
+    """
+    Break a good answer the ways chat models do: markdown fences, cut off mid-row, an apology instead of JSON, or
+    rows with a missing text / non-numeric score
+    """
+    if kind == "fenced":
+        return f"```json\n{content}\n```"
+    if kind == "truncated":
+        return content[:max(1, int(len(content) * 0.7))]
+    if kind == "prose":
+        return "I'm sorry, but I can't help with extracting that."
+    try:
+        rows = json.loads(content).get("rows", [])
+    except ValueError:
+        return content
+    broken = [dict(r, score="high") if i % 2 else {k: v for k, v in r.items() if k != "text"}
+              for i, r in enumerate(rows)]
+    return json.dumps({"rows": broken or [{"score": 5}]})
+
+
+def _is_retry(messages: List[Dict]) -> bool:
+    from snow_miner.gpt_analyse import RETRY_NOTE
+
+    return bool(messages) and str(messages[-1].get("content", "")).startswith(RETRY_NOTE)
+
+
+class StandInConfig:
+    def __init__(self, recordings: Optional[Dict[str, str]] = None, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after_s: float = 1.0,
+                 seed: Optional[int] = None, malformed_rate: float = 0.0):
+        self.recordings = recordings or {}
+        self.malformed_rate = malformed_rate
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_s = retry_after_s
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.seen_prefixes: set = set()
+        self.stats = {"requests": 0, "replayed": 0, "synthetic": 0, "errors": 0, "rate_limited": 0, "malformed": 0}
+
+
+def _estimate_tokens(text: str) -> int:
+    return (len(text or "") + 3) // 4
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "snow-miner-openai-standin/1.0"
+
+    def log_message(self, fmt, *args):  # keep load tests quiet
+        pass
+
+    def _send(self, status: int, body: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            cfg: StandInConfig = self.server.config
+            with cfg.lock:
+                self._send(200, dict(cfg.stats))
+            return
+        self._send(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+        cfg: StandInConfig = self.server.config
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        messages = body.get("messages", [])
+
+        with cfg.lock:
+            cfg.stats["requests"] += 1
+            roll = cfg.rng.random()
+            delay = max(0.0, cfg.latency_ms + cfg.rng.uniform(-cfg.jitter_ms, cfg.jitter_ms)) / 1000.0
+        time.sleep(delay)
+
+        if roll < cfg.rate_limit_rate:
+            with cfg.lock:
+                cfg.stats["rate_limited"] += 1
+            self._send(429, {"error": {"message": "Rate limit reached (stand-in)", "type": "rate_limit_error",
+                                       "code": "rate_limit_exceeded"}},
+                       headers={"Retry-After": str(cfg.retry_after_s)})
+            return
+        if roll < cfg.rate_limit_rate + cfg.error_rate:
+            with cfg.lock:
+                cfg.stats["errors"] += 1
+            self._send(500, {"error": {"message": "Internal error (stand-in)", "type": "server_error"}})
+            return
+
+        chunk = extract_chunk(messages)
+        key = chunk_key(chunk)
+        content = cfg.recordings.get(key)
+        with cfg.lock:
+            cfg.stats["replayed" if content is not None else "synthetic"] += 1
+        if content is None:
+            content = synthetic_content(chunk)
+        # retries (RETRY_NOTE in the message) are answered properly, so the retry pass can be exercised end to end
+        if cfg.malformed_rate and not _is_retry(messages):
+            with cfg.lock:
+                bad = cfg.rng.random() < cfg.malformed_rate
+                kind = cfg.rng.choice(MALFORMED_KINDS)
+                cfg.stats["malformed"] += bad
+            if bad:
+                content = malform(content, kind)
+
+        # prompt caching: a repeated prefix (everything before the last user message) of >= 1024 tokens is "cached"
+        prefix = "".join(str(m.get("content", "")) for m in messages[:-1])
+        prompt_tokens = sum(_estimate_tokens(str(m.get("content", ""))) for m in messages)
+        cached = 0
+        prefix_tokens = _estimate_tokens(prefix)
+        if prefix_tokens >= CACHE_MIN_TOKENS:
+            digest = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+            with cfg.lock:
+                if digest in cfg.seen_prefixes:
+                    cached = prefix_tokens // CACHE_STEP_TOKENS * CACHE_STEP_TOKENS
+                cfg.seen_prefixes.add(digest)
+        completion_tokens = _estimate_tokens(content)
+
+        self._send(200, {
+            "id": f"chatcmpl-standin-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached},
+            },
+        })
+
+
+def make_server(host: str = "127.0.0.1", port: int = 0, config: Optional[StandInConfig] = None) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.config = config or StandInConfig()
+    return server
+
+
+def serve_in_thread(config: Optional[StandInConfig] = None, host: str = "127.0.0.1",
+                    port: int = 0) -> ThreadingHTTPServer:
+    """
+    Start the stand-in on a background thread. The base URL for OpenAI(base_url=...) is server.base_url;
+    call server.shutdown() when done.
+    """
+    server = make_server(host, port, config)
+    server.base_url = f"http://{host}:{server.server_address[1]}/v1"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    """
+    python -m snow_miner.fake_openai --port 8765 --recordings data/recordings.jsonl --latency-ms 800 --rate-limit-rate 0.05
+
+    then run the pipeline with OPENAI_BASE_URL=http://127.0.0.1:8765/v1 (or run_pipeline.py --openai-base-url ...)
+    """
+    ap = argparse.ArgumentParser(description="Local OpenAI chat-completions stand-in (record/replay + synthetic)")
+    ap.add_argument("--host", type=str, default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--recordings", type=str, default=None, help="JSONL written with SNOW_MINER_RECORD=...")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="Mean added latency per request")
+    ap.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- jitter on the latency")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+    ap.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on 429s")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--malformed-rate", type=float, default=0.0,
+                    help="Fraction of first-attempt answers broken (fenced, truncated, prose, invalid rows)")
+    args = ap.parse_args()
+
+    config = StandInConfig(load_recordings(args.recordings), args.latency_ms, args.jitter_ms, args.error_rate,
+                           args.rate_limit_rate, args.retry_after, args.seed, args.malformed_rate)
+    server = make_server(args.host, args.port, config)
+    print(f"OpenAI stand-in on http://{args.host}:{args.port}/v1 ({len(config.recordings)} recordings)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Optional, Pattern, Tuple
+
+DEFAULT_POINTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "docs", "data", "points.csv")
+
+# folded place name -> (canonical spelling, general_location)
+Gazetteer = Dict[str, Tuple[str, str]]
+
+
+def fold_text(s) -> str:
+    """
+    Lower case, no apostrophes, anything else non-alphanumeric -> single space ("Beinn a' Bhuird" == "beinn a bhuird")
+    """
+    s = re.sub(r"['’`]", "", str(s).lower())
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", s).split())
+
+
+def build_gazetteer(points_csv: str = DEFAULT_POINTS) -> Gazetteer:
+    """
+    Place names learnt from the already curated points table- both specific and general locations, each mapped to
+    its most common spelling and general_location
+    """
+    from snow_miner.dataset import load_points
+
+    df = load_points(points_csv)[["specific_location", "general_location"]].dropna()
+    spellings: Dict[str, Counter] = defaultdict(Counter)
+    generals: Dict[str, Counter] = defaultdict(Counter)
+    for specific, general in zip(df["specific_location"].astype(str), df["general_location"].astype(str)):
+        for name in (specific, general):
+            key = fold_text(name)
+            if len(key) >= 4:
+                spellings[key][name] += 1
+                generals[key][general] += 1
+    return {k: (spellings[k].most_common(1)[0][0], generals[k].most_common(1)[0][0]) for k in spellings}
+
+
+def gazetteer_regex(gazetteer: Gazetteer) -> Optional[Pattern]:
+    names = sorted(gazetteer, key=len, reverse=True)  # longest first so "loch etchachan shelter stone" wins
+    return re.compile(r"\b(" + "|".join(re.escape(n) for n in names) + r")\b") if names else None
+
+
+def resolve_location(raw_location, snippet: str, gazetteer: Gazetteer,
+                     gaz_re: Optional[Pattern]) -> Tuple[str, str]:
+    """
+    (location, general_location) from the given location if it is a known place, else the first known place named in
+    it or in the snippet itself. Unknown locations are kept as-is with no general location.
+    """
+    raw = "" if raw_location is None or str(raw_location).lower() == "nan" else str(raw_location).strip()
+    if raw and fold_text(raw) in gazetteer:
+        return gazetteer[fold_text(raw)]
+    if gaz_re is not None:
+        for candidate in (raw, snippet or ""):
+            m = gaz_re.search(fold_text(candidate))
+            if m:
+                return gazetteer[m.group(1)]
+    return raw, ""
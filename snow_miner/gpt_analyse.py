@@ -3,33 +3,101 @@ from __future__ import annotations
 
 import json
 import os
-from typing import List, Dict, Optional, Tuple
-
-from dotenv import load_dotenv
-from openai import OpenAI
-from tqdm import tqdm
+import re
+import time
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
 
+from snow_miner.instrumentation import get_metrics
 from snow_miner.regex_guardrails import DATE_REGEXES, is_snowy
 
-load_dotenv()
+if TYPE_CHECKING:
+    import threading
+
+    from openai import OpenAI
+
+    from snow_miner.cascade import Cascade
+
+# openai/tqdm/dotenv are imported on first API use- the date/chunk helpers here are used by offline tools too
+_client: Optional["OpenAI"] = None
+
+MODEL = "gpt-4o-mini"
+
+# transient API failures worth another go, with exponential backoff (the client's own retries are switched off so
+# every retry shows up in the run report)
+MAX_RETRIES = 4
+RETRY_BACKOFF_S = 1.0
+
+
+class Cancelled(Exception):
+    """
+    analyze_with_gpt's cancel event was set (work_queue: the job's lease was lost)- raised between requests
+    """
+
+
+def check_cancel(cancel: Optional["threading.Event"]) -> None:
+    if cancel is not None and cancel.is_set():
+        raise Cancelled()
 
-_client: Optional[OpenAI] = None
 
+def _retryable_errors() -> tuple:
+    import openai
 
-def get_client() -> OpenAI:
+    return (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """
+    Seconds a 429/503 response asked us to wait (Retry-After / retry-after-ms header), None if it didn't say
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            from email.utils import parsedate_to_datetime
+
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def get_client() -> "OpenAI":
     """
     Sets client for the user- a new user must put their API key in a .env file in root with "OPENAI_API_KEY="
+
+    OPENAI_BASE_URL points the client somewhere else, e.g. the local stand-in (python -m snow_miner.fake_openai),
+    in which case no real key is needed
     """
     global _client
     if _client is None:
-        api_key = os.getenv("OPENAI_API_KEY")
+        from dotenv import load_dotenv
+        from openai import OpenAI
+
+        load_dotenv()
+        base_url = os.getenv("OPENAI_BASE_URL") or None
+        api_key = os.getenv("OPENAI_API_KEY") or ("stand-in" if base_url else None)
         if not api_key:
             raise RuntimeError("OPENAI_API_KEY not set. Put it in a .env file.")
-        _client = OpenAI(api_key=api_key)
+        _client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
     return _client
 
 
-client = OpenAI()
+def configure_client(base_url: Optional[str] = None, api_key: Optional[str] = None) -> None:
+    """
+    Re-point the shared client (next get_client() builds a new one)
+    """
+    global _client
+    if base_url is not None:
+        os.environ["OPENAI_BASE_URL"] = base_url
+    if api_key is not None:
+        os.environ["OPENAI_API_KEY"] = api_key
+    _client = None
 
 
 def chunk_spans(text: str, max_chars: int = 12000, overlap: int = 4000) -> List[Tuple[int, int, str]]:
@@ -134,6 +202,191 @@ just do the best you can. And dont hallucinate.
 """
 
 
+# The system message is always exactly EXTRACTION_PROMPT so every request shares one prefix (OpenAI's prompt caching
+# keys on an identical prefix, once it is >= 1024 tokens). Only packed requests carry this note, after the prefix.
+PACKING_NOTE = (
+    "This CHUNK holds several unrelated WINDOWS from the same journal, each wrapped as [[W1]] ... [[/W1]]. "
+    'Add "window": "<id>" (e.g. "W1") to every row and never build a snippet across two windows.\n'
+)
+
+# second attempt at a window whose first answer was unusable
+RETRY_NOTE = (
+    'Your previous answer to this CHUNK was not valid. Reply with ONLY a JSON object {"rows": [...]}; every row needs '
+    '"text" (verbatim) and an integer "score" from 0 to 10.\n'
+)
+
+# rounds of the separate retry pass over windows whose response was unusable
+RETRY_ROUNDS = 2
+
+WINDOW_RE = re.compile(r"\[\[(W\d+)\]\]\n(.*?)\n\[\[/\1\]\]", flags=re.DOTALL)
+
+
+def format_windows(windows: List[Tuple[str, str]]) -> str:
+    """
+    Body of the CHUNK for one request: a single window goes as-is, several get [[Wn]] ... [[/Wn]] fences
+    """
+    if len(windows) == 1:
+        return windows[0][1]
+    return "\n".join(f"[[{wid}]]\n{text}\n[[/{wid}]]" for wid, text in windows)
+
+
+def split_windows(body: str) -> List[Tuple[str, str]]:
+    """
+    Inverse of format_windows (used by the stand-in server to answer packed requests)
+    """
+    found = [(m.group(1), m.group(2)) for m in WINDOW_RE.finditer(body or "")]
+    return found or [("W1", body or "")]
+
+
+def build_messages(windows: List[Tuple[str, str]], retry: bool = False) -> List[Dict]:
+    """
+    Static instructions in the system message, only the (packed) chunk in the user message
+    """
+    note = PACKING_NOTE if len(windows) > 1 else ""
+    if retry:
+        note = RETRY_NOTE + note
+    return [
+        {"role": "system", "content": EXTRACTION_PROMPT},
+        {"role": "user", "content": f"{note}CHUNK:\n{format_windows(windows)}\n"},
+    ]
+
+
+def pack_windows(spans: List[Tuple[int, int, str]],
+                 max_chars: Optional[int] = 8000) -> List[List[Tuple[str, Tuple[int, int, str]]]]:
+    """
+    Group consecutive spans into requests of at most max_chars of window text, each span with its own window ID.
+    Full-size chunks end up alone; the short windows from ranker.select_spans share requests.
+
+    returns: list of requests, each a list of (window_id, span)
+    """
+    groups: List[List[Tuple[str, Tuple[int, int, str]]]] = []
+    size = 0
+    for span in spans:
+        n = len(span[2])
+        if not groups or max_chars is None or size + n > max_chars:
+            groups.append([])
+            size = 0
+        groups[-1].append((f"W{len(groups[-1]) + 1}", span))
+        size += n
+    return groups
+
+
+def estimate_request_tokens(spans: List[Tuple[int, int, str]], pack_chars: Optional[int] = 8000) -> int:
+    """
+    Estimated prompt tokens to send these spans the way analyze_with_gpt does
+    """
+    total = 0
+    for group in pack_windows(spans, pack_chars):
+        messages = build_messages([(wid, span[2]) for wid, span in group])
+        total += sum(estimate_tokens(m["content"]) for m in messages)
+    return total
+
+
+def _chat_completion(messages: List[Dict], record_text: str, model: Optional[str] = None,
+                     max_tokens: Optional[int] = None, stage: str = "llm_api") -> str:
+    """
+    One chat call with retries on transient errors, usage booked to the run metrics, optional recording
+
+    model: defaults to MODEL
+    max_tokens: cap on the answer (the cascade's yes/no check)
+    stage: metrics stage the call's latency is booked to
+    """
+    client = get_client()
+    metrics = get_metrics()
+    retryable = _retryable_errors()
+    model = model or MODEL
+    extra = {"max_tokens": max_tokens} if max_tokens else {}
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            with metrics.stage(stage):
+                resp = client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    response_format={"type": "json_object"},
+                    temperature=0,
+                    **extra,
+                )
+            break
+        except retryable as e:
+            if attempt == MAX_RETRIES:
+                raise
+            metrics.incr("retries")
+            wait = _retry_after(e)
+            time.sleep(RETRY_BACKOFF_S * 2 ** attempt if wait is None else wait)
+    metrics.record_usage(resp.usage, model)
+    content = resp.choices[0].message.content
+    record_path = os.getenv("SNOW_MINER_RECORD")
+    if record_path:
+        # chunk -> response pairs for replay through snow_miner.fake_openai
+        from snow_miner.fake_openai import append_recording
+
+        append_recording(record_path, record_text, content)
+    return content
+
+
+def _demux_rows(rows: List[Dict], windows: List[Tuple[str, str]]) -> Dict[str, List[Dict]]:
+    """
+    Hand rows back to their windows: by the "window" tag, else by where the snippet text is found, else the first
+    """
+    out: Dict[str, List[Dict]] = {wid: [] for wid, _ in windows}
+    for r in rows:
+        if not isinstance(r, dict):
+            continue
+        wid = str(r.pop("window", "") or "").strip().strip("[]")
+        if wid not in out:
+            snip = (r.get("text") or "").strip()[:160]
+            wid = next((w for w, text in windows if snip and snip in text), windows[0][0])
+        out[wid].append(r)
+    return out
+
+
+def _request_windows(windows: List[Tuple[str, str]], retry: bool = False) -> Tuple[Dict[str, List[Dict]], bool]:
+    """
+    One GPT request for one or more (window_id, text) windows, response checked against validation.ROW_SCHEMA
+
+    retry: this is the retry pass- the user message gets RETRY_NOTE
+
+    returns: (valid rows per window id, whether the request needs another go)
+    """
+    from snow_miner.validation import needs_retry, parse_response
+
+    metrics = get_metrics()
+    messages = build_messages(windows, retry=retry)
+    # what the old one-user-message-per-chunk layout would have cost, for the run report
+    metrics.incr("windows", len(windows))
+    metrics.incr("prompt_tokens_unpacked_est",
+                 sum(estimate_tokens(f"{EXTRACTION_PROMPT}\n\nCHUNK:\n{text}\n") for _, text in windows))
+    metrics.incr("prompt_tokens_sent_est", sum(estimate_tokens(m["content"]) for m in messages))
+
+    try:
+        content = _chat_completion(messages, format_windows(windows))
+    except _retryable_errors():
+        # still failing after MAX_RETRIES backoffs- leave it to the retry pass rather than losing the issue
+        metrics.incr("requests_failed")
+        metrics.incr("responses_unusable")
+        return {wid: [] for wid, _ in windows}, True
+    parsed = parse_response(content)
+    if not parsed.ok:
+        metrics.incr("json_parse_failures")
+    elif parsed.repaired:
+        metrics.incr("json_repaired")
+    metrics.incr("rows_invalid", len(parsed.invalid))
+    retry = needs_retry(parsed)
+    metrics.incr("responses_unusable", int(retry))
+    return _demux_rows(parsed.rows, windows), retry
+
+
+def gpt_api_call_on_windows(windows: List[Tuple[str, str]]) -> Dict[str, List[Dict]]:
+    """
+    One GPT request for one or more (window_id, text) windows
+
+    windows: the windows to pack into this request
+
+    returns: valid rows per window id
+    """
+    return _request_windows(windows)[0]
+
+
 def gpt_api_call_on_chunk(chunk: str) -> List[Dict]:
     """
     GPT calls to extract snow entities based on the above promt and input chunk
@@ -142,97 +395,132 @@ def gpt_api_call_on_chunk(chunk: str) -> List[Dict]:
 
     returns: json object contraining requested fields ready to be parsed into csv
     """
+    return gpt_api_call_on_windows([("W1", chunk)])["W1"]
 
-    prompt = f"{EXTRACTION_PROMPT}\n\nCHUNK:\n{chunk}\n"
-    client = get_client()
-    resp = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        response_format={"type": "json_object"},
-        temperature=0,
-    )
-    content = resp.choices[0].message.content
-    try:
-        data = json.loads(content)
-        return data.get("rows", [])
 
-    except Exception:
-        return []
+def estimate_tokens(text: str) -> int:
+    """
+    Rough offline token count (~4 characters per token for English prose)- good enough for planning, no tokenizer needed
+    """
+    return (len(text or "") + 3) // 4
 
 
-def analyze_with_gpt(full_text: str) -> List[Dict]:
+def analyze_with_gpt(full_text: str, spans: Optional[List[Tuple[int, int, str]]] = None,
+                     pack_chars: Optional[int] = 8000, cascade: Optional["Cascade"] = None,
+                     cancel: Optional["threading.Event"] = None) -> List[Dict]:
     """
     GPT call wrapper
 
     1) Pre-index all date mentions in the full document (global list of positions). Dates are currently not good enough
     from GPT so need human annotation
     2) Chunk text with global start offsets.
-    3) Extract snow snippets per chunk with GPT (no dates).
+    3) Extract snow snippets per chunk with GPT (no dates)- short windows are packed several to a request. Rows are
+       schema-checked (validation.py); windows whose answer was unusable get a separate, bounded retry pass.
     4) For each snippet, find its position in the chunk -> map to global anchor ->
        choose the nearest global date by character distance.
 
     full_text: input text
+    spans: optional pre-selected (start_index, end_index, text) windows (e.g. from ranker.select_spans) to send instead
+    of chunking the whole text
+    pack_chars: max window characters packed into one request (None = one request per window)
+    cascade: screen the chunks first (snow_miner.cascade) and only send the ones that pass to the extraction prompt
+    cancel: checked before every request- once set, Cancelled is raised so no more API calls are paid for
 
     returns: dictionary object obtained as json from API call
     """
 
+    from tqdm import tqdm
+
     results: List[Dict] = []
+    metrics = get_metrics()
 
-    global_dates = find_all_dates_global(full_text)
+    with metrics.stage("find_dates"):
+        global_dates = find_all_dates_global(full_text)
 
     # Step 2: chunk with offsets
-    for start_idx, end_idx, chunk in tqdm(chunk_spans(full_text, max_chars=8000, overlap=1000)):
-        rows = gpt_api_call_on_chunk(chunk)
-        if not rows:
-            continue
+    if spans is None:
+        with metrics.stage("chunk"):
+            spans = chunk_spans(full_text, max_chars=8000, overlap=1000)
+    metrics.incr("chunks", len(spans))
+    if cascade is not None:
+        from snow_miner.cascade import run_cascade
+
+        spans = run_cascade(spans, cascade, pack_chars, cancel=cancel)
+
+    rows_by_span: Dict[int, List[Dict]] = {}
+    failed: List[int] = []
+    i = 0  # pack_windows keeps span order, so spans are numbered as they come out
+    for group in tqdm(pack_windows(spans, pack_chars)):
+        check_cancel(cancel)
+        rows_by_window, retry = _request_windows([(wid, span[2]) for wid, span in group])
+        for wid, _ in group:
+            rows_by_span[i] = rows_by_window.get(wid, [])
+            if retry:
+                failed.append(i)
+            i += 1
+
+    # separate pass over just the windows that came back unusable, one per request, for a bounded number of rounds
+    for _ in range(RETRY_ROUNDS):
+        if not failed:
+            break
+        still_failed = []
+        for i in failed:
+            check_cancel(cancel)
+            metrics.incr("retry_requests")
+            rows_by_window, retry = _request_windows([("W1", spans[i][2])], retry=True)
+            rows_by_span[i] = rows_by_window["W1"] or rows_by_span[i]
+            if retry:
+                still_failed.append(i)
+            else:
+                metrics.incr("windows_recovered")
+        failed = still_failed
+    if failed:
+        metrics.incr("windows_failed", len(failed))
+        print(f"[gpt] {len(failed)} windows still unusable after {RETRY_ROUNDS} retry rounds: "
+              f"chars {', '.join(f'{spans[i][0]}-{spans[i][1]}' for i in failed)}")
+
+    for i, (start_idx, _, chunk) in enumerate(spans):
+        results.extend(_rows_to_results(rows_by_span.get(i, []), chunk, start_idx, global_dates))
+    return results
 
-        for r in rows:
-            full_snip = (r.get("text") or "").strip()
-            if not full_snip:
-                continue
-            if not is_snowy(full_snip):
-                continue
 
-            # try exact locate in chunk; if not found, try a prefix
-            local_pos = chunk.find(full_snip)
+def _rows_to_results(rows: List[Dict], chunk: str, start_idx: int,
+                     global_dates: List[Tuple[int, int, str]]) -> List[Dict]:
+    """
+    Guardrail, anchor and date the raw GPT rows of one chunk/window
+    """
+    results: List[Dict] = []
+    for r in rows:
+        full_snip = (r.get("text") or "").strip()
+        if not full_snip:
+            continue
+        if not is_snowy(full_snip):
+            continue
+
+        # try exact locate in chunk; if not found, try a prefix
+        local_pos = chunk.find(full_snip)
+        if local_pos == -1:
+            needle = full_snip[:160]
+            local_pos = chunk.find(needle) if needle else -1
             if local_pos == -1:
-                needle = full_snip[:160]
-                local_pos = chunk.find(needle) if needle else -1
-                if local_pos == -1:
-                    # last resort: skip date anchoring but still record the item
-                    anchor_global = start_idx
-                else:
-                    anchor_global = start_idx + local_pos
+                # last resort: skip date anchoring but still record the item
+                anchor_global = start_idx
             else:
                 anchor_global = start_idx + local_pos
-
-            date_txt = nearest_global_date(global_dates, anchor_global, max_dist=6000)
-
-            entity = (r.get("entity") or "").strip()
-            location_raw = (r.get("location") or "").strip()
-            location = location_raw if location_raw else None
-            try:
-                score = int(r.get("score"))
-            except Exception:
-                score = 2
-            score = max(0, min(10, score))
-
-            print({
-                "text": full_snip,  # compact
-                # "full_text": full_snip,    # preserved
-                "entity": entity,
-                "location": location,
-                "score": score,
-                "date": date_txt,  # nearest global match (raw)
-            })
-
-            results.append({
-                "text": full_snip,  # compact
-                # "full_text": full_snip,    # preserved
-                "entity": entity,
-                "location": location,
-                "score": score,
-                "date": date_txt,  # nearest global match (raw)
-            })
+        else:
+            anchor_global = start_idx + local_pos
+
+        date_txt = nearest_global_date(global_dates, anchor_global, max_dist=6000)
+
+        # rows were checked against validation.ROW_SCHEMA, so entity/location are clean and score is an int 0-10
+        results.append({
+            "text": full_snip,  # compact
+            # "full_text": full_snip,    # preserved
+            "entity": r["entity"],
+            "location": r["location"],
+            "score": r["score"],
+            "date": date_txt,  # nearest global match (raw)
+            "offset": anchor_global,  # where the snippet is in full_text (chunk start if it couldn't be found)
+        })
 
     return results
@@ -0,0 +1,326 @@
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional
+
+from snow_miner.config import MODEL_PRICES_PER_1M
+
+# issue currently being worked on in this thread/task- set by pipeline.process_pdf, read by the GPT helpers
+_current_issue: contextvars.ContextVar[str] = contextvars.ContextVar("snow_miner_issue", default="_run")
+# stages open in this thread/task, innermost last: [name, child wall, child cpu]- for self time of nested stages
+_open_stages: contextvars.ContextVar[tuple] = contextvars.ContextVar("snow_miner_stages", default=())
+
+COUNTERS = (
+    "chunks", "api_calls", "prompt_tokens", "completion_tokens", "cached_tokens", "cache_hits", "retries",
+    "json_parse_failures", "rows", "windows", "prompt_tokens_unpacked_est", "prompt_tokens_sent_est",
+    "chars_stripped", "stream_failures", "lease_reclaims",
+    "cascade_t0_dropped", "cascade_t0_passed", "cascade_t1_checked", "cascade_t1_passed", "cascade_t1_dropped",
+    "cascade_calls_avoided", "cascade_tokens_avoided_est", "cascade_t1_tokens_est", "cascade_t1_unparseable",
+    "json_repaired", "rows_invalid", "requests_failed", "responses_unusable", "retry_requests", "windows_recovered",
+    "windows_failed", "ocr_pages", "ocr_cache_hits",
+)
+
+
+STAGE_TIMES = ("wall_s", "cpu_s", "self_wall_s", "self_cpu_s", "calls")
+
+
+def _empty_stage(parent: Optional[str] = None) -> Dict:
+    return {"wall_s": 0.0, "cpu_s": 0.0, "self_wall_s": 0.0, "self_cpu_s": 0.0, "calls": 0, "parent": parent}
+
+
+def _empty_issue() -> Dict:
+    return {"stages": {}, "counters": {k: 0 for k in COUNTERS}, "cost_usd": 0.0}
+
+
+class RunMetrics:
+    """
+    Per-issue, per-stage wall/CPU time plus token, retry and parse-failure counters for one run. Thread safe, so the
+    same object can be shared by parallel workers.
+    """
+
+    def __init__(self, run_id: Optional[str] = None):
+        self.run_id = run_id or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self.started = time.time()
+        self.issues: Dict[str, Dict] = {}
+        self.gauges: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _issue(self, issue: Optional[str]) -> Dict:
+        key = issue or _current_issue.get()
+        if key not in self.issues:
+            self.issues[key] = _empty_issue()
+        return self.issues[key]
+
+    @contextmanager
+    def stage(self, name: str, issue: Optional[str] = None) -> Iterator[None]:
+        """
+        Time a block as a named stage. CPU time is per thread, so parallel workers don't inflate each other. Stages
+        can nest (llm_api inside extract_gpt): wall_s/cpu_s include the nested stages, self_wall_s/self_cpu_s don't,
+        and the nested stage records its parent.
+        """
+        issue = issue or _current_issue.get()
+        outer = _open_stages.get()
+        frame = [name, 0.0, 0.0]
+        token = _open_stages.set(outer + (frame,))
+        w0, c0 = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - w0, time.thread_time() - c0
+            _open_stages.reset(token)
+            if outer:
+                outer[-1][1] += wall
+                outer[-1][2] += cpu
+            with self._lock:
+                st = self._issue(issue)["stages"].setdefault(name, _empty_stage(outer[-1][0] if outer else None))
+                st["wall_s"] += wall
+                st["cpu_s"] += cpu
+                st["self_wall_s"] += wall - frame[1]
+                st["self_cpu_s"] += cpu - frame[2]
+                st["calls"] += 1
+
+    def incr(self, counter: str, n: int = 1, issue: Optional[str] = None) -> None:
+        with self._lock:
+            counters = self._issue(issue)["counters"]
+            counters[counter] = counters.get(counter, 0) + n
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self.gauges[name] = value
+
+    def record_usage(self, usage, model: str, issue: Optional[str] = None) -> None:
+        """
+        Book the `usage` block of a chat completion (prompt/completion/cached tokens) and its cost
+        """
+        if usage is None:
+            return
+        prompt = int(getattr(usage, "prompt_tokens", 0) or 0)
+        completion = int(getattr(usage, "completion_tokens", 0) or 0)
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = int(getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+        with self._lock:
+            entry = self._issue(issue)
+            c = entry["counters"]
+            c["api_calls"] += 1
+            c["prompt_tokens"] += prompt
+            c["completion_tokens"] += completion
+            c["cached_tokens"] += cached
+            c["cache_hits"] += 1 if cached else 0
+            entry["cost_usd"] += cost_usd(model, prompt, completion, cached)
+
+    def totals(self) -> Dict:
+        with self._lock:
+            counters = {k: 0 for k in COUNTERS}
+            stages: Dict[str, Dict[str, float]] = {}
+            cost = 0.0
+            for entry in self.issues.values():
+                for k, v in entry["counters"].items():
+                    counters[k] = counters.get(k, 0) + v
+                for name, st in entry["stages"].items():
+                    agg = stages.setdefault(name, _empty_stage(st.get("parent")))
+                    for k in STAGE_TIMES:
+                        agg[k] += st.get(k, st.get(k.replace("self_", ""), 0))
+                cost += entry["cost_usd"]
+        return {"stages": stages, "counters": counters, "cost_usd": cost}
+
+    def to_dict(self) -> Dict:
+        totals = self.totals()
+        with self._lock:
+            return {
+                "run_id": self.run_id,
+                "started": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+                "elapsed_s": time.time() - self.started,
+                "totals": totals,
+                "cascade_savings": cascade_savings(totals),
+                "gauges": dict(self.gauges),
+                "issues": {issue: dict(entry, prompt_tokens_saved_est=prompt_tokens_saved(entry["counters"]),
+                                       **failure_rates(entry["counters"]))
+                           for issue, entry in json.loads(json.dumps(self.issues)).items()},
+            }
+
+    def write_json(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+    def write_prometheus(self, path: str) -> str:
+        """
+        Prometheus text exposition format, e.g. for the node_exporter textfile collector
+        """
+        data = self.to_dict()
+        lines = []
+        # self time, so summing a metric over stages doesn't count nested stages twice; parent says where it nests
+        for metric, key, what in (("stage_wall_seconds_total", "self_wall_s", "Wall"),
+                                  ("stage_cpu_seconds_total", "self_cpu_s", "CPU")):
+            lines += [f"# HELP snow_miner_{metric} {what} time spent per issue and stage, excluding nested stages",
+                      f"# TYPE snow_miner_{metric} counter"]
+            for issue, entry in sorted(data["issues"].items()):
+                for name, st in sorted(entry["stages"].items()):
+                    lines.append(f'snow_miner_{metric}{{issue="{issue}",stage="{name}",parent="{st.get("parent") or ""}"}} '
+                                 f'{st[key]:.6f}')
+        lines += ["# HELP snow_miner_events_total Chunks, API calls, tokens, cache hits, retries and parse failures",
+                  "# TYPE snow_miner_events_total counter"]
+        for issue, entry in sorted(data["issues"].items()):
+            for k, v in sorted(entry["counters"].items()):
+                lines.append(f'snow_miner_events_total{{issue="{issue}",event="{k}"}} {v}')
+        lines += ["# HELP snow_miner_cost_usd_total Estimated API spend per issue",
+                  "# TYPE snow_miner_cost_usd_total counter"]
+        for issue, entry in sorted(data["issues"].items()):
+            lines.append(f'snow_miner_cost_usd_total{{issue="{issue}"}} {entry["cost_usd"]:.6f}')
+        if data["gauges"]:
+            lines += ["# HELP snow_miner_gauge Run-level gauges", "# TYPE snow_miner_gauge gauge"]
+            for name, v in sorted(data["gauges"].items()):
+                lines.append(f'snow_miner_gauge{{name="{name}"}} {v}')
+        lines += ["# HELP snow_miner_run_elapsed_seconds Time since the run started",
+                  "# TYPE snow_miner_run_elapsed_seconds gauge",
+                  f'snow_miner_run_elapsed_seconds {data["elapsed_s"]:.3f}']
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        return path
+
+    def write_reports(self, report_dir: str) -> Dict[str, str]:
+        """
+        run_<id>.json + run_<id>.prom in report_dir
+        """
+        base = os.path.join(report_dir, f"run_{self.run_id}")
+        return {"json": self.write_json(base + ".json"), "prometheus": self.write_prometheus(base + ".prom")}
+
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    prices = MODEL_PRICES_PER_1M.get(model)
+    if not prices:
+        return 0.0
+    uncached = max(0, prompt_tokens - cached_tokens)
+    return (uncached * prices["input"] + cached_tokens * prices["cached_input"]
+            + completion_tokens * prices["output"]) / 1_000_000
+
+
+_metrics = RunMetrics()
+
+
+def get_metrics() -> RunMetrics:
+    return _metrics
+
+
+def start_run(run_id: Optional[str] = None) -> RunMetrics:
+    """
+    Fresh metrics for a new run (the module keeps one current RunMetrics, like gpt_analyse keeps one client)
+    """
+    global _metrics
+    _metrics = RunMetrics(run_id)
+    return _metrics
+
+
+@contextmanager
+def issue_context(issue: str) -> Iterator[None]:
+    """
+    Attribute everything recorded inside the block (in this thread) to `issue`
+    """
+    token = _current_issue.set(issue)
+    try:
+        yield
+    finally:
+        _current_issue.reset(token)
+
+
+def failure_rates(counters: Dict) -> Dict[str, float]:
+    """
+    Share of extraction requests whose answer was unusable (no JSON, cut off, only invalid rows, or no answer at
+    all), of rows that failed the schema, and of windows lost even after the retry pass- for one issue or the run
+    """
+    # calls that never got an answer aren't in api_calls
+    requests = (counters.get("api_calls", 0) - counters.get("cascade_t1_checked", 0)
+                + counters.get("requests_failed", 0))
+    rows_seen = counters.get("rows_invalid", 0) + counters.get("rows", 0)
+    windows = counters.get("windows", 0) - counters.get("retry_requests", 0)
+    return {"response_failure_rate": counters.get("responses_unusable", 0) / requests if requests > 0 else 0.0,
+            "row_invalid_rate": counters.get("rows_invalid", 0) / rows_seen if rows_seen else 0.0,
+            "window_loss_rate": counters.get("windows_failed", 0) / windows if windows > 0 else 0.0}
+
+
+def prompt_tokens_saved(counters: Dict) -> int:
+    """
+    Estimated prompt tokens saved by the shared system prompt and window packing, for one issue or the run
+    """
+    return counters.get("prompt_tokens_unpacked_est", 0) - counters.get("prompt_tokens_sent_est", 0)
+
+
+def cascade_savings(totals: Dict) -> Dict[str, float]:
+    """
+    What the cascade saved: extraction calls/tokens for the chunks it dropped, less what the tier 1 checks cost, and
+    the API time those calls would have taken at this run's mean extraction call latency
+    """
+    c = totals["counters"]
+    stages = totals["stages"]
+    extraction_calls = c.get("api_calls", 0) - c.get("cascade_t1_checked", 0)
+    per_call = stages.get("llm_api", {}).get("wall_s", 0.0) / extraction_calls if extraction_calls > 0 else 0.0
+    check_s = stages.get("llm_check", {}).get("wall_s", 0.0)
+    tokens = c.get("cascade_tokens_avoided_est", 0) - c.get("cascade_t1_tokens_est", 0)
+    would_send = c.get("prompt_tokens_sent_est", 0) + c.get("cascade_tokens_avoided_est", 0)
+    return {"calls_avoided": c.get("cascade_calls_avoided", 0), "tokens_saved_est": tokens,
+            "tokens_saved_frac": tokens / would_send if would_send else 0.0,
+            "api_s_saved_est": c.get("cascade_calls_avoided", 0) * per_call - check_s}
+
+
+def format_summary(report: Dict) -> str:
+    """
+    Short human summary of a run report dict (RunMetrics.to_dict() or a loaded JSON report)
+    """
+    t = report["totals"]
+    c = t["counters"]
+    lines = [f"run {report['run_id']}: {len(report['issues'])} issues in {report['elapsed_s']:.1f}s, "
+             f"${t['cost_usd']:.4f}"]
+    # self time (nested stages are listed under their parent, not counted in it), so the column adds up
+    stages = t["stages"]
+    listed = set()
+
+    def stage_lines(parent, depth):
+        children = [(n, st) for n, st in stages.items() if st.get("parent") == parent and n not in listed]
+        for name, st in sorted(children, key=lambda kv: -kv[1].get("self_wall_s", kv[1]["wall_s"])):
+            listed.add(name)
+            label = "  " * depth + name
+            lines.append(f"  {label:<20} wall {st.get('self_wall_s', st['wall_s']):9.2f}s  "
+                         f"cpu {st.get('self_cpu_s', st['cpu_s']):9.2f}s  calls {st['calls']}"
+                         + (f"  (in {parent})" if parent else "")
+                         + (f"  {st['wall_s']:.2f}s incl. nested" if st['wall_s'] - st.get('self_wall_s', 0) > 0.005 else ""))
+            stage_lines(name, depth + 1)
+
+    stage_lines(None, 0)
+    for name, st in stages.items():  # parent never recorded as a stage of its own
+        if name not in listed:
+            lines.append(f"  {name:<20} wall {st['wall_s']:9.2f}s  cpu {st['cpu_s']:9.2f}s  calls {st['calls']}")
+    lines.append(f"  chunks {c['chunks']}  api calls {c['api_calls']}  prompt tokens {c['prompt_tokens']}  "
+                 f"completion tokens {c['completion_tokens']}  cached {c['cached_tokens']}  retries {c['retries']}  "
+                 f"json failures {c['json_parse_failures']}  rows {c['rows']}  "
+                 f"header/footer chars stripped {c.get('chars_stripped', 0)}")
+    if report.get("gauges"):
+        lines.append("  " + "  ".join(f"{k} {v:g}" for k, v in sorted(report["gauges"].items())))
+    saved = prompt_tokens_saved(c)
+    if c.get("prompt_tokens_unpacked_est"):
+        lines.append(f"  windows {c['windows']} packed into {c['api_calls'] - c.get('cascade_t1_checked', 0)} calls, prompt tokens saved ~{saved} "
+                     f"({saved / c['prompt_tokens_unpacked_est']:.0%} of the one-chunk-per-request layout)")
+    if c.get("json_parse_failures") or c.get("rows_invalid") or c.get("retry_requests") or c.get("json_repaired"):
+        fr = failure_rates(c)
+        lines.append(f"  responses: {c.get('json_repaired', 0)} repaired, {c.get('responses_unusable', 0)} unusable "
+                     f"({fr['response_failure_rate']:.1%}: {c['json_parse_failures']} unparseable, "
+                     f"{c.get('requests_failed', 0)} no answer); rows invalid "
+                     f"{c.get('rows_invalid', 0)} ({fr['row_invalid_rate']:.1%}); retried {c.get('retry_requests', 0)}, "
+                     f"recovered {c.get('windows_recovered', 0)}, lost {c.get('windows_failed', 0)} windows")
+    screened = c.get("cascade_t0_dropped", 0) + c.get("cascade_t0_passed", 0) + c.get("cascade_t1_checked", 0)
+    if screened:
+        sv = cascade_savings(t)
+        lines.append(f"  cascade {screened} chunks: tier 0 dropped {c['cascade_t0_dropped']}, passed "
+                     f"{c['cascade_t0_passed']}; tier 1 checked {c['cascade_t1_checked']}, dropped "
+                     f"{c['cascade_t1_dropped']}; {sv['calls_avoided']} extraction calls avoided, "
+                     f"~{sv['tokens_saved_est']} prompt tokens ({sv['tokens_saved_frac']:.0%}) and "
+                     f"~{sv['api_s_saved_est']:.1f}s API time saved")
+    return "\n".join(lines)
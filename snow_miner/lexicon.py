@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import regex as re
+
+from snow_miner.config import ENTITY_PATTERNS, SCORE_PATTERNS, SNOW_TERMS
+from snow_miner.regex_guardrails import SNOW_REGEX
+
+# Names for the ENTITY_PATTERNS groups in config.py, in the same order
+ENTITY_CLASSES = ("surface", "loss", "cover", "avalanche", "terrain")
+
+# Categories a hit can carry
+CAT_SNOW = "snow"  # matches the SNOW_REGEX guardrail
+CAT_TERM = "term"  # one of config.SNOW_TERMS
+CAT_SCORE = "score"  # matches one of the SCORE_PATTERNS tiers
+CAT_ENTITY = "entity"  # matches one of the ENTITY_PATTERNS classes
+
+
+class LexiconHit(NamedTuple):
+    start: int
+    end: int
+    text: str
+    categories: Tuple[str, ...]
+    score: Optional[int]  # highest SCORE_PATTERNS tier found in the hit (0-5), None if no tier
+    entity: Optional[str]  # first ENTITY_CLASSES class found in the hit, None if no class
+
+
+def _strip_group(pattern: str) -> str:
+    """
+    config/guardrail patterns are written as r"\\b(alt|alt|...)\\b"- peel that off so every alternative can go into
+    one big alternation
+    """
+    if pattern.startswith(r"\b(") and pattern.endswith(r")\b"):
+        return pattern[3:-3]
+    return pattern
+
+
+def _expand_term(term: str) -> List[str]:
+    """
+    SNOW_TERMS writes optional letters in brackets ("rim(e)")- spell out both forms
+    """
+    m = re.search(r"\(([^()]*)\)", term)
+    if not m:
+        return [term]
+    return _expand_term(term[:m.start()] + term[m.end():]) + _expand_term(term[:m.start()] + m.group(1) + term[m.end():])
+
+
+def _build_matcher() -> re.Pattern:
+    alternatives: List[str] = [_strip_group(SNOW_REGEX.pattern)]
+    alternatives += [_strip_group(p) for _, p in SCORE_PATTERNS]
+    alternatives += [_strip_group(p) for p in ENTITY_PATTERNS]
+    # SNOW_TERMS are plain words/phrases; longest first so "good cover" beats "cover"
+    terms = sorted(_TERM_SET, key=len, reverse=True)
+    alternatives.append("|".join(re.escape(t) for t in terms))
+    # the regex module tries every alternative at a position, so putting everything into one group is one scan
+    return re.compile(r"\b(?:" + "|".join(f"(?:{a})" for a in alternatives) + r")\b", flags=re.IGNORECASE)
+
+
+_TERM_SET = frozenset(v.lower() for t in SNOW_TERMS for v in _expand_term(t))
+LEXICON_REGEX = _build_matcher()
+
+_SCORE_TIERS = sorted(
+    [(score, re.compile(_strip_group(p), flags=re.IGNORECASE)) for score, p in SCORE_PATTERNS],
+    key=lambda t: -t[0],
+)
+_ENTITY_TIERS = [(name, re.compile(_strip_group(p), flags=re.IGNORECASE)) for name, p in
+                 zip(ENTITY_CLASSES, ENTITY_PATTERNS)]
+
+
+@lru_cache(maxsize=8192)
+def classify(term: str) -> Tuple[Tuple[str, ...], Optional[int], Optional[str]]:
+    """
+    Tag a single matched term (lowercased). The vocabulary is small so after the first few pages of a journal almost
+    everything comes straight out of the cache. Tiers and classes must match the whole term, so "snowless" gets the
+    tier-0 listing rather than the tier-3 "snow" inside it.
+
+    returns: (categories, score tier, entity class)
+    """
+    categories: List[str] = []
+    if SNOW_REGEX.search(term):
+        categories.append(CAT_SNOW)
+    if term in _TERM_SET:
+        categories.append(CAT_TERM)
+
+    score = None
+    for tier, rx in _SCORE_TIERS:
+        if rx.fullmatch(term):
+            score = tier
+            categories.append(CAT_SCORE)
+            break
+
+    entity = None
+    for name, rx in _ENTITY_TIERS:
+        if rx.fullmatch(term):
+            entity = name
+            categories.append(CAT_ENTITY)
+            break
+
+    return tuple(categories), score, entity
+
+
+def tag(text: str) -> List[LexiconHit]:
+    """
+    One pass over the text with the combined matcher, every hit tagged with category, score tier and entity class.
+
+    text: any text (page, chunk, snippet)
+
+    returns: list of hits in text order
+    """
+    hits: List[LexiconHit] = []
+    for m in LEXICON_REGEX.finditer(text or ""):
+        term = m.group(0)
+        categories, score, entity = classify(term.lower())
+        hits.append(LexiconHit(m.start(), m.end(), term, categories, score, entity))
+    return hits
+
+
+def tag_many(texts: Iterable[str]) -> List[List[LexiconHit]]:
+    """
+    Batch version of tag- handy for sentences/snippets of a whole issue
+    """
+    return [tag(t) for t in texts]
+
+
+def best_score(hits: Iterable[LexiconHit]) -> Optional[int]:
+    """
+    Highest score tier among the hits (highest match wins, as in config.SCORE_PATTERNS), None if no tier matched
+    """
+    tiers = [h.score for h in hits if h.score is not None]
+    return max(tiers) if tiers else None
+
+
+def summarise(hits: Iterable[LexiconHit]) -> Dict[str, int]:
+    """
+    Count hits per category and per entity class, for cheap corpus statistics
+    """
+    counts: Dict[str, int] = {}
+    for h in hits:
+        for c in h.categories:
+            counts[c] = counts.get(c, 0) + 1
+        if h.entity:
+            key = f"entity:{h.entity}"
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def has_snow(text: str) -> bool:
+    """
+    Same answer as regex_guardrails.is_snowy but off the shared matcher
+    """
+    for m in LEXICON_REGEX.finditer(text or ""):
+        if CAT_SNOW in classify(m.group(0).lower())[0]:
+            return True
+    return False
@@ -1,15 +1,38 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
-from pdfminer.high_level import extract_text
-from typing import List, Tuple
+# OCR fallback for scanned pages without a text layer. Off unless SNOW_MINER_OCR=1 (run_pipeline.py --ocr sets it), so
+# it also reaches extraction running in worker processes. Needs pytesseract and the tesseract binary.
+OCR_ENV = "SNOW_MINER_OCR"
+OCR_CACHE_ENV = "SNOW_MINER_OCR_CACHE"
+OCR_WORKERS_ENV = "SNOW_MINER_OCR_WORKERS"
+DEFAULT_OCR_CACHE = "data/ocr_cache"
+OCR_DPI = 300
+OCR_LANG = "eng"
+# pages with less pdfminer text than this are OCR candidates (a scanned page often still has a stray page number)
+MIN_TEXT_CHARS = 40
 
-def extract_text_pages(pdf_path: str) -> List[Tuple[int, str]]:
+_ocr_warned = False
+
+
+def extract_text_pages(pdf_path: str, ocr: Optional[bool] = None) -> List[Tuple[int, str]]:
     """
     Return a list of (page_number (1-based), text) tuples.
+
+    ocr: OCR pages with no/near-empty text layer (None: on if SNOW_MINER_OCR=1)
     """
+    from pdfminer.high_level import extract_text  # heavy- only load when a PDF is actually read
+
     full_text = extract_text(pdf_path) or ""
     # pdfminer doesn't split pages by default here; in many PDFs it inserts form feed \x0c between pages.
     # We'll split on \x0c to approximate page boundaries.
     pages = [p for p in full_text.split("\x0c") if p is not None]
+    if ocr is None:
+        ocr = os.getenv(OCR_ENV, "") not in ("", "0")
+    if ocr:
+        pages = ocr_missing_pages(pdf_path, pages)
     out = []
     for idx, page_text in enumerate(pages, start=1):
         if page_text and page_text.strip():
@@ -17,3 +40,113 @@ def extract_text_pages(pdf_path: str) -> List[Tuple[int, str]]:
     if not out and full_text.strip():
         out.append((1, full_text))
     return out
+
+
+def _ocr_available() -> bool:
+    global _ocr_warned
+    try:
+        import pytesseract
+
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception as e:  # not installed, or installed without the tesseract binary
+        if not _ocr_warned:
+            print(f"[ocr] OCR unavailable ({e!r}); scanned pages are skipped. "
+                  f"pip install pytesseract and install tesseract to enable it")
+            _ocr_warned = True
+        return False
+
+
+def page_hash(doc, page_index: int, dpi: int = OCR_DPI, lang: str = OCR_LANG) -> str:
+    """
+    Cache key for a page's OCR text: its content stream and embedded images, plus the OCR settings. Computed from the
+    raw PDF objects, so a cache hit doesn't even render the page.
+    """
+    page = doc[page_index]
+    h = hashlib.sha256(f"{dpi}:{lang}:".encode("utf-8"))
+    h.update(page.read_contents() or b"")
+    for img in page.get_images(full=True):
+        h.update(doc.xref_stream_raw(img[0]) or b"")
+    return h.hexdigest()
+
+
+def render_page_png(doc, page_index: int, dpi: int = OCR_DPI) -> bytes:
+    import fitz  # PyMuPDF
+
+    pix = doc[page_index].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    return pix.tobytes("png")
+
+
+def ocr_png(png: bytes, lang: str = OCR_LANG) -> str:
+    """
+    OCR one rendered page (runs in the OCR process pool)
+    """
+    import io
+
+    import pytesseract
+    from PIL import Image
+
+    with Image.open(io.BytesIO(png)) as img:
+        return pytesseract.image_to_string(img, lang=lang)
+
+
+def ocr_missing_pages(pdf_path: str, pages: List[str], min_chars: int = MIN_TEXT_CHARS,
+                      cache_dir: Optional[str] = None, workers: Optional[int] = None) -> List[str]:
+    """
+    Fill in pages whose pdfminer text is empty or near-empty with OCR text. Only those pages are rendered, each page's
+    OCR text is cached by page_hash (cache_dir, default SNOW_MINER_OCR_CACHE or data/ocr_cache), and cache misses are
+    OCRed in a process pool.
+
+    pages: pdfminer text per page, in page order
+
+    returns: pages with OCR text swapped in where it found more than the text layer had
+    """
+    import fitz  # PyMuPDF
+
+    from .instrumentation import get_metrics
+
+    metrics = get_metrics()
+    cache_dir = cache_dir or os.getenv(OCR_CACHE_ENV) or DEFAULT_OCR_CACHE
+    workers = workers or int(os.getenv(OCR_WORKERS_ENV, "0")) or None
+    doc = fitz.open(pdf_path)
+    try:
+        pages = list(pages) + [""] * max(0, len(doc) - len(pages))
+        todo = [i for i in range(len(doc)) if len(pages[i].strip()) < min_chars]
+        if not todo:
+            return pages
+
+        texts: Dict[int, str] = {}
+        misses: List[Tuple[int, str]] = []
+        for i in todo:
+            key = page_hash(doc, i)
+            path = os.path.join(cache_dir, key[:2], f"{key}.txt")
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    texts[i] = f.read()
+                metrics.incr("ocr_cache_hits")
+            else:
+                misses.append((i, path))
+
+        if misses and _ocr_available():
+            with metrics.stage("ocr"):
+                pngs = [render_page_png(doc, i) for i, _ in misses]
+                if len(pngs) > 1:
+                    with ProcessPoolExecutor(max_workers=workers) as pool:
+                        results = list(pool.map(ocr_png, pngs))
+                else:
+                    results = [ocr_png(p) for p in pngs]
+            for (i, path), text in zip(misses, results):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(tmp, path)
+                texts[i] = text
+            metrics.incr("ocr_pages", len(misses))
+    finally:
+        doc.close()
+
+    for i, text in texts.items():
+        if len(text.strip()) > len(pages[i].strip()):
+            pages[i] = text
+    return pages
@@ -1,20 +1,110 @@
+import bisect
 import csv
+import importlib
 import os
-from typing import List
+import re
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple
 from typing import Optional
 
-from .gpt_analyse import analyze_with_gpt
-from .pdf_text import extract_text_pages
-from .scraper import get_pdf_links, download_pdfs
+from .instrumentation import get_metrics, issue_context
+
+if TYPE_CHECKING:
+    from .cascade import Cascade
+    from .ranker import SentenceRanker
+    from .streaming import IssueText
+
+# name -> "module:function(full_text)" returning row dicts, imported on first use so a regex run never loads openai.
+# "regex" needs no API key and runs the whole corpus in seconds
+EXTRACTORS: Dict[str, str] = {
+    "gpt": "snow_miner.gpt_analyse:analyze_with_gpt",
+    "regex": "snow_miner.regex_extract:analyze_with_regex",
+}
+
+
+def get_extractor(name: str) -> Callable[[str], List[Dict]]:
+    module, func = EXTRACTORS[name].split(":")
+    return getattr(importlib.import_module(module), func)
 
 
 def detect_issue_from_filename(path: str) -> Optional[str]:
-    issue = str(path.split("%")[4][2:])
+    """
+    Issue number from either the club's file name ("The%20Cairngorm%20Club%20Journal%20001%20WM.pdf") or the renamed
+    "issue_001.pdf" (human_annotation/rename_pdfs.py)- the last 3-digit group in the file name
+    """
+    name = os.path.basename(path).replace("%20", " ")
+    found = re.findall(r"(?<!\d)(\d{3})(?!\d)", name)
+    if not found:
+        return None
+    return f"issue_{found[-1]}"
 
-    return f"issue_{issue}"
 
+def attach_pages(rows: List[Dict], page_index: List[Tuple[int, int]]) -> List[Dict]:
+    """
+    Set each row's "page" (PDF page number) from its "offset" in the extraction text
 
-def process_pdf(pdf_path: str, out_dir: str = "out", include_date_col: bool = True, overwrite: bool = False) -> Optional[str]:
+    page_index: (start offset in that same text, page number) per page, in order- see text_clean.page_starts
+    """
+    starts = [start for start, _ in page_index]
+    for r in rows:
+        if r.get("offset") is not None and starts:
+            r["page"] = page_index[max(0, bisect.bisect_right(starts, r["offset"]) - 1)][1]
+    return rows
+
+
+def page_index_for(pages: List[Tuple[int, str]], clean=None) -> List[Tuple[int, int]]:
+    from .text_clean import page_starts
+
+    return list(zip(page_starts(pages, clean), (page_no for page_no, _ in pages)))
+
+
+def write_rows_csv(rows: List[Dict], out_path: str, include_date_col: bool = True, include_date_parts: bool = False,
+                   fallback_year: Optional[int] = None, include_page: bool = False) -> str:
+    """
+    Write extractor rows with the issue CSV schema (text, entity, score, location[, date])
+
+    include_date_parts: also write year/season/month/day parsed from the raw date (as in docs/data/points.csv)
+    fallback_year: publication year used for dates without a year of their own
+    include_page: also write the PDF page each snippet was found on (rows need "page", see attach_pages)
+    """
+    fieldnames = ["text", "entity", "score", "location"] + (["date"] if include_date_col else [])
+    fieldnames += ["page"] if include_page else []
+    date_parts = None
+    if include_date_col and include_date_parts:
+        from .dates import normalise_dates
+
+        fieldnames += ["year", "season", "month", "day"]
+        parsed = normalise_dates([r.get("date") for r in rows], fallback_year)
+        date_parts = parsed.astype(object).where(parsed.notna(), None).to_dict("records")
+    # written under a private temp name and renamed into place, so a reader (or a second worker racing on the same
+    # issue) only ever sees a complete CSV
+    tmp_path = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for i, r in enumerate(rows):
+            row = {
+                "text": r.get("text"),
+                "entity": r.get("entity"),
+                "score": int(r.get("score", 2)),
+                "location": r.get("location"),
+            }
+            if include_date_col:
+                row["date"] = r.get("date")  # extractors return "date" (string or None)
+            if date_parts is not None:
+                row.update({col: date_parts[i][col] for col in ("year", "season", "month", "day")})
+            if include_page:
+                row["page"] = r.get("page")
+            writer.writerow(row)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def process_pdf(pdf_path: str, out_dir: str = "out", include_date_col: bool = True, overwrite: bool = False,
+                extractor: str = "gpt", ranker: Optional["SentenceRanker"] = None,
+                top_k: Optional[int] = None, include_date_parts: bool = False, normalise: bool = True,
+                cascade: Optional["Cascade"] = None, include_page: bool = False,
+                issue_text: Optional["IssueText"] = None, cancel: Optional[threading.Event] = None) -> Optional[str]:
 
     """
     Main function to process a pdf document and extract snow entities using GPT. Initially by page, but context awareness improved
@@ -24,54 +114,145 @@ def process_pdf(pdf_path: str, out_dir: str = "out", include_date_col: bool = Tr
     out-dir: path to write out csv
     include_date_col: optionally include buggy dates from GPT
     overwrite: optionally overwrite previous outputs
+    extractor: "gpt" (default) or "regex" for the offline baseline- see EXTRACTORS
+    ranker: optional trained SentenceRanker- GPT then only sees the best-ranked sentence windows instead of every chunk
+    top_k: cap on ranked sentences sent per issue
+    include_date_parts: also write parsed year/season/month/day, falling back to the front-page publication year
+    normalise: strip running heads/footers/page numbers and rejoin hyphenated words before extraction (text_clean)
+    cascade: screen chunks locally (and optionally with a cheap yes/no call) before the full GPT extraction
+    include_page: add a page column- snippets are mapped back to their PDF page through text_clean's offset map
+    issue_text: the issue's text already read (e.g. by planner.plan_run, streaming.read_issue_text)- the PDF isn't
+        parsed again
+    cancel: GPT extraction stops between requests once this is set (gpt_analyse.Cancelled)- see work_queue
     """
 
 
-    pages = extract_text_pages(pdf_path)
-    if not pages:
-        return None
+    from .dates import publication_year
+    from .pdf_text import extract_text_pages
+
+    issue = detect_issue_from_filename(pdf_path) or os.path.splitext(os.path.basename(pdf_path))[0]
+    metrics = get_metrics()
 
-    issue = detect_issue_from_filename(pdf_path)
     os.makedirs(out_dir, exist_ok=True)
     out_path = os.path.join(out_dir, f"{issue}.csv")
 
+    # checked before extraction so re-runs don't pay for pdfminer on finished issues
     if not overwrite and os.path.exists(out_path):
         print(f"[skip] {out_path} already exists; skipping this journal.")
         return out_path  # or return None if you prefer a 'skipped' signal
 
-    full_text = "\n\n".join(page_text for _, page_text in pages)
+    with issue_context(issue):
+        if issue_text is not None:
+            full_text, fallback_year, page_index = issue_text.text, issue_text.fallback_year, issue_text.page_index
+            metrics.incr("chars_stripped", issue_text.stripped)
+            for counter, n in issue_text.counters.items():
+                metrics.incr(counter, n)
+            if not full_text:
+                return None
+        else:
+            with metrics.stage("pdf_extract"):
+                pages = extract_text_pages(pdf_path)
+            if not pages:
+                return None
 
-    rows = analyze_with_gpt(full_text)
+            full_text = "\n\n".join(page_text for _, page_text in pages)
+            clean = None
+            if normalise:
+                from .text_clean import normalise_pages
 
-    fieldnames = ["text", "entity", "score", "location"] + (["date"] if include_date_col else [])
-    with open(out_path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for r in rows:
-            row = {
-                "text": r.get("text"),
-                "entity": r.get("entity"),
-                "score": int(r.get("score", 2)),
-                "location": r.get("location"),
-            }
-            if include_date_col:
-                row["date"] = r.get("date")  # gpt_analyse returns "date" (string or None)
-            writer.writerow(row)
+                with metrics.stage("normalise"):
+                    clean = normalise_pages(pages)
+                metrics.incr("chars_stripped", len(full_text) - len(clean.text))
+                full_text = clean.text
+            fallback_year, page_index = publication_year(pages[0][1]), page_index_for(pages, clean)
 
-    return out_path
+        with metrics.stage(f"extract_{extractor}"):
+            if extractor == "gpt" and (ranker is not None or cascade is not None or cancel is not None):
+                from .gpt_analyse import analyze_with_gpt
+
+                spans = None
+                if ranker is not None:
+                    from .ranker import select_spans
+
+                    with metrics.stage("rank_select"):
+                        spans = select_spans(full_text, ranker, top_k=top_k)
+                rows = analyze_with_gpt(full_text, spans=spans, cascade=cascade, cancel=cancel)
+            else:
+                rows = get_extractor(extractor)(full_text)
+        metrics.incr("rows", len(rows))
+        attach_pages(rows, page_index)
+
+        with metrics.stage("write_csv"):
+            return write_rows_csv(rows, out_path, include_date_col=include_date_col,
+                                  include_date_parts=include_date_parts, fallback_year=fallback_year,
+                                  include_page=include_page)
 
 
-def process_all(pdf_dir: str = "data/pdfs", out_dir: str = "out", include_date_col: bool = True) -> List[str]:
+def process_all(pdf_dir: str = "data/pdfs", out_dir: str = "out", include_date_col: bool = True,
+                extractor: str = "gpt", ranker: Optional["SentenceRanker"] = None,
+                top_k: Optional[int] = None, include_date_parts: bool = False, normalise: bool = True,
+                pdf_paths: Optional[List[str]] = None, budget_usd: Optional[float] = None,
+                cost_estimates: Optional[Dict[str, float]] = None, cascade: Optional["Cascade"] = None,
+                include_page: bool = False, budget_tokens: Optional[int] = None,
+                token_estimates: Optional[Dict[str, int]] = None,
+                issue_texts: Optional[Dict[str, "IssueText"]] = None) -> List[str]:
+    """
+    pdf_paths: process these, in this order, instead of every PDF in pdf_dir (e.g. a budgeted plan from planner)
+    budget_usd: skip an issue if the run's booked API spend plus that issue's estimate from cost_estimates
+        (issue -> USD) would exceed this, and carry on with the next (smaller) ones- the same rule as
+        planner.apply_budget. Issues are never cut off halfway.
+    budget_tokens / token_estimates: the same for prompt + completion tokens
+    issue_texts: pdf path -> text already read for it (planner.plan_run's issue_texts), so those aren't parsed twice
+    """
+    if pdf_paths is None:
+        pdf_paths = [os.path.join(pdf_dir, name) for name in sorted(os.listdir(pdf_dir)) if name.lower().endswith(".pdf")]
+    metrics = get_metrics()
     results = []
-    for name in sorted(os.listdir(pdf_dir)):
-        if name.lower().endswith(".pdf"):
-            pdf_path = os.path.join(pdf_dir, name)
-            out = process_pdf(pdf_path, out_dir=out_dir, include_date_col=include_date_col)
-            if out:
-                results.append(out)
+    for pdf_path in pdf_paths:
+        if budget_usd is not None or budget_tokens is not None:
+            issue = detect_issue_from_filename(pdf_path) or os.path.splitext(os.path.basename(pdf_path))[0]
+            totals = metrics.totals()
+            spent = totals["cost_usd"]
+            tokens = totals["counters"]["prompt_tokens"] + totals["counters"]["completion_tokens"]
+            if budget_usd is not None and spent + (cost_estimates or {}).get(issue, 0.0) > budget_usd:
+                print(f"[budget] skipping {issue}: ${spent:.4f} spent of ${budget_usd:.4f}")
+                continue
+            if budget_tokens is not None and tokens + (token_estimates or {}).get(issue, 0) > budget_tokens:
+                print(f"[budget] skipping {issue}: {tokens} tokens used of {budget_tokens}")
+                continue
+        out = process_pdf(pdf_path, out_dir=out_dir, include_date_col=include_date_col, extractor=extractor,
+                          ranker=ranker, top_k=top_k, include_date_parts=include_date_parts, normalise=normalise,
+                          cascade=cascade, include_page=include_page,
+                          issue_text=(issue_texts or {}).get(pdf_path))
+        if out:
+            results.append(out)
     return results
 
-def scrape_and_download(pdf_dir: str = "data/pdfs") -> List[str]:
-    urls = get_pdf_links()
+def scrape_and_download(pdf_dir: str = "data/pdfs", base_url: Optional[str] = None) -> List[str]:
+    """
+    base_url: accepted for run_pipeline.py's --base-url; the issue links are built from the club's PDF naming rather
+    than scraped from that page
+    """
+    from .scraper import download_pdfs, known_pdf_links
+
+    urls = known_pdf_links(pdf_dir)
     return download_pdfs(urls, dest_dir=pdf_dir)
 
+
+def update_issues(pdf_dir: str = "data/pdfs", out_dir: str = "out", url_template: Optional[str] = None,
+                  gap: int = 3, workers: int = 8, backlog: bool = False) -> List[str]:
+    """
+    Probe for issues published since the last run (scraper.update_manifest) and return the URLs of every discovered
+    issue not yet processed- the ones just found plus any from an earlier --discover or an interrupted update.
+    Call scraper.mark_processed with the CSVs written so they aren't returned again.
+
+    url_template: issue URL with an {issue} placeholder (default: scraper.URL_TEMPLATE)
+    gap: stop probing after this many missing issue numbers in a row
+    workers: concurrent HEAD requests
+    backlog: also return every older manifest issue without a CSV
+    """
+    from .scraper import URL_TEMPLATE, pending_issues, update_manifest
+
+    manifest, found = update_manifest(pdf_dir, url_template or URL_TEMPLATE, gap=gap, workers=workers)
+    print(f"[update] {len(found)} new issues found{': ' + ', '.join(map(str, found)) if found else ''}")
+    return [manifest["issues"][number]["url"] for number in pending_issues(manifest, out_dir, backlog=backlog)]
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Tuple
+
+from .pipeline import detect_issue_from_filename
+
+if TYPE_CHECKING:
+    from .cascade import Cascade
+    from .ranker import SentenceRanker
+    from .streaming import IssueText
+
+# completion side of the estimate: GPT answers "[]" for an empty window, and roughly a snippet of prose plus its
+# entity/location/score fields for each row it finds
+COMPLETION_TOKENS_PER_REQUEST = 10
+COMPLETION_TOKENS_PER_ROW = 70
+
+
+class IssuePlan(NamedTuple):
+    issue: str
+    pdf_path: str
+    chars: int
+    windows: int
+    requests: int
+    prompt_tokens: int
+    completion_tokens: int
+    cost_usd: float
+    expected_rows: int  # offline regex extractor's row count- the value side of value per token
+    done: bool  # CSV already in out_dir, so a run would skip it
+
+    @property
+    def tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def value_per_token(self) -> float:
+        return self.expected_rows / max(1, self.tokens)
+
+
+def plan_issue(issue: str, pdf_path: str, full_text: str, done: bool = False,
+               ranker: Optional["SentenceRanker"] = None, top_k: Optional[int] = None,
+               pack_chars: Optional[int] = 8000, model: Optional[str] = None,
+               cascade: Optional["Cascade"] = None) -> IssuePlan:
+    """
+    Estimate what analyze_with_gpt would send for one issue, without calling the API: same chunking (or ranker
+    selection) and window packing, tokens counted with gpt_analyse.estimate_tokens. With a cascade only its local tier
+    0 is applied- chunks it would send to the yes/no check are counted as extracted.
+    """
+    from .gpt_analyse import MODEL, chunk_spans, estimate_request_tokens, pack_windows
+    from .instrumentation import cost_usd
+    from .regex_extract import analyze_with_regex
+
+    if ranker is not None:
+        from .ranker import select_spans
+
+        spans = select_spans(full_text, ranker, top_k=top_k)
+    else:
+        spans = chunk_spans(full_text, max_chars=8000, overlap=1000)
+    if cascade is not None:
+        from .cascade import DROP, screen
+
+        spans = [s for s in spans if screen(s[2], cascade) != DROP]
+    requests = len(pack_windows(spans, pack_chars)) if spans else 0
+    prompt = estimate_request_tokens(spans, pack_chars) if spans else 0
+    expected = len(analyze_with_regex(full_text))
+    completion = requests * COMPLETION_TOKENS_PER_REQUEST + expected * COMPLETION_TOKENS_PER_ROW
+    return IssuePlan(issue, pdf_path, len(full_text), len(spans), requests, prompt, completion,
+                     cost_usd(model or MODEL, prompt, completion), expected, done)
+
+
+def _issue_texts(pdf_paths: List[str], corpus_dir: Optional[str], normalise: bool,
+                 workers: Optional[int]) -> Dict[str, "IssueText"]:
+    """
+    pdf path -> issue text, from a built corpus where it has the issue (built with the same normalise setting; no PDF
+    parsing at all), else extracted the way the pipeline does it, in a process pool
+    """
+    from .dates import publication_year
+    from .pipeline import page_index_for
+    from .streaming import IssueText, read_issue_text
+
+    texts: Dict[str, IssueText] = {}
+    todo = list(pdf_paths)
+    if corpus_dir:
+        from .corpus import Corpus
+
+        with Corpus(corpus_dir) as corpus:
+            known = set(corpus.issues) if corpus.normalised == normalise else set()
+            todo = []
+            for path in pdf_paths:
+                issue = detect_issue_from_filename(path)
+                if issue in known:
+                    pages = corpus.pages(issue)
+                    texts[path] = IssueText(corpus.issue_text(issue), publication_year(pages[0][1]) if pages else None,
+                                            0, page_index_for(pages), {})
+                else:
+                    todo.append(path)
+    if len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            texts.update(zip(todo, pool.map(read_issue_text, todo, [normalise] * len(todo))))
+    elif todo:  # an update's single issue isn't worth a process pool
+        texts[todo[0]] = read_issue_text(todo[0], normalise)
+    return texts
+
+
+def plan_run(pdf_dir: str = "data/pdfs", out_dir: str = "out", ranker: Optional["SentenceRanker"] = None,
+             top_k: Optional[int] = None, pack_chars: Optional[int] = 8000, normalise: bool = True,
+             corpus_dir: Optional[str] = None, workers: Optional[int] = None, model: Optional[str] = None,
+             include_done: bool = False, cascade: Optional["Cascade"] = None, pdf_paths: Optional[List[str]] = None,
+             issue_texts: Optional[Dict[str, "IssueText"]] = None) -> List[IssuePlan]:
+    """
+    Per-issue token/cost plan for a GPT run over pdf_dir, in file order
+
+    corpus_dir: read text from a built corpus (snow_miner.corpus) instead of re-extracting the PDFs
+    include_done: also plan issues whose CSV already exists (they are skipped by a normal run)
+    pdf_paths: plan only these PDFs, in this order (e.g. the issues an --update downloaded)
+    issue_texts: filled with pdf path -> the text read for each planned issue, for process_all to reuse
+    """
+    if pdf_paths is None:
+        pdf_paths = [os.path.join(pdf_dir, n) for n in sorted(os.listdir(pdf_dir)) if n.lower().endswith(".pdf")]
+    paths, done = [], {}
+    for path in pdf_paths:
+        issue = detect_issue_from_filename(path) or os.path.splitext(os.path.basename(path))[0]
+        done[issue] = os.path.exists(os.path.join(out_dir, f"{issue}.csv"))
+        if include_done or not done[issue]:
+            paths.append(path)
+
+    texts = _issue_texts(paths, corpus_dir, normalise, workers)
+    if issue_texts is not None:
+        issue_texts.update(texts)
+    plans = []
+    for path in paths:
+        issue = detect_issue_from_filename(path) or os.path.splitext(os.path.basename(path))[0]
+        plans.append(plan_issue(issue, path, texts[path].text, done=done[issue], ranker=ranker, top_k=top_k,
+                                pack_chars=pack_chars, model=model, cascade=cascade))
+    return plans
+
+
+def apply_budget(plans: List[IssuePlan], budget_usd: Optional[float] = None,
+                 budget_tokens: Optional[int] = None) -> Tuple[List[IssuePlan], List[IssuePlan]]:
+    """
+    Pick the issues to run under a budget: best expected rows per token first, adding every issue that still fits
+    (an issue too big for what is left is passed over for smaller ones behind it). Issues already done are left out.
+
+    returns: (selected in run order, left out)
+    """
+    todo = sorted((p for p in plans if not p.done), key=lambda p: (-p.value_per_token, p.issue))
+    selected, skipped = [], []
+    spent_usd, spent_tokens = 0.0, 0
+    for p in todo:
+        fits = ((budget_usd is None or spent_usd + p.cost_usd <= budget_usd)
+                and (budget_tokens is None or spent_tokens + p.tokens <= budget_tokens))
+        if fits:
+            selected.append(p)
+            spent_usd += p.cost_usd
+            spent_tokens += p.tokens
+        else:
+            skipped.append(p)
+    return selected, skipped
+
+
+def format_plan(selected: List[IssuePlan], skipped: Optional[List[IssuePlan]] = None) -> str:
+    skipped = skipped or []
+    lines = [f"{'issue':<12}{'chars':>9}{'windows':>9}{'requests':>10}{'prompt':>10}{'compl.':>9}{'cost $':>10}"
+             f"{'exp.rows':>10}{'rows/1k tok':>13}"]
+    for p in selected + skipped:
+        lines.append(f"{p.issue:<12}{p.chars:>9}{p.windows:>9}{p.requests:>10}{p.prompt_tokens:>10}"
+                     f"{p.completion_tokens:>9}{p.cost_usd:>10.4f}{p.expected_rows:>10}"
+                     f"{1000 * p.value_per_token:>13.2f}"
+                     + ("   done" if p.done else "   over budget" if p in skipped else ""))
+    selected = [p for p in selected if not p.done]
+    n_req = sum(p.requests for p in selected)
+    tokens = sum(p.tokens for p in selected)
+    lines.append(f"Plan: {len(selected)} issues, {n_req} requests, ~{tokens} tokens, "
+                 f"~${sum(p.cost_usd for p in selected):.4f}")
+    if skipped:
+        lines.append(f"Over budget: {len(skipped)} issues (~${sum(p.cost_usd for p in skipped):.4f}) not run")
+    return "\n".join(lines)
+
+
+def main():
+    """
+    python -m snow_miner.planner --pdf-dir data/pdfs                          # what a --process-only run would cost
+    python -m snow_miner.planner --pdf-dir data/pdfs --ranker models/ranker.npz --budget-usd 0.50
+    python -m snow_miner.planner --corpus-dir data/corpus --pdf-dir data/pdfs # reuse the corpus text, no pdfminer
+    """
+    ap = argparse.ArgumentParser(description="Offline token/cost plan for a GPT run, with an optional budget")
+    ap.add_argument("--pdf-dir", type=str, default="data/pdfs")
+    ap.add_argument("--out-dir", type=str, default="out")
+    ap.add_argument("--corpus-dir", type=str, default=None, help="Built corpus to take issue text from")
+    ap.add_argument("--ranker", type=str, default=None)
+    ap.add_argument("--top-k", type=int, default=None)
+    ap.add_argument("--no-normalise", action="store_true")
+    ap.add_argument("--model", type=str, default=None, help="Price the plan for this model (default: gpt_analyse.MODEL)")
+    ap.add_argument("--budget-usd", type=float, default=None)
+    ap.add_argument("--budget-tokens", type=int, default=None)
+    ap.add_argument("--include-done", action="store_true", help="Also plan issues that already have a CSV")
+    ap.add_argument("--cascade", action="store_true", help="Apply the cascade's local screen (tier 0) to the plan")
+    ap.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args()
+
+    ranker = None
+    if args.ranker:
+        from .ranker import SentenceRanker
+
+        ranker = SentenceRanker.load(args.ranker)
+    cascade = None
+    if args.cascade:
+        from .cascade import Cascade
+
+        cascade = Cascade(ranker=ranker)
+    plans = plan_run(args.pdf_dir, args.out_dir, ranker=ranker, top_k=args.top_k, normalise=not args.no_normalise,
+                     corpus_dir=args.corpus_dir, workers=args.workers, model=args.model,
+                     include_done=args.include_done, cascade=cascade)
+    if args.budget_usd is None and args.budget_tokens is None:
+        print(format_plan(plans))
+        return
+    print(format_plan(*apply_budget(plans, args.budget_usd, args.budget_tokens)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import random
+import zlib
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import regex as re
+
+from snow_miner.gpt_analyse import chunk_spans, estimate_request_tokens
+from snow_miner.regex_extract import sentence_spans
+
+N_FEATURES = 2 ** 18
+WORD_RE = re.compile(r"\p{L}+(?:['’-]\p{L}+)*")
+
+
+@lru_cache(maxsize=65536)
+def _hash(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8"))
+
+
+def _norm_text(text: str) -> str:
+    return " ".join(WORD_RE.findall((text or "").lower()))
+
+
+def featurise(text: str, n_features: int = N_FEATURES) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hashed word unigrams, word bigrams and character 4-grams (old spellings/Gaelic names vary a lot), L2 normalised.
+
+    returns: (feature indices, feature values)
+    """
+    words = WORD_RE.findall((text or "").lower())
+    feats: List[int] = []
+    for i, w in enumerate(words):
+        feats.append(_hash("w:" + w))
+        if i:
+            feats.append(_hash("b:" + words[i - 1] + " " + w))
+        padded = f"<{w}>"
+        for j in range(len(padded) - 3):
+            feats.append(_hash("c:" + padded[j:j + 4]))
+    if not feats:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    idx, counts = np.unique(np.asarray(feats, dtype=np.int64) % n_features, return_counts=True)
+    vals = counts.astype(np.float64)
+    vals /= np.sqrt((vals ** 2).sum())
+    return idx, vals
+
+
+class SentenceRanker:
+    """
+    Logistic regression over hashed n-grams, trained on curated snippets vs rejected/background sentences. Small enough
+    to train and score on a laptop CPU in seconds, and it never touches the network.
+    """
+
+    def __init__(self, n_features: int = N_FEATURES, weights: Optional[np.ndarray] = None, bias: float = 0.0,
+                 threshold: float = 0.5, meta: Optional[Dict] = None):
+        self.n_features = n_features
+        self.weights = weights if weights is not None else np.zeros(n_features, dtype=np.float64)
+        self.bias = bias
+        self.threshold = threshold
+        self.meta = meta or {}
+
+    def fit(self, texts: Sequence[str], labels: Sequence[int], epochs: int = 8, lr: float = 0.5, l2: float = 1e-6,
+            seed: int = 0) -> "SentenceRanker":
+        """
+        AdaGrad SGD on the logistic loss, with the classes reweighted so a handful of positives still count
+        """
+        data = [featurise(t, self.n_features) for t in texts]
+        y = np.asarray(labels, dtype=np.float64)
+        n_pos = max(1.0, y.sum())
+        n_neg = max(1.0, len(y) - y.sum())
+        class_w = {1.0: len(y) / (2 * n_pos), 0.0: len(y) / (2 * n_neg)}
+
+        w = self.weights
+        g2 = np.full(self.n_features, 1e-8)
+        b, gb2 = self.bias, 1e-8
+        order = list(range(len(data)))
+        rng = random.Random(seed)
+        for _ in range(epochs):
+            rng.shuffle(order)
+            for i in order:
+                idx, vals = data[i]
+                z = float(w[idx] @ vals) + b
+                p = 1.0 / (1.0 + np.exp(-z))
+                g = (p - y[i]) * class_w[y[i]]
+                grad = g * vals + l2 * w[idx]
+                g2[idx] += grad ** 2
+                w[idx] -= lr * grad / np.sqrt(g2[idx])
+                gb2 += g ** 2
+                b -= lr * g / np.sqrt(gb2)
+        self.weights, self.bias = w, b
+        return self
+
+    def score(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Batch relevance scores in [0, 1], one per text
+        """
+        if not texts:
+            return np.zeros(0)
+        idx_parts, val_parts, seg_parts = [], [], []
+        for i, t in enumerate(texts):
+            idx, vals = featurise(t, self.n_features)
+            idx_parts.append(idx)
+            val_parts.append(vals)
+            seg_parts.append(np.full(len(idx), i, dtype=np.int64))
+        idx = np.concatenate(idx_parts)
+        vals = np.concatenate(val_parts)
+        seg = np.concatenate(seg_parts)
+        z = np.bincount(seg, weights=self.weights[idx] * vals, minlength=len(texts)) + self.bias
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def score_snippets(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        One score per (multi-sentence) snippet as select_spans sees it: the best score among its sentences, since
+        select_spans ranks and thresholds single sentences
+        """
+        if not texts:
+            return np.zeros(0)
+        sents, owner = [], []
+        for i, t in enumerate(texts):
+            parts = [s for _, _, s in sentence_spans(t)] or [t]
+            sents += parts
+            owner += [i] * len(parts)
+        best = np.zeros(len(texts))
+        np.maximum.at(best, np.asarray(owner), self.score(sents))
+        return best
+
+    def calibrate(self, positive_texts: Sequence[str], target_recall: float = 0.95) -> float:
+        """
+        Set the threshold so target_recall of the given (held-out) positives would have a sentence selected
+        """
+        scores = np.sort(self.score_snippets(positive_texts))
+        if len(scores):
+            k = int(np.floor((1.0 - target_recall) * len(scores)))
+            self.threshold = float(scores[min(k, len(scores) - 1)])
+        return self.threshold
+
+    def save(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(path, weights=self.weights, bias=self.bias, n_features=self.n_features,
+                            threshold=self.threshold, meta=json.dumps(self.meta))
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "SentenceRanker":
+        with np.load(path) as z:
+            return cls(n_features=int(z["n_features"]), weights=z["weights"].astype(np.float64),
+                       bias=float(z["bias"]), threshold=float(z["threshold"]), meta=json.loads(str(z["meta"])))
+
+
+def select_spans(full_text: str, ranker: SentenceRanker, top_k: Optional[int] = None,
+                 threshold: Optional[float] = None, context: int = 1) -> List[Tuple[int, int, str]]:
+    """
+    Rank every sentence of an issue and keep only the best as (start_index, end_index, text) windows for
+    gpt_analyse.analyze_with_gpt(spans=...). Neighbouring sentences are kept for context and overlapping windows merged.
+
+    full_text: issue text
+    ranker: trained SentenceRanker
+    top_k: keep at most this many sentences (by score)
+    threshold: keep sentences scoring at least this, defaults to the ranker's calibrated threshold
+    context: number of neighbouring sentences either side to keep with each hit
+
+    returns: list of windows in text order
+    """
+    sents = sentence_spans(full_text)
+    if not sents:
+        return []
+    scores = ranker.score([s for _, _, s in sents])
+    cut = ranker.threshold if threshold is None else threshold
+    keep = [i for i in np.argsort(-scores) if scores[i] >= cut]
+    if top_k is not None:
+        keep = keep[:top_k]
+
+    windows: List[Tuple[int, int]] = []
+    for i in sorted(keep):
+        lo, hi = max(0, i - context), min(len(sents) - 1, i + context)
+        if windows and lo <= windows[-1][1] + 1:
+            windows[-1] = (windows[-1][0], max(windows[-1][1], hi))
+        else:
+            windows.append((lo, hi))
+
+    out = []
+    for lo, hi in windows:
+        start, end = sents[lo][0], sents[hi][1]
+        out.append((start, end, full_text[start:end]))
+    return out
+
+
+def request_tokens(spans: Iterable[Tuple[int, int, str]]) -> int:
+    """
+    Estimated prompt tokens to send these spans the way analyze_with_gpt does (short windows packed per request)
+    """
+    return estimate_request_tokens(list(spans))
+
+
+@lru_cache(maxsize=256)
+def issue_text(pdf_path: str, normalise: bool = True) -> str:
+    """
+    Issue text as the pipeline ranks it (text_clean normalisation on unless normalise=False), so training, evaluation
+    and selection all see the same sentences. Cached- train reads every PDF for negatives, calibration and the report.
+    """
+    from snow_miner.streaming import read_issue_text
+
+    return read_issue_text(pdf_path, normalise).text
+
+
+def issue_sentences(positives: Sequence[str], pdf_dir: str, normalise: bool = True) -> List[Optional[str]]:
+    """
+    For each curated snippet, the sentences of the issue text it lies in (joined), None if no issue contains it.
+    These are what select_spans actually scores- a snippet is often only part of a longer journal sentence.
+    """
+    targets = [_norm_text(t) for t in positives]
+    out: List[Optional[str]] = [None] * len(targets)
+    for path in sorted(glob.glob(os.path.join(pdf_dir, "*.pdf"))):
+        sents = [s for _, _, s in sentence_spans(issue_text(path, normalise))]
+        norms = [_norm_text(s) for s in sents]
+        starts, pos = [], 0
+        for n in norms:
+            starts.append(pos)
+            pos += len(n) + 1
+        joined = " ".join(norms)
+        for i, target in enumerate(targets):
+            if not target or out[i] is not None:
+                continue
+            at = joined.find(target)
+            if at < 0:
+                continue
+            lo = np.searchsorted(starts, at, side="right") - 1
+            hi = np.searchsorted(starts, at + len(target), side="left")
+            out[i] = " ".join(sents[lo:hi])
+    return out
+
+
+# ---------- training data ----------
+def load_positive_texts(points_csv: Optional[str] = None, curated_dir: Optional[str] = None) -> List[str]:
+    """
+    Curated snippets: the published points table plus any hand_curated output of enhanced_human_verification.py
+    """
+    import pandas as pd
+
+    texts: List[str] = []
+    if points_csv:
+        texts += pd.read_csv(points_csv)["text"].dropna().astype(str).tolist()
+    if curated_dir:
+        for path in sorted(glob.glob(os.path.join(curated_dir, "issue_*_curated.csv"))):
+            texts += pd.read_csv(path)["text"].dropna().astype(str).tolist()
+    return [t for t in texts if t.strip()]
+
+
+def load_rejected_texts(uncleaned_dir: str, curated_dir: str) -> List[str]:
+    """
+    Snippets GPT suggested that the annotator rejected- in the uncleaned issue CSV but missing from the curated one.
+    Snippets fixed with "Apply edit to snippet" also land here, which is a small amount of label noise.
+    """
+    import pandas as pd
+
+    rejected: List[str] = []
+    for path in sorted(glob.glob(os.path.join(curated_dir, "issue_*_curated.csv"))):
+        issue = os.path.basename(path)[:-len("_curated.csv")]
+        raw_path = os.path.join(uncleaned_dir, f"{issue}.csv")
+        if not os.path.exists(raw_path):
+            continue
+        kept = {_norm_text(t) for t in pd.read_csv(path)["text"].dropna().astype(str)}
+        for t in pd.read_csv(raw_path)["text"].dropna().astype(str):
+            if _norm_text(t) not in kept:
+                rejected.append(t)
+    return rejected
+
+
+def _shingles(text: str, n: int = 6) -> set:
+    words = _norm_text(text).split()
+    return {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+
+
+def load_background_texts(pdf_dir: str, positives: Sequence[str], per_issue: int = 200, seed: int = 0,
+                          normalise: bool = True) -> List[str]:
+    """
+    Random journal sentences that share no 6-word shingle with a curated snippet, as general negatives
+    """
+    known = set()
+    for t in positives:
+        known |= _shingles(t)
+    rng = random.Random(seed)
+    out: List[str] = []
+    for path in sorted(glob.glob(os.path.join(pdf_dir, "*.pdf"))):
+        text = issue_text(path, normalise)
+        sents = [s for _, _, s in sentence_spans(text) if len(s.split()) >= 4]
+        rng.shuffle(sents)
+        taken = 0
+        for s in sents:
+            if taken >= per_issue:
+                break
+            if _shingles(s) & known:
+                continue
+            out.append(s)
+            taken += 1
+    return out
+
+
+def _fold(text: str, folds: int = 5) -> int:
+    """
+    Stable fold id from the text itself, so train/evaluate runs agree on the split without storing it
+    """
+    return _hash(_norm_text(text)) % folds
+
+
+def evaluate(ranker: SentenceRanker, positives: Sequence[str], negatives: Sequence[str],
+             pdf_dir: Optional[str] = None, top_k: Optional[int] = None, normalise: bool = True) -> Dict:
+    """
+    Recall against curated rows and negative pass rate at the ranker threshold, plus the estimated prompt-token
+    reduction per issue if a PDF directory is given
+
+    recall_sentence: share of positives with at least one sentence scoring over the threshold
+    recall (needs pdf_dir): share of the positives found in an issue's text whose whole text lies inside a window
+        select_spans returns for that issue- what GPT would actually be shown
+    """
+    report: Dict = {"threshold": ranker.threshold}
+    pos_scores = ranker.score_snippets(list(positives))
+    neg_scores = ranker.score_snippets(list(negatives))
+    report["positives"] = len(pos_scores)
+    report["negatives"] = len(neg_scores)
+    report["recall_sentence"] = float((pos_scores >= ranker.threshold).mean()) if len(pos_scores) else None
+    report["negative_pass_rate"] = float((neg_scores >= ranker.threshold).mean()) if len(neg_scores) else None
+
+    if pdf_dir:
+        targets = [_norm_text(t) for t in positives]
+        located = [False] * len(targets)
+        covered = [False] * len(targets)
+        full_tokens = selected_tokens = 0
+        for path in sorted(glob.glob(os.path.join(pdf_dir, "*.pdf"))):
+            text = issue_text(path, normalise)
+            spans = select_spans(text, ranker, top_k=top_k)
+            full_tokens += request_tokens(chunk_spans(text, max_chars=8000, overlap=1000))
+            selected_tokens += request_tokens(spans)
+            norm_issue = _norm_text(text)
+            norm_windows = [_norm_text(w) for _, _, w in spans]
+            for i, target in enumerate(targets):
+                if target and not located[i] and target in norm_issue:
+                    located[i] = True
+                    covered[i] = any(target in w for w in norm_windows)
+        report["positives_located"] = sum(located)
+        report["recall"] = sum(covered) / sum(located) if any(located) else None
+        report["prompt_tokens_full"] = full_tokens
+        report["prompt_tokens_selected"] = selected_tokens
+        report["token_reduction"] = 1.0 - selected_tokens / full_tokens if full_tokens else None
+    return report
+
+
+def _load_training_set(args) -> Tuple[List[str], List[str]]:
+    positives = load_positive_texts(args.points, args.curated_dir)
+    negatives: List[str] = []
+    if args.uncleaned_dir and args.curated_dir:
+        negatives += load_rejected_texts(args.uncleaned_dir, args.curated_dir)
+    if args.pdf_dir:
+        negatives += load_background_texts(args.pdf_dir, positives, per_issue=args.background_per_issue,
+                                           normalise=not args.no_normalise)
+    if not positives or not negatives:
+        raise RuntimeError("Need curated positives and rejected/background negatives- pass --uncleaned-dir and "
+                           "--curated-dir and/or --pdf-dir")
+    return positives, negatives
+
+
+def main():
+    """
+    python -m snow_miner.ranker train --points docs/data/points.csv --pdf-dir data/pdfs --model models/ranker.npz
+    python -m snow_miner.ranker evaluate --points docs/data/points.csv --pdf-dir data/pdfs --model models/ranker.npz
+    python -m snow_miner.ranker rank --model models/ranker.npz --pdf data/pdfs/issue_010.pdf
+
+    Texts are split into 5 hash-based folds: train fits on folds 2-4, calibrates the threshold on the fold 1 positives
+    and saves the model (with --pdf-dir, calibrated on the journal sentences those snippets sit in). Both commands report on fold 0- recall against curated rows (with --pdf-dir: how many of them
+    lie inside the windows selected for their issue) and the prompt-token reduction over the PDFs. PDF text is
+    normalised as in the pipeline unless --no-normalise (match the run_pipeline.py setting).
+    """
+    ap = argparse.ArgumentParser(description="CPU-only sentence ranker for pre-selecting GPT windows")
+    ap.add_argument("command", choices=["train", "evaluate", "rank"])
+    ap.add_argument("--model", type=str, default="models/ranker.npz", help="Model file to write/read")
+    ap.add_argument("--points", type=str, default="docs/data/points.csv", help="Curated points CSV")
+    ap.add_argument("--curated-dir", type=str, default=None, help="hand_curated output dir of the annotator")
+    ap.add_argument("--uncleaned-dir", type=str, default=None, help="Uncleaned GPT CSVs (for rejected snippets)")
+    ap.add_argument("--pdf-dir", type=str, default=None, help="Journal PDFs (background negatives, token report)")
+    ap.add_argument("--pdf", type=str, default=None, help="Single PDF to rank (rank command)")
+    ap.add_argument("--background-per-issue", type=int, default=200)
+    ap.add_argument("--target-recall", type=float, default=0.95)
+    ap.add_argument("--top-k", type=int, default=None, help="Cap on sentences selected per issue")
+    ap.add_argument("--no-normalise", action="store_true", help="Rank raw pdfminer text, as run_pipeline.py --no-normalise")
+    args = ap.parse_args()
+
+    if args.command == "rank":
+        ranker = SentenceRanker.load(args.model)
+        text = issue_text(args.pdf, not args.no_normalise)
+        for start, end, window in select_spans(text, ranker, top_k=args.top_k):
+            print(f"[{start}:{end}] {' '.join(window.split())[:200]}")
+        return
+
+    positives, negatives = _load_training_set(args)
+    pos_train = [t for t in positives if _fold(t) >= 2]
+    pos_calib = [t for t in positives if _fold(t) == 1]
+    pos_test = [t for t in positives if _fold(t) == 0]
+    neg_train = [t for t in negatives if _fold(t) >= 1]
+    neg_test = [t for t in negatives if _fold(t) == 0]
+
+    if args.command == "train":
+        ranker = SentenceRanker(meta={"positives": len(pos_train), "negatives": len(neg_train)})
+        ranker.fit(pos_train + neg_train, [1] * len(pos_train) + [0] * len(neg_train))
+        if args.pdf_dir:  # calibrate on the journal sentences the held-out snippets sit in, where they can be found
+            found = issue_sentences(pos_calib, args.pdf_dir, normalise=not args.no_normalise)
+            pos_calib = [f or t for t, f in zip(pos_calib, found)]
+        ranker.calibrate(pos_calib, target_recall=args.target_recall)
+        ranker.save(args.model)
+        print(f"Saved {args.model} (threshold {ranker.threshold:.3f})")
+    else:
+        ranker = SentenceRanker.load(args.model)
+
+    print(json.dumps(evaluate(ranker, pos_test, neg_test, pdf_dir=args.pdf_dir, top_k=args.top_k,
+                              normalise=not args.no_normalise), indent=2))
+
+
+if __name__ == "__main__":
+    main()
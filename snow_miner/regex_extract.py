@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from typing import Dict, List, Tuple
+
+from snow_miner.config import SENT_SPLIT
+from snow_miner.gpt_analyse import find_all_dates_global, nearest_global_date
+from snow_miner.lexicon import CAT_SNOW, LEXICON_REGEX, LexiconHit, best_score, classify
+
+# a sentence needs at least one of these to count as a snow observation- "gully" or "none" on their own are not enough
+CORE_ENTITY_CLASSES = ("surface", "avalanche")
+CORE_MIN_TIER = 2
+
+# score tiers in config.SCORE_PATTERNS run 0-5, the CSVs (and GPT) use 0-10
+TIER_TO_SCORE = 2
+
+
+def sentence_spans(text: str) -> List[Tuple[int, int, str]]:
+    """
+    Split text into (start_index, end_index, sentence) with config.SENT_SPLIT, keeping global offsets for date anchoring
+    """
+    text = text or ""
+    spans: List[Tuple[int, int, str]] = []
+    start = 0
+    for m in SENT_SPLIT.finditer(text):
+        if m.start() > start:
+            spans.append((start, m.start(), text[start:m.start()]))
+        start = m.end()
+    if start < len(text):
+        spans.append((start, len(text), text[start:]))
+    return spans
+
+
+def _tag_batch(sentences: List[str]) -> List[List[LexiconHit]]:
+    """
+    Tag a batch of sentences with a single scan over the joined batch, then hand the hits back to their sentences.
+    Joined with NUL, which \s doesn't match, so patterns like good\s*cover can't run from one sentence into the next.
+    """
+    joined = "\x00".join(sentences)
+    starts: List[int] = []
+    pos = 0
+    for s in sentences:
+        starts.append(pos)
+        pos += len(s) + 1
+
+    out: List[List[LexiconHit]] = [[] for _ in sentences]
+    for m in LEXICON_REGEX.finditer(joined):
+        i = bisect_right(starts, m.start()) - 1
+        categories, score, entity = classify(m.group(0).lower())
+        out[i].append(LexiconHit(m.start() - starts[i], m.end() - starts[i], m.group(0), categories, score, entity))
+    return out
+
+
+def _is_observation(hits: List[LexiconHit]) -> bool:
+    for h in hits:
+        if CAT_SNOW not in h.categories:
+            continue
+        if h.score is not None and h.score >= CORE_MIN_TIER:
+            return True
+        if h.entity in CORE_ENTITY_CLASSES:
+            return True
+    return False
+
+
+def analyze_with_regex(full_text: str, batch_size: int = 512) -> List[Dict]:
+    """
+    LLM-free counterpart to gpt_analyse.analyze_with_gpt- same row dicts, no API calls. Uses the SCORE/ENTITY patterns
+    from config that GPT replaced, so it is a baseline to measure GPT against rather than a replacement.
+
+    1) Pre-index all date mentions in the full document (same as the GPT path)
+    2) Split into sentences and tag them in batches with the shared lexicon matcher
+    3) Keep sentences with a core snow term, score them by the highest tier (scaled to 0-10) and attach nearest date
+
+    full_text: input text
+    batch_size: sentences per matcher scan
+
+    returns: list of row dicts with text/entity/location/score/date, plus the sentence's offset in full_text
+    """
+    results: List[Dict] = []
+    global_dates = find_all_dates_global(full_text)
+    spans = [s for s in sentence_spans(full_text) if s[2].strip()]
+
+    for b in range(0, len(spans), batch_size):
+        batch = spans[b:b + batch_size]
+        batch_hits = _tag_batch([s for _, _, s in batch])
+        for (start_idx, _, sentence), hits in zip(batch, batch_hits):
+            if not _is_observation(hits):
+                continue
+
+            snippet = " ".join(sentence.split())
+            tier = best_score(hits)
+            score = max(0, min(10, (tier if tier is not None else 1) * TIER_TO_SCORE))
+
+            entities: List[str] = []
+            for h in hits:
+                term = h.text.lower()
+                if (h.entity or h.score is not None) and term not in entities:
+                    entities.append(term)
+
+            results.append({
+                "text": snippet,
+                "entity": ", ".join(entities),
+                "location": None,
+                "score": score,
+                "date": nearest_global_date(global_dates, start_idx, max_dist=6000),
+                "offset": start_idx,
+            })
+
+    return results
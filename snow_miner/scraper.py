@@ -1,12 +1,12 @@
 
+import json
 import os
 import re
 import time
 import pathlib
 import urllib.parse
-import requests
-from bs4 import BeautifulSoup
-from tqdm import tqdm
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
 
 BASE_URL = "https://www.cairngormclub.org.uk/journals/search_the_journals.htm"
 HEADERS = {"User-Agent": "cairngorm-snow-miner/1.0 (+https://example.local)"}
@@ -14,15 +14,195 @@ HEADERS = {"User-Agent": "cairngorm-snow-miner/1.0 (+https://example.local)"}
 
 HEADERS = {"User-Agent": "cairngorm-snow-miner/1.0"}
 
-def get_pdf_links():
+# the club's file naming; {issue} is the issue number. Issues 1..LAST_KNOWN_ISSUE were online when this was written,
+# later ones are found by discover_issues and kept in the download manifest
+URL_TEMPLATE = "http://www.cairngormclub.org.uk/journals/PDFs/Complete/The%20Cairngorm%20Club%20Journal%20{issue:03d}%20WM.pdf"
+LAST_KNOWN_ISSUE = 116
+MANIFEST_NAME = "manifest.json"
 
-    pdf_links = []
 
-    for i in [f"{i:03d}" for i in range(1,117)]:
-        pdf_links.append(f"http://www.cairngormclub.org.uk/journals/PDFs/Complete/The%20Cairngorm%20Club%20Journal%20{i}%20WM.pdf")
+def issue_url(issue: int, url_template: str = URL_TEMPLATE) -> str:
+    return url_template.format(issue=issue)
+
+
+def get_pdf_links(url_template: str = URL_TEMPLATE, last_issue: int = LAST_KNOWN_ISSUE) -> List[str]:
+
+    return [issue_url(i, url_template) for i in range(1, last_issue + 1)]
+
+
+def probe_issue(url: str, timeout: float = 15) -> Optional[Dict]:
+    """
+    HEAD one candidate issue URL (a GET that never reads the body where the server doesn't allow HEAD)
+
+    returns: {"content_length", "last_modified"} if there is a PDF there, None if not (or the request failed)
+    """
+    import requests
+
+    try:
+        r = requests.head(url, headers=HEADERS, timeout=timeout, allow_redirects=True)
+        if r.status_code in (405, 501):
+            with requests.get(url, headers=HEADERS, timeout=timeout, stream=True) as r:
+                pass
+    except requests.RequestException:
+        return None
+    # some servers answer a missing file with a 200 HTML page
+    if r.status_code != 200 or "html" in r.headers.get("Content-Type", "").lower():
+        return None
+    length = r.headers.get("Content-Length", "")
+    return {"content_length": int(length) if length.isdigit() else None,
+            "last_modified": r.headers.get("Last-Modified")}
+
+
+def discover_issues(start: int, url_template: str = URL_TEMPLATE, gap: int = 3, workers: int = 8,
+                    timeout: float = 15) -> Dict[int, Dict]:
+    """
+    Probe issue numbers from start upwards, a batch of concurrent HEAD requests at a time, until `gap` numbers in a row
+    are missing (so one withdrawn or misnamed issue doesn't end the search)
+
+    returns: issue number -> {"url", "content_length", "last_modified"} for every issue found
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    found: Dict[int, Dict] = {}
+    misses, issue = 0, start
+    batch = max(workers, gap)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while misses < gap:
+            numbers = list(range(issue, issue + batch))
+            urls = [issue_url(i, url_template) for i in numbers]
+            for i, url, info in zip(numbers, urls, pool.map(lambda u: probe_issue(u, timeout), urls)):
+                if info is None:
+                    misses += 1
+                    if misses >= gap:
+                        break
+                else:
+                    misses = 0
+                    found[i] = {"url": url, **info}
+            issue += batch
+    return found
+
+
+def load_manifest(pdf_dir: str = "data/pdfs") -> Dict:
+    """
+    Download manifest (pdf_dir/manifest.json): {"issues": {"117": {"url", "discovered", "processed", "csv", ...}},
+    "last_probe": {...}}. Empty if there isn't one yet.
+    """
+    path = os.path.join(pdf_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {"issues": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: Dict, pdf_dir: str = "data/pdfs") -> str:
+    os.makedirs(pdf_dir, exist_ok=True)
+    path = os.path.join(pdf_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def update_manifest(pdf_dir: str = "data/pdfs", url_template: str = URL_TEMPLATE, gap: int = 3,
+                    workers: int = 8) -> Tuple[Dict, List[int]]:
+    """
+    Probe for issues past the last one in the manifest (LAST_KNOWN_ISSUE for a new manifest, which starts out with the
+    known issues) and add what turns up
+
+    returns: (saved manifest, issue numbers found by this probe)
+    """
+    manifest = load_manifest(pdf_dir)
+    issues = manifest.setdefault("issues", {})
+    if not issues:
+        for i in range(1, LAST_KNOWN_ISSUE + 1):
+            issues[str(i)] = {"url": issue_url(i, url_template), "discovered": None}
+    start = max(int(i) for i in issues) + 1
+    now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    found = discover_issues(start, url_template, gap=gap, workers=workers)
+    for i, info in found.items():
+        issues[str(i)] = {**info, "discovered": now}
+    manifest["last_probe"] = {"at": now, "from": start, "gap": gap, "url_template": url_template,
+                              "found": sorted(found)}
+    save_manifest(manifest, pdf_dir)
+    return manifest, sorted(found)
+
+
+def pending_issues(manifest: Dict, out_dir: str = "out", backlog: bool = False) -> List[str]:
+    """
+    Manifest issue numbers still to process, in issue order: discovered issues (an earlier --discover, or an --update
+    that crashed or whose download failed) not marked processed or whose CSV is gone
+
+    backlog: also every other manifest issue without a CSV in out_dir
+    """
+    todo = []
+    for number, info in sorted(manifest.get("issues", {}).items(), key=lambda kv: int(kv[0])):
+        has_csv = os.path.exists(os.path.join(out_dir, f"issue_{int(number):03d}.csv"))
+        if info.get("discovered") is not None and not (info.get("processed") and has_csv):
+            todo.append(number)
+        elif backlog and not has_csv:
+            todo.append(number)
+    return todo
+
+
+def mark_processed(csv_paths: List[str], pdf_dir: str = "data/pdfs") -> Dict:
+    """
+    Record the issues these CSVs (out_dir/issue_XXX.csv) belong to as processed in the manifest
+    """
+    manifest = load_manifest(pdf_dir)
+    issues = manifest.setdefault("issues", {})
+    now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    for path in csv_paths:
+        m = re.search(r"issue_(\d{3})\.csv$", os.path.basename(path))
+        if m and str(int(m.group(1))) in issues:
+            issues[str(int(m.group(1)))].update(processed=now, csv=path)
+    save_manifest(manifest, pdf_dir)
+    return manifest
+
+
+def manifest_links(manifest: Dict) -> List[str]:
+    """
+    Issue URLs in the manifest, in issue order
+    """
+    return [info["url"] for _, info in sorted(manifest.get("issues", {}).items(), key=lambda kv: int(kv[0]))]
+
+
+def known_pdf_links(pdf_dir: str = "data/pdfs") -> List[str]:
+    """
+    Every issue URL known so far: the manifest's if there is one, otherwise the built-in range
+    """
+    return manifest_links(load_manifest(pdf_dir)) or get_pdf_links()
+
+
+def download_pdf(url: str, dest_dir: str = "data/pdfs", delay: float = 0.5) -> Optional[str]:
+
+    """
+    Download one PDF (kept if already there). Returns the local path, or None if the download failed
+    """
+
+    import requests
+
+    fn = pathlib.Path(urllib.parse.urlparse(url).path).name
+    if not fn.lower().endswith(".pdf"):
+        fn += ".pdf"
+    out = os.path.join(dest_dir, fn)
+    if os.path.exists(out):
+        return out
+    os.makedirs(dest_dir, exist_ok=True)
+    try:
+        with requests.get(url, headers=HEADERS, timeout=90, stream=True) as r:
+            r.raise_for_status()
+            # written under a temp name so a half-finished download never looks like a PDF to the next stage
+            with open(out + ".part", "wb") as f:
+                for chunk in r.iter_content(chunk_size=15000):
+                    if chunk:
+                        f.write(chunk)
+        os.replace(out + ".part", out)
+        time.sleep(delay)
+        return out
+    except requests.RequestException:
+        # skip failed downloads
+        return None
 
-    print(pdf_links)
-    return pdf_links
 
 def download_pdfs(urls: list, dest_dir="data/pdfs", delay=0.5):
 
@@ -30,27 +210,13 @@ def download_pdfs(urls: list, dest_dir="data/pdfs", delay=0.5):
     PDF scraping- please dont trigger this unless you need to
     """
 
+    from tqdm import tqdm
+
     os.makedirs(dest_dir, exist_ok=True)
     saved = []
     for url in tqdm(urls):
-        fn = pathlib.Path(urllib.parse.urlparse(url).path).name
-        if not fn.lower().endswith(".pdf"):
-            fn += ".pdf"
-        out = os.path.join(dest_dir, fn)
-        if os.path.exists(out):
-            saved.append(out)
-            continue
-        try:
-            with requests.get(url, headers=HEADERS, timeout=90, stream=True) as r:
-                r.raise_for_status()
-                with open(out, "wb") as f:
-                    for chunk in r.iter_content(chunk_size=15000):
-                        if chunk:
-                            f.write(chunk)
+        out = download_pdf(url, dest_dir, delay)
+        if out:
             saved.append(out)
-            time.sleep(delay)
-        except requests.RequestException:
-            # skip failed downloads
-            continue
 
     return saved
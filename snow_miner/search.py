@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+DEFAULT_DB = "data/search.sqlite"
+
+# highlight() markers used to recover match offsets (FTS5 has no offsets() function)
+_MARK_OPEN, _MARK_CLOSE = "\x02", "\x03"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    issue TEXT PRIMARY KEY,
+    source TEXT,
+    mtime REAL,
+    size INTEGER,
+    pages INTEGER
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(
+    text,
+    issue UNINDEXED,
+    page UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+"""
+
+
+class SearchHit(NamedTuple):
+    issue: str
+    page: int
+    offset: int  # character offset of the first matched term within the page text
+    snippet: str
+    rank: float
+
+
+def open_index(db_path: str = DEFAULT_DB) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _replace_issue(conn: sqlite3.Connection, issue: str, pages: List[Tuple[int, str]], source: str,
+                   mtime: float, size: int) -> None:
+    with conn:
+        conn.execute("DELETE FROM pages WHERE issue = ?", (issue,))
+        conn.executemany("INSERT INTO pages (text, issue, page) VALUES (?, ?, ?)",
+                         [(text, issue, page) for page, text in pages])
+        conn.execute("INSERT OR REPLACE INTO issues (issue, source, mtime, size, pages) VALUES (?, ?, ?, ?, ?)",
+                     (issue, source, mtime, size, len(pages)))
+
+
+def _stale_pdfs(conn: sqlite3.Connection, pdf_dir: str) -> List[Tuple[str, float, int]]:
+    """
+    PDFs in pdf_dir that are new or changed (mtime/size) since they were last indexed
+    """
+    known = {source: (mtime, size) for source, mtime, size in conn.execute("SELECT source, mtime, size FROM issues")}
+    out = []
+    for name in sorted(os.listdir(pdf_dir)):
+        if not name.lower().endswith(".pdf"):
+            continue
+        path = os.path.abspath(os.path.join(pdf_dir, name))
+        st = os.stat(path)
+        if known.get(path) != (st.st_mtime, st.st_size):
+            out.append((path, st.st_mtime, st.st_size))
+    return out
+
+
+def update_index(db_path: str = DEFAULT_DB, pdf_dir: Optional[str] = None, corpus_dir: Optional[str] = None,
+                 workers: Optional[int] = None) -> List[str]:
+    """
+    Add new issues to the index and re-index changed ones. Nothing already indexed and unchanged is touched, so this
+    is cheap to run after every scrape.
+
+    pdf_dir: index (normalised) page text straight from the PDFs
+    corpus_dir: or take it from a built corpus (snow_miner.corpus)- issues already in the index are skipped
+    workers: processes for PDF extraction
+
+    returns: issues (re)indexed
+    """
+    conn = open_index(db_path)
+    done: List[str] = []
+    try:
+        if corpus_dir:
+            from snow_miner.corpus import CORPUS_TEXT, Corpus
+
+            known = {row[0] for row in conn.execute("SELECT issue FROM issues")}
+            st = os.stat(os.path.join(corpus_dir, CORPUS_TEXT))
+            with Corpus(corpus_dir) as corpus:
+                for issue in corpus.issues:
+                    if issue not in known:
+                        _replace_issue(conn, issue, corpus.pages(issue), os.path.abspath(corpus_dir),
+                                       st.st_mtime, st.st_size)
+                        done.append(issue)
+        if pdf_dir:
+            from snow_miner.corpus import issue_pages
+
+            stale = _stale_pdfs(conn, pdf_dir)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for (path, mtime, size), (issue, pages) in zip(stale, pool.map(issue_pages, [s[0] for s in stale])):
+                    _replace_issue(conn, issue, pages, path, mtime, size)
+                    done.append(issue)
+        if done:
+            with conn:
+                conn.execute("INSERT INTO pages (pages) VALUES ('optimize')")
+    finally:
+        conn.close()
+    return done
+
+
+def search(conn: sqlite3.Connection, query: str, limit: int = 20, issue: Optional[str] = None,
+           snippet_tokens: int = 16) -> List[SearchHit]:
+    """
+    Query the index with FTS5 syntax, best matches first:
+
+        cornice                     word (stemmed, so "cornices" matches too)
+        "snow lay deep"             phrase
+        NEAR(corrie snow, 8)        both within 8 tokens of each other
+        lochnag*                    prefix
+        corrie AND NOT "sgoran"     boolean
+
+    issue: restrict to one issue (e.g. "issue_042")
+
+    returns: list of SearchHit(issue, page, offset, snippet, rank)
+    raises: ValueError if the query isn't valid FTS5 syntax (use phrase() for free text)
+    """
+    sql = ("SELECT issue, page, highlight(pages, 0, ?, ?), snippet(pages, 0, '[', ']', '...', ?), rank "
+           "FROM pages WHERE pages MATCH ?")
+    params: list = [_MARK_OPEN, _MARK_CLOSE, snippet_tokens, query]
+    if issue:
+        sql += " AND issue = ?"
+        params.append(issue)
+    sql += " ORDER BY rank LIMIT ?"
+    params.append(limit)
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    except sqlite3.OperationalError as e:
+        if "no such table" in str(e):
+            raise
+        raise ValueError(f"invalid query syntax {query!r} ({e})") from e
+    return [SearchHit(iss, int(page), max(0, marked.find(_MARK_OPEN)), snip, rank)
+            for iss, page, marked, snip, rank in rows]
+
+
+def phrase(text: str) -> str:
+    """
+    Quote free text (e.g. an annotator snippet) as an FTS5 phrase
+    """
+    return '"' + " ".join(text.split()).replace('"', '""') + '"'
+
+
+def near(terms: Iterable[str], distance: int = 10) -> str:
+    return f"NEAR({' '.join(phrase(t) for t in terms)}, {distance})"
+
+
+def indexed_issues(conn: sqlite3.Connection) -> List[Tuple[str, int]]:
+    return list(conn.execute("SELECT issue, pages FROM issues ORDER BY issue"))
+
+
+def main():
+    """
+    python -m snow_miner.search build --pdf-dir data/pdfs          # first time, and again after new issues arrive
+    python -m snow_miner.search build --corpus-dir data/corpus     # or from a built corpus
+    python -m snow_miner.search query 'NEAR(corrie cornice, 10)' --limit 10
+    python -m snow_miner.search query '"Loch Avon"' --issue issue_042
+    """
+    ap = argparse.ArgumentParser(description="Full-text search over the journal pages (SQLite FTS5)")
+    ap.add_argument("command", choices=["build", "query", "status"])
+    ap.add_argument("query", nargs="?", default=None, help="FTS5 query for the query command")
+    ap.add_argument("--db", type=str, default=DEFAULT_DB)
+    ap.add_argument("--pdf-dir", type=str, default=None)
+    ap.add_argument("--corpus-dir", type=str, default=None)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--issue", type=str, default=None)
+    ap.add_argument("--limit", type=int, default=20)
+    args = ap.parse_args()
+
+    if args.command == "build":
+        if not (args.pdf_dir or args.corpus_dir):
+            ap.error("build needs --pdf-dir or --corpus-dir")
+        done = update_index(args.db, pdf_dir=args.pdf_dir, corpus_dir=args.corpus_dir, workers=args.workers)
+        print(f"Indexed {len(done)} new/changed issues into {args.db}")
+        return
+
+    conn = open_index(args.db)
+    try:
+        if args.command == "status":
+            issues = indexed_issues(conn)
+            print(f"{len(issues)} issues, {sum(n for _, n in issues)} pages in {args.db}")
+            return
+        if not args.query:
+            ap.error("query needs a query string")
+        t0 = time.perf_counter()
+        try:
+            hits = search(conn, args.query, limit=args.limit, issue=args.issue)
+        except ValueError as e:
+            ap.error(f"{e}- e.g. cornice, '\"snow lay deep\"', 'NEAR(corrie cornice, 10)', 'lochnag*'")
+        ms = (time.perf_counter() - t0) * 1000
+        for h in hits:
+            print(f"{h.issue} p{h.page} @{h.offset}: {h.snippet}")
+        print(f"{len(hits)} hits in {ms:.1f} ms")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
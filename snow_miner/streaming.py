@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .instrumentation import get_metrics, issue_context
+from .pipeline import attach_pages, detect_issue_from_filename, get_extractor, page_index_for, write_rows_csv
+
+if TYPE_CHECKING:
+    from .cascade import Cascade
+    from .ranker import SentenceRanker
+
+STAGES = ("download", "extract", "select", "llm", "write")
+
+# threads per stage. extract threads only hand PDFs to the process pool (pdfminer is CPU bound), llm threads each work
+# one issue's requests, so they set how many API calls are in flight
+DEFAULT_WORKERS: Dict[str, int] = {"download": 2, "extract": os.cpu_count() or 2, "select": 1, "llm": 4, "write": 1}
+
+_DONE = object()  # end-of-stream marker, passed stage to stage
+
+
+class IssueJob:
+    """
+    One issue on its way through the stages- each stage fills in the next field
+    """
+
+    def __init__(self, issue: str, pdf_path: str, out_path: str):
+        self.issue = issue
+        self.pdf_path = pdf_path
+        self.out_path = out_path
+        self.full_text: str = ""
+        self.fallback_year: Optional[int] = None
+        self.page_index: List[Tuple[int, int]] = []
+        self.spans: Optional[List[Tuple[int, int, str]]] = None
+        self.rows: List[Dict] = []
+
+
+class IssueText(NamedTuple):
+    text: str
+    fallback_year: Optional[int]  # front-page publication year
+    stripped: int  # chars removed by normalisation
+    page_index: List[Tuple[int, int]]  # (start offset in text, page number) per page- see pipeline.attach_pages
+    counters: Dict[str, int]  # counters booked while reading (OCR)- they land in the worker process's own metrics
+
+
+def read_issue_text(pdf_path: str, normalise: bool = True) -> IssueText:
+    """
+    What process_pdf does before extraction, for one PDF. Runs in the extract process pool, so it only takes and
+    returns plain values.
+    """
+    from .dates import publication_year
+    from .pdf_text import extract_text_pages
+
+    metrics = get_metrics()
+    before = metrics.totals()["counters"]
+    pages = extract_text_pages(pdf_path)
+    after = metrics.totals()["counters"]
+    counters = {k: n - before.get(k, 0) for k, n in after.items() if n != before.get(k, 0)}
+    if not pages:
+        return IssueText("", None, 0, [], counters)
+    full_text = "\n\n".join(page_text for _, page_text in pages)
+    stripped = 0
+    clean = None
+    if normalise:
+        from .text_clean import normalise_pages
+
+        clean = normalise_pages(pages)
+        stripped = len(full_text) - len(clean.text)
+        full_text = clean.text
+    return IssueText(full_text, publication_year(pages[0][1]), stripped, page_index_for(pages, clean), counters)
+
+
+class StreamingPipeline:
+    """
+    download -> extract -> select -> llm -> write, with a bounded queue in front of every stage and its own worker
+    threads per stage. Stages overlap, so downloads, pdfminer and API latency run at the same time and the first CSVs
+    appear while later PDFs are still downloading. A full queue blocks the stage feeding it (back-pressure), so the
+    queue sitting full is the one in front of the bottleneck- depths are sampled into the run metrics as gauges.
+    """
+
+    def __init__(self, out_dir: str = "out", include_date_col: bool = True, overwrite: bool = False,
+                 extractor: str = "gpt", ranker: Optional["SentenceRanker"] = None, top_k: Optional[int] = None,
+                 include_date_parts: bool = False, normalise: bool = True, workers: Optional[Dict[str, int]] = None,
+                 queue_size: int = 4, sample_s: float = 0.5, cascade: Optional["Cascade"] = None,
+                 include_page: bool = False):
+        self.out_dir = out_dir
+        self.include_date_col = include_date_col
+        self.overwrite = overwrite
+        self.extractor = extractor
+        self.ranker = ranker
+        self.top_k = top_k
+        self.include_date_parts = include_date_parts
+        self.normalise = normalise
+        self.cascade = cascade
+        self.include_page = include_page
+        self.workers = dict(DEFAULT_WORKERS, **(workers or {}))
+        self.queues: Dict[str, queue.Queue] = {name: queue.Queue(maxsize=queue_size) for name in STAGES}
+        self.sample_s = sample_s
+        self.pdf_dir = "data/pdfs"
+        self.results: List[str] = []
+        self.failed: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._depth_sum: Dict[str, float] = {name: 0.0 for name in STAGES}
+        self._depth_max: Dict[str, int] = {name: 0 for name in STAGES}
+        self._samples = 0
+
+    # ---------- stages: each takes one item and returns the item for the next queue (or None to drop it) ----------
+    def _download(self, url: str) -> Optional[str]:
+        from .scraper import download_pdf
+
+        with get_metrics().stage("download", issue=detect_issue_from_filename(url)):
+            return download_pdf(url, dest_dir=self.pdf_dir)
+
+    def _extract(self, pdf_path: str) -> Optional[IssueJob]:
+        issue = detect_issue_from_filename(pdf_path) or os.path.splitext(os.path.basename(pdf_path))[0]
+        job = IssueJob(issue, pdf_path, os.path.join(self.out_dir, f"{issue}.csv"))
+        if not self.overwrite and os.path.exists(job.out_path):
+            print(f"[skip] {job.out_path} already exists; skipping this journal.")
+            self._finished(job.out_path)
+            return None
+        metrics = get_metrics()
+        with issue_context(issue):
+            # wall time only- the CPU is spent in the worker process
+            with metrics.stage("pdf_extract"):
+                text = self._pool.submit(read_issue_text, pdf_path, self.normalise).result()
+            job.full_text, job.fallback_year, job.page_index = text.text, text.fallback_year, text.page_index
+            metrics.incr("chars_stripped", text.stripped)
+            for counter, n in text.counters.items():
+                metrics.incr(counter, n)
+        return job if job.full_text else None
+
+    def _select(self, job: IssueJob) -> IssueJob:
+        if self.extractor != "gpt":
+            return job
+        metrics = get_metrics()
+        with issue_context(job.issue):
+            if self.ranker is not None:
+                from .ranker import select_spans
+
+                with metrics.stage("rank_select"):
+                    job.spans = select_spans(job.full_text, self.ranker, top_k=self.top_k)
+            else:
+                from .gpt_analyse import chunk_spans
+
+                with metrics.stage("chunk"):
+                    job.spans = chunk_spans(job.full_text, max_chars=8000, overlap=1000)
+        return job
+
+    def _llm(self, job: IssueJob) -> IssueJob:
+        metrics = get_metrics()
+        with issue_context(job.issue), metrics.stage(f"extract_{self.extractor}"):
+            if self.extractor == "gpt":
+                from .gpt_analyse import analyze_with_gpt
+
+                job.rows = analyze_with_gpt(job.full_text, spans=job.spans, cascade=self.cascade)
+            else:
+                job.rows = get_extractor(self.extractor)(job.full_text)
+            metrics.incr("rows", len(job.rows))
+        attach_pages(job.rows, job.page_index)
+        return job
+
+    def _write(self, job: IssueJob) -> None:
+        with issue_context(job.issue), get_metrics().stage("write_csv"):
+            write_rows_csv(job.rows, job.out_path, include_date_col=self.include_date_col,
+                           include_date_parts=self.include_date_parts, fallback_year=job.fallback_year,
+                           include_page=self.include_page)
+        self._finished(job.out_path)
+        print(f"[done] {job.out_path} ({len(job.rows)} rows)")
+
+    # ---------- plumbing ----------
+    def _finished(self, out_path: str) -> None:
+        with self._lock:
+            self.results.append(out_path)
+
+    def _worker(self, name: str, fn: Callable, inbox: queue.Queue, outbox: Optional[queue.Queue]) -> None:
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                return
+            try:
+                out = fn(item)
+            except Exception as e:  # one bad issue must not stall the stream
+                label = getattr(item, "issue", item)
+                print(f"[{name}] failed on {label}: {e!r}")
+                traceback.print_exc()
+                get_metrics().incr("stream_failures", issue=getattr(item, "issue", None))
+                with self._lock:
+                    self.failed.append((str(label), name))
+                continue
+            if out is not None and outbox is not None:
+                outbox.put(out)
+
+    def _end_stream(self, name: str) -> None:
+        """
+        One end-of-stream marker per worker of the stage, so each of them stops
+        """
+        for _ in range(self._n_workers(name)):
+            self.queues[name].put(_DONE)
+
+    def _n_workers(self, name: str) -> int:
+        return max(1, self.workers[name])
+
+    def _start_stage(self, name: str, fn: Callable, next_stage: Optional[str]) -> threading.Thread:
+        inbox = self.queues[name]
+        outbox = self.queues[next_stage] if next_stage else None
+        threads = [threading.Thread(target=self._worker, args=(name, fn, inbox, outbox), daemon=True,
+                                    name=f"stream-{name}-{i}") for i in range(self._n_workers(name))]
+        for t in threads:
+            t.start()
+
+        def close():
+            for t in threads:
+                t.join()
+            if next_stage:
+                self._end_stream(next_stage)
+
+        closer = threading.Thread(target=close, daemon=True, name=f"stream-{name}-close")
+        closer.start()
+        return closer
+
+    def _sample_queues(self, stop: threading.Event) -> None:
+        metrics = get_metrics()
+        while not stop.wait(self.sample_s):
+            depths = {name: q.qsize() for name, q in self.queues.items()}
+            with self._lock:
+                self._samples += 1
+                for name, depth in depths.items():
+                    self._depth_sum[name] += depth
+                    self._depth_max[name] = max(self._depth_max[name], depth)
+            for name, depth in depths.items():
+                metrics.set_gauge(f"queue_depth_{name}", depth)
+
+    def queue_report(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            n = max(1, self._samples)
+            return {name: {"mean": self._depth_sum[name] / n, "max": self._depth_max[name],
+                           "capacity": self.queues[name].maxsize} for name in STAGES}
+
+    def run(self, sources: Iterable[str], pdf_dir: str = "data/pdfs", download: bool = False) -> List[str]:
+        """
+        sources: PDF URLs (download=True, saved into pdf_dir) or local PDF paths
+
+        returns: CSV paths written or already present, in completion order
+        """
+        self.pdf_dir = pdf_dir
+        os.makedirs(self.out_dir, exist_ok=True)
+        metrics = get_metrics()
+        stop = threading.Event()
+        sampler = threading.Thread(target=self._sample_queues, args=(stop,), daemon=True)
+        sampler.start()
+
+        with ProcessPoolExecutor(max_workers=self.workers["extract"]) as pool:
+            self._pool = pool
+            closers = [
+                self._start_stage("download", self._download, "extract"),
+                self._start_stage("extract", self._extract, "select"),
+                self._start_stage("select", self._select, "llm"),
+                self._start_stage("llm", self._llm, "write"),
+                self._start_stage("write", self._write, None),
+            ]
+            first = self.queues["download"] if download else self.queues["extract"]
+            for src in sources:
+                first.put(src)  # blocks while the first stage is saturated
+            # end of stream enters at the top either way; each stage passes it on once all its workers finish
+            self._end_stream("download")
+            for closer in closers:
+                closer.join()
+
+        stop.set()
+        sampler.join()
+        for name, rep in self.queue_report().items():
+            metrics.set_gauge(f"queue_depth_{name}", self.queues[name].qsize())
+            metrics.set_gauge(f"queue_depth_{name}_mean", round(rep["mean"], 3))
+            metrics.set_gauge(f"queue_depth_{name}_max", rep["max"])
+        return self.results
+
+
+def bottleneck(report: Dict[str, Dict[str, float]]) -> Optional[str]:
+    """
+    Stage with the fullest input queue on average (None if nothing ever queued)
+    """
+    name, rep = max(report.items(), key=lambda kv: kv[1]["mean"] / max(1, kv[1]["capacity"]))
+    return name if rep["mean"] > 0 else None
+
+
+def stream_all(pdf_dir: str = "data/pdfs", out_dir: str = "out", urls: Optional[List[str]] = None,
+               workers: Optional[Dict[str, int]] = None, queue_size: int = 4, **kw) -> List[str]:
+    """
+    Streaming counterpart of process_all (and of scrape_and_download + process_all when urls are given)- same options,
+    plus per-stage worker counts and the queue size
+    """
+    pipe = StreamingPipeline(out_dir=out_dir, workers=workers, queue_size=queue_size, **kw)
+    if urls is not None:
+        outs = pipe.run(urls, pdf_dir=pdf_dir, download=True)
+    else:
+        paths = [os.path.join(pdf_dir, n) for n in sorted(os.listdir(pdf_dir)) if n.lower().endswith(".pdf")]
+        outs = pipe.run(paths, pdf_dir=pdf_dir)
+
+    report = pipe.queue_report()
+    depths = "  ".join(f"{name} {rep['mean']:.1f}/{rep['max']}" for name, rep in report.items())
+    print(f"[stream] queue depth mean/max in front of each stage: {depths}")
+    slow = bottleneck(report)
+    if slow:
+        print(f"[stream] bottleneck: {slow} (raise its workers if the API/CPU allows)")
+    if pipe.failed:
+        print(f"[stream] {len(pipe.failed)} issues failed: {pipe.failed}")
+    return outs
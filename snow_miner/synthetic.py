@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import argparse
+import os
+import random
+from typing import Dict, List, Optional
+
+# Filler in the register of the journal- club business and hill walking, nothing snowy
+FILLER_WORDS = (
+    "the party left the inn at an early hour and followed the old drove road up the glen past the shooting lodge "
+    "where the keeper gave us directions to the summit cairn by way of the long ridge above the burn and the "
+    "heather moor with a fine view of the distant hills and the river winding below towards the railway station "
+    "while the president spoke at the annual meeting of members about the club library and the new bridge"
+).split()
+
+SNOW_PHRASES = [
+    "the corrie was filled with deep snow",
+    "large cornices overhung the plateau",
+    "a few patches of old snow lay in the gullies",
+    "the snow was soft and slushy after the thaw",
+    "we found waist-deep drifts below the cairn",
+    "the loch was frozen and covered with snow",
+    "an avalanche had swept the lower slopes",
+    "the snow had all melted and the hill was bare",
+    "hard neve made for good going on the ridge",
+    "spindrift blew across the summit in the gale",
+]
+
+DATE_PHRASES = [
+    "on the 12th of March {year}",
+    "in April {year}",
+    "during the winter of {year}",
+    "on 3rd January {year}",
+    "late in May",
+    "on {day}/{month}/{year}",
+    "in the summer of {year}",
+    "{year}",
+]
+
+
+def _sentence(rng: random.Random, snow_density: float, date_density: float, year: int,
+              planted: Optional[List[str]] = None) -> str:
+    words = rng.choices(FILLER_WORDS, k=rng.randint(8, 18))
+    parts = [" ".join(words)]
+    if rng.random() < snow_density:
+        phrase = rng.choice(SNOW_PHRASES)
+        parts.append(phrase)
+        if planted is not None:
+            planted.append(phrase)
+    if rng.random() < date_density:
+        parts.append(rng.choice(DATE_PHRASES).format(year=year, day=rng.randint(1, 28), month=rng.randint(1, 12)))
+    s = ", ".join(parts)
+    return s[0].upper() + s[1:] + "."
+
+
+def generate_pages(n_pages: int = 40, sentences_per_page: int = 35, snow_density: float = 0.1,
+                   date_density: float = 0.05, year: int = 1905, seed: int = 0,
+                   planted: Optional[List[str]] = None) -> List[str]:
+    """
+    Synthetic journal page texts (no PDF), for benchmarking the text-only stages
+
+    snow_density: probability a sentence carries a snow phrase
+    date_density: probability a sentence carries a date phrase
+    planted: optional list collecting every snow phrase used, in order
+    """
+    rng = random.Random(seed)
+    return [" ".join(_sentence(rng, snow_density, date_density, year, planted) for _ in range(sentences_per_page))
+            for _ in range(n_pages)]
+
+
+def generate_journal_pdf(path: str, n_pages: int = 40, sentences_per_page: int = 35, snow_density: float = 0.1,
+                         date_density: float = 0.05, year: int = 1905, seed: int = 0,
+                         running_head: bool = True) -> List[str]:
+    """
+    Write a multi-page journal-like PDF with a real text layer (running head, page numbers, wrapped body text)
+
+    path: output PDF path
+    running_head: print "THE CAIRNGORM CLUB JOURNAL" and a page number on every page like the real issues
+
+    returns: the snow phrases planted, in order (handy as annotator snippets)
+    """
+    import fitz  # PyMuPDF
+
+    planted: List[str] = []
+    pages = generate_pages(n_pages, sentences_per_page, snow_density, date_density, year, seed, planted)
+    doc = fitz.open()
+    for i, body in enumerate(pages, start=1):
+        page = doc.new_page(width=420, height=640)
+        if running_head:
+            page.insert_text((40, 30), "THE CAIRNGORM CLUB JOURNAL", fontsize=8)
+            page.insert_text((370, 30), str(i), fontsize=8)
+        page.insert_textbox(fitz.Rect(40, 45, 380, 610), body, fontsize=7.5)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    doc.save(path)
+    doc.close()
+    return planted
+
+
+def generate_corpus(out_dir: str, n_issues: int = 5, first_issue: int = 1, first_year: int = 1895,
+                    **kwargs) -> Dict[str, List[str]]:
+    """
+    Write issue_XXX.pdf files (the naming human_annotation/rename_pdfs.py produces), one year apart
+
+    kwargs: passed to generate_journal_pdf (n_pages, snow_density, date_density, ...)
+
+    returns: {pdf_path: planted snow phrases}
+    """
+    out: Dict[str, List[str]] = {}
+    for k in range(n_issues):
+        issue = first_issue + k
+        path = os.path.join(out_dir, f"issue_{issue:03d}.pdf")
+        out[path] = generate_journal_pdf(path, year=first_year + k, seed=issue, **kwargs)
+    return out
+
+
+def main():
+    """
+    python -m snow_miner.synthetic data/synthetic --issues 115 --pages 60 --snow-density 0.1 --date-density 0.05
+    """
+    ap = argparse.ArgumentParser(description="Generate a synthetic Cairngorm Club Journal corpus")
+    ap.add_argument("out_dir", type=str)
+    ap.add_argument("--issues", type=int, default=5)
+    ap.add_argument("--pages", type=int, default=40)
+    ap.add_argument("--snow-density", type=float, default=0.1)
+    ap.add_argument("--date-density", type=float, default=0.05)
+    args = ap.parse_args()
+
+    paths = generate_corpus(args.out_dir, n_issues=args.issues, n_pages=args.pages, snow_density=args.snow_density,
+                            date_density=args.date_density)
+    print(f"Wrote {len(paths)} PDFs to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import argparse
+import bisect
+import math
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+import regex as re
+
+# a line that is nothing but a page number ("12", "Page 12", "xiv"). Roman numerals must be well formed (up to
+# cccxcix), so edge lines like "civil" or "ill" stay
+PAGE_NUMBER_RE = re.compile(r"(?i)(?:page\s*)?(?:\d{1,4}|(?=[ivxlc])c{0,3}(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3}))")
+# lower-case word broken over a line ("snow-\nfield"); the whitespace may include a page break
+HYPHEN_BREAK_RE = re.compile(r"(?<=\p{Ll})-[ \t]*\n\s*(?=\p{Ll})")
+LINE_RE = re.compile(r"[^\n]*\n?")
+WORD_RE = re.compile(r"\p{L}+(?:-\p{L}+)*")
+BROKEN_WORD_RE = re.compile(r"\p{L}+-[ \t]*\n\s*\p{L}+")
+
+
+class CleanText(NamedTuple):
+    """
+    Normalised text plus the map back to the raw pdfminer text: clean_starts[i] in `text` is raw_starts[i] in the raw
+    text, and both run on unchanged up to the next segment
+    """
+    text: str
+    clean_starts: List[int]
+    raw_starts: List[int]
+
+    def to_raw(self, pos: int) -> int:
+        i = max(0, bisect.bisect_right(self.clean_starts, pos) - 1)
+        if not self.clean_starts:
+            return pos
+        return self.raw_starts[i] + pos - self.clean_starts[i]
+
+    def to_clean(self, raw_pos: int) -> int:
+        """
+        Clean position of a raw offset; offsets inside stripped text land where the text continues
+        """
+        i = bisect.bisect_right(self.raw_starts, raw_pos) - 1
+        if i < 0:
+            return 0
+        seg_end = self.clean_starts[i + 1] if i + 1 < len(self.clean_starts) else len(self.text)
+        return min(self.clean_starts[i] + raw_pos - self.raw_starts[i], seg_end)
+
+    def raw_span(self, start: int, end: int) -> Tuple[int, int]:
+        if end <= start:
+            raw = self.to_raw(start)
+            return raw, raw
+        return self.to_raw(start), self.to_raw(end - 1) + 1
+
+
+def _line_key(line: str) -> str:
+    """
+    Running heads differ only by page number, so digits are folded together
+    """
+    return " ".join(re.sub(r"\d+", "#", line.strip().lower()).split())
+
+
+def _edge_lines(text: str, edge_lines: int) -> List[Tuple[int, int, str]]:
+    """
+    (start, end, line) of the first and last `edge_lines` non-empty lines of a page, end including the newline
+    """
+    lines = [(m.start(), m.end(), m.group()) for m in LINE_RE.finditer(text) if m.group().strip()]
+    if len(lines) <= 2 * edge_lines:
+        return lines
+    return lines[:edge_lines] + lines[-edge_lines:]
+
+
+def find_running_lines(pages: List[Tuple[int, str]], edge_lines: int = 3, min_pages: int = 3,
+                       min_frac: float = 0.0, max_step: int = 2) -> Set[str]:
+    """
+    Line keys that sit at the same top or bottom position on a run of nearby pages- running heads and footers. Heads
+    repeat on every page or every other page (facing pages), so a short line that just happens to recur at page edges
+    scattered through the issue ("snow.", "March #, #.") isn't taken for one.
+
+    pages: (page_number, text) as from pdf_text.extract_text_pages
+    edge_lines: how many non-empty lines at each end of a page count as header/footer candidates
+    min_pages: a line must repeat on a run of at least this many pages...
+    min_frac: ...and of at least this fraction of all pages
+    max_step: pages in a run are at most this many apart (2: every other page)
+
+    returns: set of _line_key values
+    """
+    seen: Dict[Tuple[str, int], List[int]] = defaultdict(list)
+    for page_no, text in pages:
+        lines = _edge_lines(text, edge_lines)
+        for i, (_, _, line) in enumerate(lines):
+            key = _line_key(line)
+            if len(key) >= 4:
+                slot = i if i < edge_lines else i - len(lines)  # 0, 1, ... from the top; -1, -2, ... from the bottom
+                seen[(key, slot)].append(page_no)
+    need = max(min_pages, math.ceil(min_frac * len(pages)))
+    running = set()
+    for (key, _), on in seen.items():
+        run = longest = 1
+        for prev, page_no in zip(on, on[1:]):
+            run = run + 1 if page_no - prev <= max_step else 1
+            longest = max(longest, run)
+        if longest >= need:
+            running.add(key)
+    return running
+
+
+def _apply_deletions(raw: str, deletions: List[Tuple[int, int]]) -> CleanText:
+    pieces: List[str] = []
+    clean_starts: List[int] = []
+    raw_starts: List[int] = []
+    pos = 0
+    out_len = 0
+    for start, end in sorted(deletions) + [(len(raw), len(raw))]:
+        if start > pos:
+            clean_starts.append(out_len)
+            raw_starts.append(pos)
+            pieces.append(raw[pos:start])
+            out_len += start - pos
+        pos = max(pos, end)
+    return CleanText("".join(pieces), clean_starts or [0], raw_starts or [0])
+
+
+def _vocabulary(text: str) -> Set[str]:
+    """
+    Lower-cased words of the text, hyphenated compounds both whole and split into their parts. The halves of words
+    broken over a line are left out- they are what is being decided.
+    """
+    vocab: Set[str] = set()
+    for m in WORD_RE.finditer(BROKEN_WORD_RE.sub(" ", text)):
+        word = m.group().lower()
+        vocab.add(word)
+        if "-" in word:
+            vocab.update(word.split("-"))
+    return vocab
+
+
+def keep_hyphen(left: str, right: str, vocab: Set[str]) -> bool:
+    """
+    Whether "left-\nright" is a real compound ("knee-deep", "snow-covered") rather than one word broken over a line.
+    Evidence from the rest of the text wins, then the snow lexicon, then whether both halves are words of their own.
+    """
+    from snow_miner.lexicon import LEXICON_REGEX
+
+    joined, hyphenated = (left + right).lower(), f"{left}-{right}".lower()
+    if joined in vocab:
+        return False
+    if hyphenated in vocab or LEXICON_REGEX.fullmatch(hyphenated):
+        return True
+    if LEXICON_REGEX.fullmatch(joined):
+        return False
+    return len(left) >= 3 and len(right) >= 3 and left.lower() in vocab and right.lower() in vocab
+
+
+def page_starts(pages: List[Tuple[int, str]], clean: Optional[CleanText] = None) -> List[int]:
+    """
+    Where each page starts in the pages joined with blank lines- in the normalised text if clean is given (through
+    its offset map), else in the raw text
+    """
+    starts, pos = [], 0
+    for _, text in pages:
+        starts.append(clean.to_clean(pos) if clean is not None else pos)
+        pos += len(text) + 2
+    return starts
+
+
+def normalise_pages(pages: List[Tuple[int, str]], edge_lines: int = 3, min_pages: int = 3,
+                    min_frac: float = 0.0) -> CleanText:
+    """
+    Strip running heads/footers and bare page numbers from page edges, then rejoin words hyphenated over a line break.
+    The raw text is the pages joined with blank lines, exactly as pipeline.process_pdf builds it.
+
+    returns: CleanText (text + offset map back to the raw text)
+    """
+    running = find_running_lines(pages, edge_lines, min_pages, min_frac)
+
+    deletions: List[Tuple[int, int]] = []
+    offset = 0
+    for _, text in pages:
+        for start, end, line in _edge_lines(text, edge_lines):
+            if _line_key(line) in running or PAGE_NUMBER_RE.fullmatch(line.strip()):
+                deletions.append((offset + start, offset + end))
+        offset += len(text) + 2
+    raw = "\n\n".join(text for _, text in pages)
+    stripped = _apply_deletions(raw, deletions)
+
+    # hyphen breaks are found after stripping so a word split over a page (with the head in between) still rejoins.
+    # Real compounds keep their hyphen and only lose the line break
+    vocab = _vocabulary(stripped.text)
+    for m in HYPHEN_BREAK_RE.finditer(stripped.text):
+        left = re.search(r"\p{L}+$", stripped.text[:m.start()]).group()
+        right = re.match(r"\p{L}+", stripped.text[m.end():]).group()
+        start = m.start() + 1 if keep_hyphen(left, right, vocab) else m.start()
+        deletions.append(stripped.raw_span(start, m.end()))
+    return _apply_deletions(raw, deletions)
+
+
+def main():
+    """
+    python -m snow_miner.text_clean data/pdfs/issue_042.pdf --out issue_042.txt
+
+    Shows which running lines would be stripped from an issue and how much text goes with them.
+    """
+    from snow_miner.pdf_text import extract_text_pages
+
+    ap = argparse.ArgumentParser(description="Header/footer stripping and de-hyphenation for one PDF")
+    ap.add_argument("pdf", type=str)
+    ap.add_argument("--out", type=str, default=None, help="Write the normalised text here")
+    ap.add_argument("--min-pages", type=int, default=3)
+    args = ap.parse_args()
+
+    pages = extract_text_pages(args.pdf)
+    raw_len = sum(len(t) for _, t in pages) + 2 * max(0, len(pages) - 1)
+    clean = normalise_pages(pages, min_pages=args.min_pages)
+    for key in sorted(find_running_lines(pages, min_pages=args.min_pages)):
+        print(f"running line: {key}")
+    print(f"{len(pages)} pages, {raw_len} -> {len(clean.text)} chars ({raw_len - len(clean.text)} stripped)")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(clean.text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# extraction row schema: field -> (required, accepted types). Anything else the model adds is dropped, except "window"
+ROW_SCHEMA: Dict[str, Tuple[bool, tuple]] = {
+    "text": (True, (str,)),
+    "entity": (False, (str, list, type(None))),
+    "location": (False, (str, type(None))),
+    "score": (True, (int, float, str)),
+    "window": (False, (str, int, type(None))),
+}
+SCORE_MIN, SCORE_MAX = 0, 10
+
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*(.*?)\s*```\s*$", flags=re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([\]}])")
+
+
+class ParsedResponse(NamedTuple):
+    rows: List[Dict]  # rows that passed validation, normalised
+    invalid: List[Tuple[Any, str]]  # (raw row, reason) for rows that didn't
+    ok: bool  # False: no usable JSON even after repair- the request has to be retried
+    repaired: bool  # JSON only parsed after repair_json
+    error: Optional[str] = None
+    truncated: bool = False  # answer was cut off- the rows before the cut are kept, but it is worth a retry
+
+
+def _close_truncated(text: str) -> Optional[str]:
+    """
+    A response cut off mid-array ({"rows": [{...}, {...}, {"te) -> everything up to the last complete row, closed off
+    """
+    start = text.find("[")
+    end = text.rfind("}")
+    while end > start >= 0:
+        candidate = text[:end + 1] + "]}"
+        try:
+            json.loads(candidate)
+            return candidate
+        except ValueError:
+            end = text.rfind("}", 0, end)
+    return None
+
+
+def repair_json(content: str) -> Optional[Any]:
+    """
+    Cheap fixes for the ways chat models break JSON mode: markdown fences, prose around the object, trailing commas,
+    a bare list of rows, output truncated at max_tokens. None if it still doesn't parse.
+    """
+    return _repair(content)[0]
+
+
+def _repair(content: str) -> Tuple[Optional[Any], bool]:
+    """
+    repair_json, plus whether the answer had to be cut back to its last complete row
+    """
+    text = (content or "").strip()
+    m = _FENCE_RE.match(text)
+    if m:
+        text = m.group(1)
+    if not text.startswith(("{", "[")):
+        starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+        if not starts:
+            return None, False
+        text = text[min(starts):]
+    text = _TRAILING_COMMA_RE.sub(r"\1", text)
+    for candidate in (text, text[:text.rfind("}") + 1] if "}" in text else None):
+        if not candidate:
+            continue
+        try:
+            return json.loads(candidate), False
+        except ValueError:
+            continue
+    closed = _close_truncated(text)
+    return (json.loads(closed), True) if closed else (None, False)
+
+
+def validate_row(row: Any) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    One extraction row against ROW_SCHEMA
+
+    returns: (normalised row, None) or (None, reason). Scores must be whole numbers 0-10 ("7" and 7.0 are fine);
+    entity lists are joined with ", "
+    """
+    if not isinstance(row, dict):
+        return None, f"row is {type(row).__name__}, not an object"
+    for field, (required, types) in ROW_SCHEMA.items():
+        if field not in row or row[field] is None:
+            if required:
+                return None, f"missing {field}"
+            continue
+        if not isinstance(row[field], types) or isinstance(row[field], bool):
+            return None, f"{field} is {type(row[field]).__name__}"
+
+    text = row["text"].strip()
+    if not text:
+        return None, "empty text"
+    try:
+        score = float(str(row["score"]).strip())
+    except ValueError:
+        return None, f"score {row['score']!r} is not a number"
+    if score != int(score) or not SCORE_MIN <= score <= SCORE_MAX:
+        return None, f"score {row['score']!r} is not a whole number {SCORE_MIN}-{SCORE_MAX}"
+
+    entity = row.get("entity") or ""
+    if isinstance(entity, list):
+        entity = ", ".join(str(e) for e in entity)
+    out = {"text": text, "entity": entity.strip(), "location": (row.get("location") or "").strip() or None,
+           "score": int(score)}
+    if row.get("window") is not None:
+        out["window"] = str(row["window"])
+    return out, None
+
+
+def parse_response(content: str) -> ParsedResponse:
+    """
+    Raw model output -> validated rows. ok is False only when there is nothing usable at all (no JSON, or no "rows"
+    list); individual bad rows are dropped and reported in `invalid`.
+    """
+    repaired = truncated = False
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        data, truncated = _repair(content)
+        repaired = data is not None
+        if data is None:
+            return ParsedResponse([], [], False, False, "unparseable JSON")
+    if isinstance(data, list):
+        data = {"rows": data}
+        repaired = True
+    rows = data.get("rows") if isinstance(data, dict) else None
+    if not isinstance(rows, list):
+        return ParsedResponse([], [], False, repaired, 'no "rows" list')
+
+    valid, invalid = [], []
+    for raw in rows:
+        row, reason = validate_row(raw)
+        if row is None:
+            invalid.append((raw, reason))
+        else:
+            valid.append(row)
+    return ParsedResponse(valid, invalid, True, repaired, truncated=truncated)
+
+
+def needs_retry(parsed: ParsedResponse) -> bool:
+    """
+    Worth asking again: nothing parsed, the answer was cut off, or every row the model gave was invalid
+    """
+    return not parsed.ok or parsed.truncated or (bool(parsed.invalid) and not parsed.rows)
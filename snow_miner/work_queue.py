@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, NamedTuple, Optional
+
+from .instrumentation import get_metrics
+from .pipeline import detect_issue_from_filename
+
+DEFAULT_DB = "data/work_queue.sqlite"
+
+# statuses: pending -> leased -> done, or back to pending on failure until max_attempts, then failed.
+# pdf_path/out_dir/result are relative to the pdf and out dirs each worker is given, so hosts can mount them anywhere
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    pdf_path TEXT NOT NULL,
+    out_dir TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    result TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires);
+"""
+
+
+class Job(NamedTuple):
+    job_id: str
+    pdf_path: str
+    out_dir: str
+    attempts: int
+    reclaimed: bool  # lease taken over from a worker that stopped heartbeating
+
+
+def open_queue(db_path: str = DEFAULT_DB) -> sqlite3.Connection:
+    """
+    Autocommit connection- transactions are opened explicitly with BEGIN IMMEDIATE so claims are serialised across
+    processes and hosts. The default rollback journal is kept on purpose: WAL needs shared memory and does not work
+    on network filesystems.
+    """
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def enqueue(conn: sqlite3.Connection, pdf_dir: str, out_dir: str) -> int:
+    """
+    One job per PDF in pdf_dir (already queued issues are left alone; issues whose CSV exists go straight to done).
+    Paths are stored relative to pdf_dir/out_dir- workers resolve them against their own --pdf-dir/--out-dir.
+
+    returns: number of new jobs
+    """
+    now = time.time()
+    added = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for name in sorted(os.listdir(pdf_dir)):
+            if not name.lower().endswith(".pdf"):
+                continue
+            issue = detect_issue_from_filename(name) or os.path.splitext(name)[0]
+            out_path = os.path.join(out_dir, f"{issue}.csv")
+            status = "done" if os.path.exists(out_path) else "pending"
+            cur = conn.execute("INSERT OR IGNORE INTO jobs (job_id, pdf_path, out_dir, status, result, updated) "
+                               "VALUES (?, ?, ?, ?, ?, ?)",
+                               (issue, name, ".", status, f"{issue}.csv" if status == "done" else None, now))
+            added += cur.rowcount
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return added
+
+
+def claim(conn: sqlite3.Connection, owner: str, lease_s: float = 300.0, max_attempts: int = 3) -> Optional[Job]:
+    """
+    Lease the next pending job, or one whose lease ran out (its worker died or hung). Expired leases with no
+    attempts left are marked failed on the way, so a worker dying on a job's last attempt can't leave it leased forever.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("UPDATE jobs SET status = 'failed', lease_owner = NULL, lease_expires = NULL, "
+                     "last_error = 'lease expired on the last attempt', updated = ? "
+                     "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?", (now, now, max_attempts))
+        row = conn.execute(
+            "SELECT job_id, pdf_path, out_dir, attempts, status FROM jobs "
+            "WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < ?)) AND attempts < ? "
+            "ORDER BY status = 'leased', job_id LIMIT 1", (now, max_attempts)).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        job_id, pdf_path, out_dir, attempts, status = row
+        conn.execute("UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1, "
+                     "updated = ? WHERE job_id = ?", (owner, now + lease_s, now, job_id))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return Job(job_id, pdf_path, out_dir, attempts + 1, status == "leased")
+
+
+def heartbeat(conn: sqlite3.Connection, job_id: str, owner: str, lease_s: float = 300.0) -> bool:
+    """
+    Extend our lease. False means it was lost (expired and reclaimed by another worker)- stop working on the job.
+    """
+    now = time.time()
+    cur = conn.execute("UPDATE jobs SET lease_expires = ?, updated = ? "
+                       "WHERE job_id = ? AND lease_owner = ? AND status = 'leased'", (now + lease_s, now, job_id, owner))
+    return cur.rowcount == 1
+
+
+def complete(conn: sqlite3.Connection, job_id: str, owner: str, result: Optional[str]) -> bool:
+    cur = conn.execute("UPDATE jobs SET status = 'done', result = ?, lease_owner = NULL, lease_expires = NULL, "
+                       "last_error = NULL, updated = ? WHERE job_id = ? AND lease_owner = ?",
+                       (result, time.time(), job_id, owner))
+    return cur.rowcount == 1
+
+
+def fail(conn: sqlite3.Connection, job_id: str, owner: str, error: str, max_attempts: int = 3) -> bool:
+    """
+    Release a job after an error: back to pending for another worker, or failed once max_attempts are used up
+    """
+    cur = conn.execute("UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                       "lease_owner = NULL, lease_expires = NULL, last_error = ?, updated = ? "
+                       "WHERE job_id = ? AND lease_owner = ?", (max_attempts, error[:2000], time.time(), job_id, owner))
+    return cur.rowcount == 1
+
+
+def queue_status(conn: sqlite3.Connection) -> Dict[str, int]:
+    counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+    counts.update(dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")))
+    counts["expired_leases"] = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'leased' AND lease_expires < ?",
+                                            (time.time(),)).fetchone()[0]
+    return counts
+
+
+class LeaseKeeper:
+    """
+    Background heartbeat for one job while it is being processed. Uses its own connection (sqlite connections stay
+    on their thread); `lost` is set if the lease could not be extended.
+    """
+
+    def __init__(self, db_path: str, job_id: str, owner: str, lease_s: float = 300.0):
+        self.db_path = db_path
+        self.job_id = job_id
+        self.owner = owner
+        self.lease_s = lease_s
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"lease-{job_id}")
+
+    def _run(self) -> None:
+        conn = open_queue(self.db_path)
+        try:
+            while not self._stop.wait(self.lease_s / 3):
+                try:
+                    if not heartbeat(conn, self.job_id, self.owner, self.lease_s):
+                        self.lost.set()
+                        return
+                except sqlite3.OperationalError:
+                    pass  # database busy/locked for longer than the timeout- try again next beat
+        finally:
+            conn.close()
+
+    def __enter__(self) -> "LeaseKeeper":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def work(db_path: str = DEFAULT_DB, owner: Optional[str] = None, lease_s: float = 300.0, max_attempts: int = 3,
+         poll_s: float = 10.0, max_jobs: Optional[int] = None, pdf_dir: str = "data/pdfs", out_dir: str = "out",
+         **process_kw) -> List[str]:
+    """
+    Claim and process issues until the queue is drained. While other workers still hold leases this worker keeps
+    polling, so it picks up their issues if they die. Any number of these can run at once, on any machine that sees
+    the same database and files. A job whose lease is lost stops before its next API request.
+
+    pdf_dir, out_dir: where this host sees the queue's PDFs and CSVs (jobs hold paths relative to them)
+    process_kw: passed to pipeline.process_pdf (extractor, ranker, top_k, include_date_parts, normalise, ...)
+
+    returns: CSVs this worker wrote
+    """
+    from .gpt_analyse import Cancelled
+    from .pipeline import process_pdf
+
+    owner = owner or worker_id()
+    conn = open_queue(db_path)
+    metrics = get_metrics()
+    outs: List[str] = []
+    try:
+        while max_jobs is None or len(outs) < max_jobs:
+            job = claim(conn, owner, lease_s, max_attempts)
+            if job is None:
+                status = queue_status(conn)
+                if status["leased"] == 0:
+                    break
+                time.sleep(poll_s)
+                continue
+            if job.reclaimed:
+                metrics.incr("lease_reclaims", issue=job.job_id)
+                print(f"[queue] reclaimed {job.job_id} from an expired lease (attempt {job.attempts})")
+
+            try:
+                with LeaseKeeper(db_path, job.job_id, owner, lease_s) as keeper:
+                    # os.path.join keeps the absolute paths older queues stored
+                    out = process_pdf(os.path.join(pdf_dir, job.pdf_path),
+                                      out_dir=os.path.normpath(os.path.join(out_dir, job.out_dir)),
+                                      cancel=keeper.lost, **process_kw)
+            except Cancelled:
+                metrics.incr("lease_cancels", issue=job.job_id)
+                print(f"[queue] lost the lease on {job.job_id}; stopped before the next request")
+                continue
+            except Exception as e:
+                fail(conn, job.job_id, owner, repr(e), max_attempts)
+                print(f"[queue] {job.job_id} failed (attempt {job.attempts}/{max_attempts}): {e!r}")
+                continue
+            if keeper.lost.is_set() or not complete(conn, job.job_id, owner, out and os.path.relpath(out, out_dir)):
+                print(f"[queue] lost the lease on {job.job_id}; another worker owns it now")
+                continue
+            if out:
+                outs.append(out)
+    finally:
+        conn.close()
+    return outs
+
+
+def main():
+    """
+    python -m snow_miner.work_queue enqueue --db /shared/queue.sqlite --pdf-dir /shared/pdfs --out-dir /shared/out
+    python -m snow_miner.work_queue work --db /mnt/shared/queue.sqlite --pdf-dir /mnt/shared/pdfs \\
+        --out-dir /mnt/shared/out --extractor gpt                                     # on as many hosts as you like
+    python -m snow_miner.work_queue status --db /shared/queue.sqlite
+    """
+    ap = argparse.ArgumentParser(description="Durable SQLite job queue for multi-process / multi-host runs")
+    ap.add_argument("command", choices=["enqueue", "work", "status"])
+    ap.add_argument("--db", type=str, default=DEFAULT_DB)
+    ap.add_argument("--pdf-dir", type=str, default="data/pdfs")
+    ap.add_argument("--out-dir", type=str, default="out")
+    ap.add_argument("--lease-s", type=float, default=300.0, help="Lease length; heartbeats renew it every third")
+    ap.add_argument("--max-attempts", type=int, default=3)
+    ap.add_argument("--poll-s", type=float, default=10.0, help="Wait between claims while others hold leases")
+    ap.add_argument("--extractor", choices=["gpt", "regex"], default="gpt")
+    ap.add_argument("--ranker", type=str, default=None)
+    ap.add_argument("--top-k", type=int, default=None)
+    ap.add_argument("--date-parts", action="store_true")
+    ap.add_argument("--page-col", action="store_true")
+    ap.add_argument("--no-normalise", action="store_true")
+    ap.add_argument("--openai-base-url", type=str, default=None)
+    ap.add_argument("--report-dir", type=str, default=None)
+    args = ap.parse_args()
+
+    conn = open_queue(args.db)
+    if args.command == "enqueue":
+        added = enqueue(conn, args.pdf_dir, args.out_dir)
+        print(f"Queued {added} new issues; {queue_status(conn)}")
+        conn.close()
+        return
+    if args.command == "status":
+        print(queue_status(conn))
+        for job_id, attempts, err in conn.execute(
+                "SELECT job_id, attempts, last_error FROM jobs WHERE status = 'failed' ORDER BY job_id"):
+            print(f"failed  {job_id}  attempts {attempts}  {err}")
+        conn.close()
+        return
+    conn.close()
+
+    from dotenv import load_dotenv
+
+    from .instrumentation import format_summary
+
+    load_dotenv()
+    ranker = None
+    if args.ranker:
+        from .ranker import SentenceRanker
+
+        ranker = SentenceRanker.load(args.ranker)
+    if args.openai_base_url:
+        from .gpt_analyse import configure_client
+
+        configure_client(base_url=args.openai_base_url)
+
+    outs = work(args.db, lease_s=args.lease_s, max_attempts=args.max_attempts, poll_s=args.poll_s,
+                extractor=args.extractor, ranker=ranker, top_k=args.top_k, include_date_parts=args.date_parts,
+                normalise=not args.no_normalise, include_page=args.page_col, pdf_dir=args.pdf_dir, out_dir=args.out_dir)
+    print(f"Wrote {len(outs)} CSVs")
+    metrics = get_metrics()
+    print(format_summary(metrics.to_dict()))
+    if args.report_dir:
+        metrics.write_reports(args.report_dir)
+
+
+if __name__ == "__main__":
+    main()